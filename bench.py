@@ -0,0 +1,178 @@
+"""Микро-бенчмарки горячих участков бота.
+
+    python bench.py codec [--page page.json] [--rounds 2000]
+    python bench.py cards [--page page.json] [--rounds 2000]
+    python bench.py seen [--page page.json] [--rounds 2000] [--history 200000]
+
+Без --page используется синтетическая страница miHoYo на 40 лотов
+(структура как у ответа /mihoyo). Для замера на реальных данных сохрани
+ответ API в файл и передай его через --page.
+"""
+
+import argparse
+import json
+import random
+import time
+
+import main
+
+
+def synthetic_mihoyo_page(count: int = 40, seed: int = 7) -> bytes:
+    rnd = random.Random(seed)
+    regions = ["Europe", "America", "Asia", "TW/HK/MO"]
+    items = []
+    now = int(time.time())
+    for i in range(count):
+        item_id = 190_000_000 + rnd.randint(0, 9_999_999)
+        items.append({
+            "item_id": item_id,
+            "item_state": "active",
+            "category_id": 17,
+            "published_date": now - i * 37,
+            "published_at": now - i * 37,
+            "title": f"Genshin Impact AR{rnd.randint(45, 60)} | {rnd.randint(3, 40)} легендарок | Почта в комплекте",
+            "title_en": f"Genshin Impact AR{rnd.randint(45, 60)} | {rnd.randint(3, 40)} legendary",
+            "description": "Аккаунт без привязок, почта в комплекте. " * rnd.randint(1, 6),
+            "price": rnd.randint(150, 25_000),
+            "rub_price": rnd.randint(150, 25_000),
+            "price_currency": "rub",
+            "seller_id": rnd.randint(1_000, 9_000_000),
+            "views": rnd.randint(0, 500),
+            "genshin_level": rnd.randint(45, 60),
+            "genshin_legendary_characters_count": rnd.randint(3, 40),
+            "genshin_legendary_weapons_count": rnd.randint(0, 20),
+            "genshin_primogems": rnd.randint(0, 50_000),
+            "region": rnd.choice(regions),
+            "email_access": rnd.choice([True, False]),
+            "phone_bound": rnd.choice([0, 1]),
+            "guarantee": {"duration": 86400, "type": "standard"},
+            "genshin_characters": [
+                {"id": rnd.randint(10_000_000, 10_000_099), "name": f"Персонаж {j}", "level": 90, "constellation": rnd.randint(0, 6)}
+                for j in range(rnd.randint(5, 25))
+            ],
+            "tags": [rnd.randint(1, 50) for _ in range(rnd.randint(0, 4))],
+        })
+    page = {
+        "items": items,
+        "totalItems": 12_345,
+        "totalItemsPrice": None,
+        "perPage": count,
+        "page": 1,
+        "cacheTTL": 30,
+        "lastModified": now,
+    }
+    return json.dumps(page, ensure_ascii=False).encode("utf-8")
+
+
+def _timeit(fn, rounds: int) -> float:
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - t0) / rounds * 1e6
+
+
+def bench_codec(body: bytes, rounds: int):
+    print(f"страница: {len(body)} байт, лотов: {len(json.loads(body)['items'])}, раундов: {rounds}")
+    rows = [("json (resp.text + loads, как раньше)", lambda: json.loads(body.decode("utf-8")))]
+    rows.append(("json (bytes)", lambda: json.loads(body)))
+    if main.orjson is not None:
+        rows.append(("orjson (bytes)", lambda: main.orjson.loads(body)))
+    if main.msgspec is not None:
+        decoder = main.msgspec.json.Decoder()
+        rows.append(("msgspec (bytes)", lambda: decoder.decode(body)))
+    rows.append(("fingerprint (без декодирования)", lambda: main._page_fingerprint(body)))
+
+    print(f"активный кодек: {main.JSON_CODEC_NAME}")
+    for label, fn in rows:
+        print(f"  {label:<40} {_timeit(fn, rounds):9.1f} мкс/ответ")
+
+
+def bench_cards(body: bytes, rounds: int):
+    lots = main.lots_from_items(json.loads(body)["items"])
+    rounds = max(1, rounds // max(1, len(lots)))
+    print(f"лотов: {len(lots)}, раундов по странице: {rounds}")
+
+    def render_all():
+        for lot in lots:
+            main.render_card(lot, "miHoYo")
+
+    def specs_all():
+        for lot in lots:
+            main._collect_item_specs(lot.raw)
+
+    def cached_all():
+        for lot in lots:
+            main.make_card(lot, "miHoYo")
+
+    def fresh_lots_cached():
+        # тот же лот, но новый dict из следующего ответа API: ключ кэша считается заново
+        for lot in main.lots_from_items([dict(lot.raw) for lot in lots]):
+            main.make_card(lot, "miHoYo")
+
+    main.card_render_cache.clear()
+    rows = [
+        ("render_card (без кэша)", render_all),
+        ("_collect_item_specs", specs_all),
+        ("make_card (попадание в LRU)", cached_all),
+        ("make_card (новый ответ, попадание)", fresh_lots_cached),
+    ]
+    for label, fn in rows:
+        print(f"  {label:<40} {_timeit(fn, rounds) / len(lots):9.1f} мкс/лот")
+    print(f"кэш карточек: {len(main.card_render_cache)}/{main.CARD_CACHE_MAX}, {main.card_cache_stats}")
+
+
+def bench_seen(body: bytes, rounds: int, history: int):
+    lots = main.lots_from_items(json.loads(body)["items"])
+    rounds = max(1, rounds // max(1, len(lots)))
+    rnd = random.Random(11)
+    rows = [(f"id::{rnd.randint(1, 10**9)}", 0) for _ in range(history)]
+    exact = main.SeenStore.from_rows(rows, ttl=0, max_size=history)
+    bloomed = main.SeenStore.from_rows(rows, ttl=0, max_size=history)
+    t0 = time.perf_counter()
+    bloomed.enable_bloom()
+    build_ms = (time.perf_counter() - t0) * 1000
+    new_keys = [lot.key for lot in lots]
+    seen_keys = [key for key, _ in rows[: len(lots)]]
+    print(f"история: {len(exact)} ключей, лотов на странице: {len(lots)}, раундов: {rounds}")
+
+    def lookup(store, keys):
+        def run():
+            for key in keys:
+                key in store
+        return run
+
+    for label, keys in (("новые лоты", new_keys), ("уже увиденные", seen_keys)):
+        for name, store in (("точный", exact), ("bloom + точный", bloomed)):
+            print(f"  {label + ', ' + name:<40} {_timeit(lookup(store, keys), rounds) / len(keys):9.2f} мкс/ключ")
+    bloom = bloomed.bloom
+    print(
+        f"bloom: {bloom.memory_bytes / 1024:.0f} КБ, k={bloom.k}, сборка {build_ms:.0f} мс, "
+        f"FP≈{bloom.estimated_fp_rate() * 100:.2f}%, {bloomed.bloom_stats}"
+    )
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("what", choices=["codec", "cards", "seen"])
+    parser.add_argument("--page", help="файл с сохранённым ответом API")
+    parser.add_argument("--rounds", type=int, default=2000)
+    parser.add_argument("--history", type=int, default=main.SEEN_MAX_PER_USER or 200_000)
+    args = parser.parse_args()
+
+    if args.page:
+        with open(args.page, "rb") as f:
+            body = f.read()
+    else:
+        body = synthetic_mihoyo_page()
+
+    if args.what == "codec":
+        bench_codec(body, args.rounds)
+    elif args.what == "cards":
+        bench_cards(body, args.rounds)
+    elif args.what == "seen":
+        bench_seen(body, args.rounds, args.history)
+
+
+if __name__ == "__main__":
+    main_cli()
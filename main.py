@@ -1,23 +1,42 @@
 
 import asyncio
+import hashlib
+import heapq
 import json
 import aiohttp
 import aiosqlite
 import html
+import math
 import re
 import time
 import random
 import os
+import sys
+from array import array
+from pathlib import Path
+from bisect import bisect_left
 from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
-from collections import defaultdict
+from collections import OrderedDict, defaultdict, deque
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
 
 from aiogram import Bot, Dispatcher, types
 from aiogram.filters import Command
-from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
+from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, BufferedInputFile
 from aiogram.exceptions import TelegramRetryAfter, TelegramBadRequest, TelegramForbiddenError
 
 from config import API_TOKEN as _API_TOKEN, LZT_API_KEY as _LZT_API_KEY
 
+try:
+    import orjson
+except ImportError:  # опциональная зависимость
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # опциональная зависимость
+    msgspec = None
+
 # ====================== ENV ======================
 API_TOKEN = os.getenv("API_TOKEN") or _API_TOKEN
 LZT_API_KEY = os.getenv("LZT_API_KEY") or _LZT_API_KEY
@@ -48,11 +67,43 @@ MAX_URLS_PER_USER_DEFAULT = 50
 MAX_URLS_PER_USER_LIMITED = 3
 
 MAX_CONCURRENT_REQUESTS = int((os.getenv("MAX_CONCURRENT_REQUESTS") or "512").strip())
+# Пока идёт покупка, поисковым запросам оставляется столько параллельных слотов.
+SEARCH_CONCURRENCY_DURING_BUY = int((os.getenv("SEARCH_CONCURRENCY_DURING_BUY") or "16").strip())
+# Отдельный пул соединений для покупок, чтобы POST не ждал за поисковыми GET.
+BUY_CONNECTOR_LIMIT = int((os.getenv("BUY_CONNECTOR_LIMIT") or "64").strip())
+# Прогрев: пока есть URL с автобаем, к каждому хосту покупки держится TLS-соединение,
+# которое обновляется лёгким HEAD раньше, чем истечёт keep-alive (0 — выключено).
+BUY_WARMUP_INTERVAL = float((os.getenv("BUY_WARMUP_INTERVAL") or "20").strip())
+BUY_WARMUP_TIMEOUT = float((os.getenv("BUY_WARMUP_TIMEOUT") or "3").strip())
+BUY_KEEPALIVE_SEC = float((os.getenv("BUY_KEEPALIVE_SEC") or "60").strip())
 LIMITED_EXTRA_DELAY = 0.0
 MAX_NEW_ITEMS_PER_CYCLE = int((os.getenv("MAX_NEW_ITEMS_PER_CYCLE") or "1000").strip())
 SEARCH_MIN_REQUEST_INTERVAL = float((os.getenv("SEARCH_MIN_REQUEST_INTERVAL") or "0.0").strip())
 OTHER_MIN_REQUEST_INTERVAL = float((os.getenv("OTHER_MIN_REQUEST_INTERVAL") or "0.0").strip())
 BUY_MIN_REQUEST_INTERVAL = float((os.getenv("BUY_MIN_REQUEST_INTERVAL") or "0.0").strip())
+# Token bucket: *_MIN_REQUEST_INTERVAL задаёт скорость (1/интервал), *_REQUEST_BURST — ёмкость.
+SEARCH_REQUEST_BURST = int((os.getenv("SEARCH_REQUEST_BURST") or "1").strip())
+OTHER_REQUEST_BURST = int((os.getenv("OTHER_REQUEST_BURST") or "1").strip())
+BUY_REQUEST_BURST = int((os.getenv("BUY_REQUEST_BURST") or "1").strip())
+# Лимиты по хостам API: "api.lzt.market=2:5,prod-api.lzt.market=2:5" (запросов/сек:burst),
+# отдельно для поиска, покупок и прочих запросов.
+HOST_RATE_LIMITS = (os.getenv("HOST_RATE_LIMITS") or "").strip()
+# Реакция на 429: пауза из Retry-After (или по умолчанию) и мультипликативное снижение скорости
+# с постепенным восстановлением на успешных ответах.
+RATE_LIMIT_DEFAULT_PENALTY = float((os.getenv("RATE_LIMIT_DEFAULT_PENALTY") or "2.0").strip())
+RATE_LIMIT_MAX_PENALTY = float((os.getenv("RATE_LIMIT_MAX_PENALTY") or "60").strip())
+RATE_LIMIT_BACKOFF_FACTOR = float((os.getenv("RATE_LIMIT_BACKOFF_FACTOR") or "0.5").strip())
+RATE_LIMIT_RECOVERY_STEP = float((os.getenv("RATE_LIMIT_RECOVERY_STEP") or "0.05").strip())
+# Зеркала поиска: при SEARCH_MIRROR_MODE=1 поисковый URL переписывается на самый быстрый
+# здоровый хост из VALID_API_HOSTS, а хедж уходит на второй по рейтингу хост.
+SEARCH_MIRROR_MODE = (os.getenv("SEARCH_MIRROR_MODE") or "0").strip() == "1"
+# Хеджирование: если ответ дольше перцентиля SEARCH_HEDGE_PCT хоста, параллельно уходит
+# дубль (на зеркало или тот же хост). Дублей не больше SEARCH_HEDGE_MAX_RATIO от всех запросов.
+SEARCH_HEDGE = (os.getenv("SEARCH_HEDGE") or "0").strip() == "1"
+SEARCH_HEDGE_PCT = float((os.getenv("SEARCH_HEDGE_PCT") or "90").strip())
+SEARCH_HEDGE_MAX_RATIO = float((os.getenv("SEARCH_HEDGE_MAX_RATIO") or "0.1").strip())
+SEARCH_MIRROR_EXPLORE = float((os.getenv("SEARCH_MIRROR_EXPLORE") or "0.05").strip())
+HOST_HEALTH_ALPHA = float((os.getenv("HOST_HEALTH_ALPHA") or "0.2").strip())
 NON_AUTOBUY_CYCLE_EVERY = int((os.getenv("NON_AUTOBUY_CYCLE_EVERY") or "5").strip())
 
 DB_FILE = (os.getenv("DB_FILE") or ("/data/bot_data.sqlite" if os.path.isdir("/data") else "bot_data.sqlite")).strip()
@@ -65,6 +116,23 @@ USER_PAGE_SIZE = 14
 MAX_URL_NAME_LEN = 64
 
 TG_SEND_DELAY = float((os.getenv("TG_SEND_DELAY") or "0.01").strip())
+# Бюджеты Telegram: общий на бота и на каждый чат (сообщений/сек и burst).
+TG_GLOBAL_RATE = float((os.getenv("TG_GLOBAL_RATE") or "28").strip())
+TG_GLOBAL_BURST = int((os.getenv("TG_GLOBAL_BURST") or "30").strip())
+TG_CHAT_RATE = float((os.getenv("TG_CHAT_RATE") or "1").strip())
+TG_CHAT_BURST = int((os.getenv("TG_CHAT_BURST") or "3").strip())
+# Сколько карточек лотов может ждать в чате, прежде чем они склеиваются в общие сообщения,
+# и сверх скольких самые старые выбрасываются. Результаты автобая не склеиваются и не выбрасываются.
+TG_CARD_MERGE_BACKLOG = int((os.getenv("TG_CARD_MERGE_BACKLOG") or "10").strip())
+TG_CARD_DROP_BACKLOG = int((os.getenv("TG_CARD_DROP_BACKLOG") or "300").strip())
+# Число процессов-охотников (0 — всё в одном процессе). Пользователи делятся по хешу user_id.
+# Блокировка покупки лота (get_buy_lock) действует только внутри процесса: если один лот
+# ловят пользователи с разных воркеров, их POST покупки на общий аккаунт LZT могут уйти
+# одновременно. Второй получит от API «уже продан», но при общем аккаунте это лишний запрос.
+HUNTER_WORKERS = int((os.getenv("HUNTER_WORKERS") or "0").strip())
+HUNTER_WORKER_RESTART_DELAY = float((os.getenv("HUNTER_WORKER_RESTART_DELAY") or "2.0").strip())
+HUNTER_WORKER_STOP_TIMEOUT = float((os.getenv("HUNTER_WORKER_STOP_TIMEOUT") or "10.0").strip())
+HUNTER_IPC_LINE_MAX = 4 * 1024 * 1024
 AUTOBUY_RETRY_ATTEMPTS = int((os.getenv("AUTOBUY_RETRY_ATTEMPTS") or "1").strip())
 AUTOBUY_RETRY_MIN_DELAY = float((os.getenv("AUTOBUY_RETRY_MIN_DELAY") or "0.0").strip())
 AUTOBUY_RETRY_MAX_DELAY = float((os.getenv("AUTOBUY_RETRY_MAX_DELAY") or "0.0").strip())
@@ -74,7 +142,69 @@ FAST_AUTOBUY_TIMEOUT = float((os.getenv("FAST_AUTOBUY_TIMEOUT") or "0.10").strip
 AUTOBUY_URL_LIMIT = int((os.getenv("AUTOBUY_URL_LIMIT") or "10").strip())
 AUTOBUY_MAX_HTTP_ATTEMPTS = int((os.getenv("AUTOBUY_MAX_HTTP_ATTEMPTS") or "6").strip())
 AUTOBUY_MAX_DURATION_SEC = float((os.getenv("AUTOBUY_MAX_DURATION_SEC") or "0.90").strip())
+# Модель маршрутов покупки: априорная задержка неизвестного маршрута и порог, после которого
+# счётчики маршрута делятся пополам, чтобы модель успевала за изменениями API.
+AUTOBUY_MODEL_PRIOR_MS = float((os.getenv("AUTOBUY_MODEL_PRIOR_MS") or "150").strip())
+AUTOBUY_MODEL_MAX_ATTEMPTS = int((os.getenv("AUTOBUY_MODEL_MAX_ATTEMPTS") or "200").strip())
+AUTOBUY_MODEL_SAVE_INTERVAL = float((os.getenv("AUTOBUY_MODEL_SAVE_INTERVAL") or "30").strip())
+# Куда раз в LATENCY_DUMP_INTERVAL секунд писать гистограммы этапов в JSON (пусто — не писать).
+LATENCY_DUMP_FILE = (os.getenv("LATENCY_DUMP_FILE") or "").strip()
+LATENCY_DUMP_INTERVAL = float((os.getenv("LATENCY_DUMP_INTERVAL") or "60").strip())
 MAX_ITEMS_PER_SOURCE_SCAN = int((os.getenv("MAX_ITEMS_PER_SOURCE_SCAN") or "200").strip())
+# Верхняя граница тика общего опроса; фактический тик — минимальный интервал подписанных охотников.
+SOURCE_POLL_TICK = float((os.getenv("SOURCE_POLL_TICK") or "0.15").strip())
+# Инкрементальный режим: скан источника останавливается на последнем уже обработанном лоте.
+# Выключен по умолчанию: лот, попавший в выдачу без новой даты публикации (например, после
+# снижения цены), окажется ниже отметки и будет пропущен.
+HUNTER_INCREMENTAL = (os.getenv("HUNTER_INCREMENTAL") or "0").strip() == "1"
+# Имя query-параметра API с нижней границей даты публикации (пусто — фильтр не добавляется).
+INCREMENTAL_QUERY_PARAM = (os.getenv("INCREMENTAL_QUERY_PARAM") or "").strip()
+PAGE_FINGERPRINT_BLOCK = int((os.getenv("PAGE_FINGERPRINT_BLOCK") or "1024").strip())
+SEARCH_PAGE_CACHE_MAX = int((os.getenv("SEARCH_PAGE_CACHE_MAX") or "4096").strip())
+# Сколько отрисованных карточек лотов держать в LRU (0 — не кэшировать).
+CARD_CACHE_MAX = int((os.getenv("CARD_CACHE_MAX") or "2048").strip())
+SEEN_TTL_SEC = int((os.getenv("SEEN_TTL_SEC") or str(14 * 86400)).strip())
+SEEN_MAX_PER_USER = int((os.getenv("SEEN_MAX_PER_USER") or "200000").strip())
+SEEN_PRUNE_INTERVAL = int((os.getenv("SEEN_PRUNE_INTERVAL") or "600").strip())
+# Как часто обновлять время последнего появления лота, который всё ещё висит в выдаче.
+SEEN_REFRESH_SEC = int((os.getenv("SEEN_REFRESH_SEC") or str(6 * 3600)).strip())
+# Bloom-фильтр перед точным SeenStore (размер — от SEEN_MAX_PER_USER). Выключен по умолчанию:
+# точный поиск и так занимает единицы микросекунд, фильтр окупается лишь на очень больших историях.
+SEEN_BLOOM = (os.getenv("SEEN_BLOOM") or "0").strip() == "1"
+SEEN_BLOOM_FP_RATE = float((os.getenv("SEEN_BLOOM_FP_RATE") or "0.01").strip())
+WRITE_BEHIND_FLUSH_MS = int((os.getenv("WRITE_BEHIND_FLUSH_MS") or "250").strip())
+WRITE_BEHIND_MAX_ROWS = int((os.getenv("WRITE_BEHIND_MAX_ROWS") or "2000").strip())
+# Сколько раз подряд повторять неудачный сброс, прежде чем выбросить накопленные строки.
+WRITE_BEHIND_MAX_RETRIES = int((os.getenv("WRITE_BEHIND_MAX_RETRIES") or "5").strip())
+DB_READ_POOL_SIZE = int((os.getenv("DB_READ_POOL_SIZE") or "3").strip())
+
+# ====================== JSON CODEC ======================
+# auto: orjson → msgspec → stdlib json. Можно принудительно задать JSON_CODEC=orjson/msgspec/json.
+JSON_CODEC = (os.getenv("JSON_CODEC") or "auto").strip().lower()
+
+
+def _stdlib_json_loads(data: bytes | str):
+    return json.loads(data)
+
+
+def _stdlib_json_dumps(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False)
+
+
+def _select_json_codec():
+    if JSON_CODEC in ("auto", "orjson") and orjson is not None:
+        return "orjson", orjson.loads, lambda obj: orjson.dumps(obj).decode("utf-8")
+    if JSON_CODEC in ("auto", "msgspec") and msgspec is not None:
+        decoder = msgspec.json.Decoder()
+        encoder = msgspec.json.Encoder()
+        return "msgspec", decoder.decode, lambda obj: encoder.encode(obj).decode("utf-8")
+    return "json", _stdlib_json_loads, _stdlib_json_dumps
+
+
+# json_loads принимает bytes напрямую (resp.read()), без промежуточного resp.text().
+# json_dumps возвращает str без \uXXXX-экранирования, как json.dumps(ensure_ascii=False).
+JSON_CODEC_NAME, json_loads, json_dumps = _select_json_codec()
+
 
 # ====================== LOGGING ======================
 AUTOBUY_LOG_FILE = os.getenv("AUTOBUY_LOG_FILE") or "autobuy.log"
@@ -179,12 +309,16 @@ def kb_request() -> ReplyKeyboardMarkup:
     )
 
 
+DIGEST_ON_LABEL = "🗞 Дайджест: вкл"
+DIGEST_OFF_LABEL = "🗞 Дайджест: выкл"
+
+
 def kb_main(user_id: int) -> ReplyKeyboardMarkup:
     rows = [
         [kb_button("🚀 Старт охотника", "success"), kb_button("🛑 Стоп охотника")],
         [kb_button("✨ Проверка лотов", "primary"), kb_button("📊 Статус")],
         [kb_button("📚 Мои URL", "primary"), kb_button("♻️ Сбросить историю")],
-        [kb_button("ℹ️ Инфо")],
+        [kb_button(DIGEST_ON_LABEL if is_digest_mode(user_id) else DIGEST_OFF_LABEL), kb_button("ℹ️ Инфо")],
     ]
     if user_id in OWNER_IDS:
         rows.insert(4, [kb_button("👥 Пользователи", "primary")])
@@ -218,6 +352,10 @@ def _to_bool_label(value) -> str | None:
     return None
 
 
+_WS_RE = re.compile(r"\s+")
+_DESC_WS_RE = re.compile(r"\s{3,}")
+
+
 def _format_value(v, limit: int = 140) -> str:
     if v is None:
         return "—"
@@ -225,8 +363,7 @@ def _format_value(v, limit: int = 140) -> str:
         if isinstance(v, float) and not v.is_integer():
             return f"{v:.2f}".rstrip("0").rstrip(".")
         return f"{int(v):,}".replace(",", " ")
-    s = str(v).strip()
-    s = re.sub(r"\s+", " ", s)
+    s = _WS_RE.sub(" ", str(v).strip())
     if len(s) > limit:
         return s[: limit - 1] + "…"
     return s
@@ -255,25 +392,32 @@ def _pick_first(item: dict, keys: list[str]):
     return None
 
 
-def _collect_item_specs(item: dict) -> list[str]:
-    known_specs = [
-        ("🏆 Трофеи", ["trophies", "cups", "brawl_cup", "clash_cup", "rating"]),
-        ("🔼 Уровень", ["level", "lvl", "user_level", "genshin_level"]),
-        ("🏰 TownHall", ["townhall", "th"]),
-        ("🧩 Ранг", ["rank", "elo", "mmr"]),
-        ("🎖 Прайм", ["prime", "premium", "vip"]),
-        ("📱 Привязка телефона", ["phone_bound", "phone"]),
-        ("📧 Привязка почты", ["email_bound", "email"]),
-        ("📨 Доступ к почте", ["mail_access", "email_access"]),
-        ("🔐 2FA", ["twofa", "2fa", "ga", "guard"]),
-        ("🌍 Регион", ["region", "country", "locale", "server"]),
-        ("🧭 Платформа", ["platform", "device", "os"]),
-        ("🧱 Инвентарь", ["inventory", "inv_value", "skin_count", "items_count"]),
-    ]
+_KNOWN_SPECS = (
+    ("🏆 Трофеи", ("trophies", "cups", "brawl_cup", "clash_cup", "rating")),
+    ("🔼 Уровень", ("level", "lvl", "user_level", "genshin_level")),
+    ("🏰 TownHall", ("townhall", "th")),
+    ("🧩 Ранг", ("rank", "elo", "mmr")),
+    ("🎖 Прайм", ("prime", "premium", "vip")),
+    ("📱 Привязка телефона", ("phone_bound", "phone")),
+    ("📧 Привязка почты", ("email_bound", "email")),
+    ("📨 Доступ к почте", ("mail_access", "email_access")),
+    ("🔐 2FA", ("twofa", "2fa", "ga", "guard")),
+    ("🌍 Регион", ("region", "country", "locale", "server")),
+    ("🧭 Платформа", ("platform", "device", "os")),
+    ("🧱 Инвентарь", ("inventory", "inv_value", "skin_count", "items_count")),
+)
+_SPEC_IGNORED = frozenset({
+    "title", "price", "old_price", "discount", "item_id", "id", "url", "link", "description", "desc",
+    "category", "category_name", "game", "type", "seller_id", "owner_id", "user_id", "views", "view_count",
+    "likes", "favorites", "fav_count", "published_at", "created_at", "date", "time", "updated_at", "edited_at",
+})
+_SCALAR_TYPES = (str, int, float, bool, type(None))
+
 
+def _collect_item_specs(item: dict) -> list[str]:
     specs: list[str] = []
     used: set[str] = set()
-    for label, keys in known_specs:
+    for label, keys in _KNOWN_SPECS:
         raw = _pick_first(item, keys)
         if raw is None:
             continue
@@ -285,16 +429,11 @@ def _collect_item_specs(item: dict) -> list[str]:
         value = bool_label if bool_label is not None else _format_value(raw)
         specs.append(f"• {label}: <b>{html.escape(value)}</b>")
 
-    ignored = {
-        "title", "price", "old_price", "discount", "item_id", "id", "url", "link", "description", "desc",
-        "category", "category_name", "game", "type", "seller_id", "owner_id", "user_id", "views", "view_count",
-        "likes", "favorites", "fav_count", "published_at", "created_at", "date", "time", "updated_at", "edited_at",
-    }
     extras_added = 0
     for k, v in item.items():
         if extras_added >= 8:
             break
-        if k in ignored or k in used:
+        if k in _SPEC_IGNORED or k in used:
             continue
         if v in (None, "", [], {}):
             continue
@@ -343,80 +482,36 @@ def get_send_lock(chat_id: int) -> asyncio.Lock:
 
 
 async def send_bot_message(chat_id: int, text: str, **kwargs):
+    """Прямая отправка (экраны, ответы): бюджет Telegram берётся вне очереди уведомлений."""
     if bot is None:
         raise RuntimeError("Bot не инициализирован")
 
-    lock = get_send_lock(chat_id)
-    async with lock:
-        for attempt in range(3):
-            try:
-                msg = await bot.send_message(chat_id, text, **kwargs)
-                if TG_SEND_DELAY > 0:
-                    await asyncio.sleep(TG_SEND_DELAY)
-                return msg
-            except TelegramRetryAfter as e:
-                await asyncio.sleep(float(getattr(e, "retry_after", 1.5)) + 0.2)
-            except (TelegramBadRequest, TelegramForbiddenError):
-                raise
-            except Exception:
-                if attempt >= 2:
-                    raise
-                await asyncio.sleep(0.01)
+    await tg_scheduler.acquire_direct(chat_id)
+    async with get_send_lock(chat_id):
+        return await _tg_send(chat_id, text, **kwargs)
 
 
-def _get_notify_queue(user_id: int) -> asyncio.Queue:
-    q = user_notify_queues.get(user_id)
-    if q is None:
-        q = asyncio.Queue(maxsize=1500)
-        user_notify_queues[user_id] = q
-    return q
-
-
-async def _notify_worker_loop(user_id: int):
-    q = _get_notify_queue(user_id)
-    while user_search_active[user_id] or not q.empty():
-        try:
-            chat_id, text, kwargs = await asyncio.wait_for(q.get(), timeout=1.0)
-        except asyncio.TimeoutError:
-            continue
-        try:
-            await send_bot_message(chat_id, text, **kwargs)
-        except Exception as e:
-            log_autobuy(f"NOTIFY_SEND_ERR user_id={user_id} err='{_safe_compact(str(e),240)}'")
-        finally:
-            q.task_done()
-
-
-def ensure_notify_worker(user_id: int):
-    task = user_notify_workers.get(user_id)
-    if task and not task.done():
-        return
-    user_notify_workers[user_id] = asyncio.create_task(_notify_worker_loop(user_id))
-
-
-def enqueue_hunter_notification(user_id: int, chat_id: int, text: str, **kwargs):
-    q = _get_notify_queue(user_id)
-    payload = (chat_id, text, kwargs)
-    try:
-        q.put_nowait(payload)
-        return
-    except asyncio.QueueFull:
-        pass
+async def _tg_send(chat_id: int, text: str, **kwargs):
+    if bot is None:
+        raise RuntimeError("Bot не инициализирован")
 
-    dropped = 0
-    while q.full() and not q.empty() and dropped < 200:
+    for attempt in range(3):
         try:
-            q.get_nowait()
-            q.task_done()
-            dropped += 1
+            msg = await bot.send_message(chat_id, text, **kwargs)
+            tg_scheduler.delivered(chat_id)
+            if TG_SEND_DELAY > 0:
+                await asyncio.sleep(TG_SEND_DELAY)
+            return msg
+        except TelegramRetryAfter as e:
+            retry_after = float(getattr(e, "retry_after", 1.5))
+            tg_scheduler.throttled(chat_id, retry_after)
+            await asyncio.sleep(retry_after + 0.2)
+        except (TelegramBadRequest, TelegramForbiddenError):
+            raise
         except Exception:
-            break
-    try:
-        q.put_nowait(payload)
-    except Exception:
-        pass
-    if dropped:
-        log_autobuy(f"NOTIFY_QUEUE_DROP user_id={user_id} dropped={dropped}")
+            if attempt >= 2:
+                raise
+            await asyncio.sleep(0.01)
 
 
 def make_item_key(item: dict) -> str:
@@ -438,17 +533,262 @@ def parse_index_from_button(text: str) -> int | None:
         return None
 
 
+# ====================== SEEN STORE ======================
+class BloomFilter:
+    """Bloom-фильтр по строковым ключам: double hashing поверх встроенного hash(str).
+
+    Хеш строки кэшируется в самом объекте ключа, поэтому повторная проверка Lot.key почти
+    бесплатна. hash() зависит от процесса, так что фильтр живёт только в памяти и
+    собирается из точного множества при загрузке истории.
+    """
+
+    def __init__(self, capacity: int, fp_rate: float):
+        capacity = max(1, int(capacity))
+        fp_rate = min(max(fp_rate, 1e-6), 0.5)
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.m = max(64, int(math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2))))
+        self.k = max(1, int(round(self.m / capacity * math.log(2))))
+        self.bits = bytearray((self.m + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str) -> range:
+        h = hash(key) & 0xFFFFFFFFFFFFFFFF
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        return range(h1, h1 + self.k * h2, h2)
+
+    def add(self, key: str):
+        bits, m = self.bits, self.m
+        for pos in self._positions(key):
+            pos %= m
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        bits, m = self.bits, self.m
+        for pos in self._positions(key):
+            pos %= m
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self.bits)
+
+    def estimated_fp_rate(self) -> float:
+        return (1.0 - math.exp(-self.k * self.count / self.m)) ** self.k
+
+
+class SeenStore:
+    """Множество увиденных ключей лотов с вытеснением по сроку (SEEN_TTL_SEC) и размеру.
+
+    Ключи вида id::<число> хранятся как int64 в отсортированном массиве (поиск через bisect)
+    с параллельным массивом времени последнего появления; остальные (noid::...) — в dict.
+    Новые id копятся в небольшом буфере и вливаются в массив пачкой. Вытесняются ключи,
+    которые дольше всех не встречались в выдаче (см. refresh).
+    """
+
+    MERGE_BATCH = 1024
+
+    def __init__(self, ttl: int = SEEN_TTL_SEC, max_size: int = SEEN_MAX_PER_USER, refresh_sec: int = SEEN_REFRESH_SEC):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.refresh_sec = refresh_sec
+        self._ids = array("q")
+        self._ts = array("q")
+        self._pending: dict[int, int] = {}
+        self._other: dict[str, int] = {}
+        self.bloom: BloomFilter | None = None
+        self.bloom_stats = {"checks": 0, "definitely_new": 0, "false_positives": 0}
+
+    @classmethod
+    def from_rows(cls, rows, ttl: int = SEEN_TTL_SEC, max_size: int = SEEN_MAX_PER_USER) -> "SeenStore":
+        """rows: (item_key, ts)."""
+        store = cls(ttl=ttl, max_size=max_size)
+        latest: dict[int, int] = {}
+        for key, ts in rows:
+            ts = int(ts or 0)
+            iid = cls._int_id(key)
+            if iid is None:
+                if ts >= store._other.get(key, ts):
+                    store._other[key] = ts
+            elif ts >= latest.get(iid, ts):
+                latest[iid] = ts
+        ordered = sorted(latest.items())
+        store._ids = array("q", (iid for iid, _ in ordered))
+        store._ts = array("q", (ts for _, ts in ordered))
+        store._evict_over_size()
+        return store
+
+    @staticmethod
+    def _int_id(key: str) -> int | None:
+        if key.startswith("id::"):
+            rest = key[4:]
+            if rest.isascii() and rest.isdigit() and len(rest) < 19:
+                return int(rest)
+        return None
+
+    def _index(self, iid: int) -> int:
+        ids = self._ids
+        pos = bisect_left(ids, iid)
+        return pos if pos < len(ids) and ids[pos] == iid else -1
+
+    def __contains__(self, key: str) -> bool:
+        bloom = self.bloom
+        if bloom is None:
+            return self._contains_exact(key)
+        stats = self.bloom_stats
+        stats["checks"] += 1
+        if key not in bloom:
+            stats["definitely_new"] += 1
+            return False
+        if self._contains_exact(key):
+            return True
+        stats["false_positives"] += 1
+        return False
+
+    def _contains_exact(self, key: str) -> bool:
+        iid = self._int_id(key)
+        if iid is None:
+            return key in self._other
+        return iid in self._pending or self._index(iid) >= 0
+
+    def keys(self):
+        for iid in self._ids:
+            yield f"id::{iid}"
+        for iid in self._pending:
+            yield f"id::{iid}"
+        yield from self._other
+
+    def _bloom_capacity(self) -> int:
+        if self.max_size > 0:
+            # с запасом на пачку, которую add() допускает сверх max_size до вытеснения
+            return self.max_size + max(64, self.max_size // 16)
+        return max(10000, 2 * len(self))
+
+    def enable_bloom(self, fp_rate: float = SEEN_BLOOM_FP_RATE):
+        """Включает фильтр и заполняет его текущими ключами; повторный вызов пересобирает его."""
+        bloom = BloomFilter(self._bloom_capacity(), fp_rate)
+        for key in self.keys():
+            bloom.add(key)
+        self.bloom = bloom
+
+    def __len__(self) -> int:
+        return len(self._ids) + len(self._pending) + len(self._other)
+
+    def add(self, key: str, ts: int | None = None) -> bool:
+        if self._contains_exact(key):
+            return False
+        if self.bloom is not None:
+            self.bloom.add(key)
+        ts = int(time.time()) if ts is None else int(ts)
+        iid = self._int_id(key)
+        if iid is None:
+            self._other[key] = ts
+        else:
+            self._pending[iid] = ts
+            if len(self._pending) >= self.MERGE_BATCH:
+                self._merge()
+        # Вытесняем пачкой с запасом, чтобы не перестраивать массивы на каждом добавлении.
+        if self.max_size > 0 and len(self) > self.max_size + max(64, self.max_size // 16):
+            self._evict_over_size()
+        return True
+
+    def refresh(self, key: str, ts: int | None = None) -> bool:
+        """Отмечает, что ключ снова встретился в выдаче. True — если время обновлено
+        (не чаще раза в refresh_sec), и его стоит записать в базу."""
+        ts = int(time.time()) if ts is None else int(ts)
+        iid = self._int_id(key)
+        if iid is None:
+            old = self._other.get(key)
+            if old is None or ts - old < self.refresh_sec:
+                return False
+            self._other[key] = ts
+            return True
+        old = self._pending.get(iid)
+        if old is not None:
+            if ts - old < self.refresh_sec:
+                return False
+            self._pending[iid] = ts
+            return True
+        pos = self._index(iid)
+        if pos < 0 or ts - self._ts[pos] < self.refresh_sec:
+            return False
+        self._ts[pos] = ts
+        return True
+
+    def clear(self):
+        self._ids = array("q")
+        self._ts = array("q")
+        self._pending.clear()
+        self._other.clear()
+        if self.bloom is not None:
+            self.enable_bloom(self.bloom.fp_rate)
+
+    def _merge(self):
+        if not self._pending:
+            return
+        old_ids, old_ts = self._ids, self._ts
+        ids, stamps = array("q"), array("q")
+        start = 0
+        for iid, ts in sorted(self._pending.items()):
+            pos = bisect_left(old_ids, iid, start)
+            ids.extend(old_ids[start:pos])
+            stamps.extend(old_ts[start:pos])
+            ids.append(iid)
+            stamps.append(ts)
+            start = pos
+        ids.extend(old_ids[start:])
+        stamps.extend(old_ts[start:])
+        self._ids, self._ts = ids, stamps
+        self._pending.clear()
+
+    def _keep_newer_than(self, threshold: int):
+        keep = [i for i, ts in enumerate(self._ts) if ts > threshold]
+        if len(keep) != len(self._ts):
+            self._ids = array("q", (self._ids[i] for i in keep))
+            self._ts = array("q", (self._ts[i] for i in keep))
+        self._other = {k: ts for k, ts in self._other.items() if ts > threshold}
+
+    def _evict_over_size(self):
+        if self.max_size <= 0:
+            return
+        self._merge()
+        excess = len(self) - self.max_size
+        if excess <= 0:
+            return
+        # Строковые ключи редки: вытесняем их наравне с id по времени последнего появления.
+        # При равных отметках уходит чуть больше ключей, чем нужно, — это безопасно.
+        stamps = sorted([*self._ts, *self._other.values()])
+        self._keep_newer_than(stamps[excess - 1])
+
+    def prune(self, now: float | None = None) -> int:
+        before = len(self)
+        self._merge()
+        if self.ttl > 0:
+            cutoff = int(now if now is not None else time.time()) - self.ttl
+            self._keep_newer_than(cutoff - 1)
+        self._evict_over_size()
+        # Из Bloom-фильтра удалить нельзя: пересобираем, когда он забит вытесненными ключами.
+        if self.bloom is not None and self.bloom.count > self.bloom.capacity:
+            self.enable_bloom(self.bloom.fp_rate)
+        return before - len(self)
+
+
 # ====================== STATE ======================
 user_search_active = defaultdict(lambda: False)
 user_hunter_mode = defaultdict(lambda: "off")  # off/classic
-user_seen_items = defaultdict(set)
-user_buy_attempted = defaultdict(set)
+user_seen_items = defaultdict(SeenStore)
+# Попытки автобая не вытесняются: иначе долго висящий лот купился бы повторно.
+user_buy_attempted = defaultdict(lambda: SeenStore(ttl=0, max_size=0))
+user_source_watermarks = defaultdict(dict)  # url -> (published_at, item_id)
+# url -> (последний полностью обработанный список items, когда его id последний раз продлевались)
+user_source_pages = defaultdict(dict)
 user_hunter_tasks: dict[int, asyncio.Task] = {}
 user_hunter_start_locks: dict[int, asyncio.Lock] = {}
 user_history_reset_pending = defaultdict(lambda: False)
 
-user_notify_queues: dict[int, asyncio.Queue] = {}
-user_notify_workers: dict[int, asyncio.Task] = {}
 
 user_modes = defaultdict(lambda: None)
 user_started = set()
@@ -462,12 +802,12 @@ user_pending_url = defaultdict(lambda: None)
 user_pending_rename_url = defaultdict(lambda: None)
 user_page_state = defaultdict(lambda: {"ctx": None, "page": 0})
 
-autobuy_endpoint_cache: dict[str, list[str]] = {}
 buy_locks: dict[str, asyncio.Lock] = {}
 buy_semaphore = asyncio.Semaphore(int((os.getenv("BUY_SEMAPHORE") or "128").strip()))
 
 
 def get_buy_lock(item_key: str) -> asyncio.Lock:
+    """Сериализует покупки одного лота внутри процесса (между воркерами HUNTER_WORKERS — нет)."""
     lock = buy_locks.get(item_key)
     if lock is None:
         lock = asyncio.Lock()
@@ -508,8 +848,15 @@ async def send_screen(chat_id: int, user_id: int, text: str, reply_markup: Reply
 
 
 async def upsert_no_lots_message(chat_id: int, user_id: int, text: str):
+    if hunter_ipc is not None:
+        user_no_lots_msg_id[user_id] = None
+        hunter_ipc.status(user_id, chat_id, text)
+        return
     if bot is None:
         return
+    # Статус обновляется каждый пустой цикл; при занятом бюджете Telegram просто пропускаем его.
+    if not tg_scheduler.try_acquire_now(chat_id):
+        return
 
     mid = user_no_lots_msg_id.get(user_id)
     if mid:
@@ -528,13 +875,20 @@ async def upsert_no_lots_message(chat_id: int, user_id: int, text: str):
             pass
 
     try:
-        msg = await send_bot_message(chat_id, text, parse_mode="HTML", disable_web_page_preview=True)
+        async with get_send_lock(chat_id):
+            msg = await _tg_send(chat_id, text, parse_mode="HTML", disable_web_page_preview=True)
         user_no_lots_msg_id[user_id] = msg.message_id
     except Exception:
         pass
 
 
 def reset_no_lots_message(user_id: int):
+    if hunter_ipc is not None:
+        if user_no_lots_msg_id.get(user_id) is not False:
+            # Пока новые лоты идут подряд, сброс шлём один раз, а не каждый цикл.
+            user_no_lots_msg_id[user_id] = False
+            hunter_ipc.emit("status_reset", user_id=user_id)
+        return
     user_no_lots_msg_id[user_id] = None
 
 
@@ -614,6 +968,10 @@ def parse_user_id_from_button(text: str) -> int | None:
 # ====================== DB ======================
 _db: aiosqlite.Connection | None = None
 _db_lock = asyncio.Lock()
+# Читатели: отдельные read-only соединения (WAL), не ждут _db_lock и пишущее соединение.
+_db_read_pool: asyncio.Queue | None = None
+_db_read_conns: list[aiosqlite.Connection] = []
+_db_read_pool_lock = asyncio.Lock()
 
 
 async def db_conn() -> aiosqlite.Connection:
@@ -626,8 +984,33 @@ async def db_conn() -> aiosqlite.Connection:
     return _db
 
 
+async def _db_read_pool_get() -> asyncio.Queue | None:
+    global _db_read_pool
+    if DB_READ_POOL_SIZE <= 0:
+        return None
+    if _db_read_pool is None:
+        async with _db_read_pool_lock:
+            if _db_read_pool is None:
+                # Файл БД и режим WAL создаёт пишущее соединение, read-only их создать не может.
+                await db_conn()
+                uri = Path(DB_FILE).resolve().as_uri() + "?mode=ro"
+                pool = asyncio.Queue()
+                for _ in range(DB_READ_POOL_SIZE):
+                    conn = await aiosqlite.connect(uri, uri=True)
+                    _db_read_conns.append(conn)
+                    pool.put_nowait(conn)
+                _db_read_pool = pool
+    return _db_read_pool
+
+
 async def db_close():
-    global _db
+    global _db, _db_read_pool
+    _db_read_pool = None
+    while _db_read_conns:
+        try:
+            await _db_read_conns.pop().close()
+        except Exception:
+            pass
     if _db is not None:
         await _db.close()
         _db = None
@@ -642,31 +1025,160 @@ async def db_execute(query: str, params: tuple = (), commit: bool = False):
         return cur
 
 
-async def db_executemany(query: str, params_seq, commit: bool = False):
-    db = await db_conn()
-    async with _db_lock:
-        cur = await db.executemany(query, params_seq)
-        if commit:
-            await db.commit()
-        return cur
-
-
 async def db_fetchone(query: str, params: tuple = ()):
-    db = await db_conn()
-    async with _db_lock:
-        cur = await db.execute(query, params)
+    pool = await _db_read_pool_get()
+    if pool is None:
+        db = await db_conn()
+        async with _db_lock:
+            cur = await db.execute(query, params)
+            row = await cur.fetchone()
+            await cur.close()
+            return row
+
+    conn = await pool.get()
+    try:
+        cur = await conn.execute(query, params)
         row = await cur.fetchone()
         await cur.close()
         return row
+    finally:
+        pool.put_nowait(conn)
 
 
 async def db_fetchall(query: str, params: tuple = ()):
-    db = await db_conn()
-    async with _db_lock:
-        cur = await db.execute(query, params)
+    pool = await _db_read_pool_get()
+    if pool is None:
+        db = await db_conn()
+        async with _db_lock:
+            cur = await db.execute(query, params)
+            rows = await cur.fetchall()
+            await cur.close()
+            return rows
+
+    conn = await pool.get()
+    try:
+        cur = await conn.execute(query, params)
         rows = await cur.fetchall()
         await cur.close()
         return rows
+    finally:
+        pool.put_nowait(conn)
+
+
+class WriteBehindQueue:
+    """Отложенная запись: операции всех пользователей сливаются в одну транзакцию.
+
+    Сброс раз в WRITE_BEHIND_FLUSH_MS или при накоплении WRITE_BEHIND_MAX_ROWS строк.
+    Порядок операций сохраняется, подряд идущие одинаковые запросы склеиваются в executemany.
+    """
+
+    def __init__(self, flush_interval: float, max_rows: int):
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self._ops: list[tuple[str, list[tuple]]] = []
+        self._rows = 0
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._flush_lock = asyncio.Lock()
+        self._closing = False
+        self.commits = 0
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.failures = 0
+
+    @property
+    def pending_rows(self) -> int:
+        return self._rows
+
+    def submit(self, query: str, rows: list[tuple]):
+        if not rows:
+            return
+        if self._ops and self._ops[-1][0] == query:
+            self._ops[-1][1].extend(rows)
+        else:
+            self._ops.append((query, list(rows)))
+        self._rows += len(rows)
+        self._ensure_worker()
+        if self._rows >= self.max_rows:
+            self._wakeup.set()
+
+    def _ensure_worker(self):
+        if self._task is None or self._task.done():
+            self._closing = False
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                log_autobuy(f"WRITE_BEHIND_ERR rows={self._rows} err='{_safe_compact(str(e),240)}'")
+                if not self._closing:
+                    await asyncio.sleep(self.flush_interval)
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._ops:
+                return
+            ops, rows = self._ops, self._rows
+            self._ops, self._rows = [], 0
+            db = await db_conn()
+            async with _db_lock:
+                # Своя точка сохранения: откат не должен трогать чужие незакоммиченные запросы
+                # на общем соединении (например, db_execute(..., commit=False)).
+                released = False
+                try:
+                    await db.execute("SAVEPOINT write_behind")
+                    for query, params in ops:
+                        await db.executemany(query, params)
+                    await db.execute("RELEASE write_behind")
+                    released = True
+                    await db.commit()
+                except BaseException as e:
+                    if released:
+                        # строки уже в транзакции соединения, COMMIT поставлен в очередь aiosqlite
+                        raise
+                    # Отмена (CancelledError) тоже откатывает пачку и возвращает её в очередь.
+                    try:
+                        await db.execute("ROLLBACK TO write_behind")
+                        await db.execute("RELEASE write_behind")
+                    except Exception:
+                        pass
+                    if isinstance(e, Exception):
+                        self.failures += 1
+                        if self.failures >= WRITE_BEHIND_MAX_RETRIES:
+                            self.failures = 0
+                            self.rows_dropped += rows
+                            log_autobuy(f"WRITE_BEHIND_DROP rows={rows} err='{_safe_compact(str(e),240)}'")
+                            raise
+                    # Возвращаем в начало очереди, чтобы не потерять и не переставить операции.
+                    self._ops = ops + self._ops
+                    self._rows += rows
+                    raise
+            self.failures = 0
+            self.commits += 1
+            self.rows_written += rows
+
+    async def close(self):
+        """Останавливает цикл без отмены: текущий сброс дописывается, затем сбрасывается остаток."""
+        self._closing = True
+        if self._task is not None:
+            self._wakeup.set()
+            try:
+                await self._task
+            except Exception:
+                pass
+            self._task = None
+        await self.flush()
+
+
+persistence_writer = WriteBehindQueue(WRITE_BEHIND_FLUSH_MS / 1000.0, WRITE_BEHIND_MAX_ROWS)
 
 
 async def init_db():
@@ -689,6 +1201,10 @@ async def init_db():
         await db_execute("ALTER TABLE urls ADD COLUMN autobuy INTEGER DEFAULT 0", commit=True)
     if "name" not in cols:
         await db_execute("ALTER TABLE urls ADD COLUMN name TEXT DEFAULT ''", commit=True)
+    if "wm_published_at" not in cols:
+        await db_execute("ALTER TABLE urls ADD COLUMN wm_published_at INTEGER DEFAULT 0", commit=True)
+    if "wm_item_id" not in cols:
+        await db_execute("ALTER TABLE urls ADD COLUMN wm_item_id INTEGER DEFAULT 0", commit=True)
 
     await db_execute("""
         CREATE TABLE IF NOT EXISTS seen (
@@ -725,28 +1241,96 @@ async def init_db():
         await db_execute("ALTER TABLE users ADD COLUMN last_request_ts INTEGER DEFAULT 0", commit=True)
     if "last_error_report" not in ucols:
         await db_execute("ALTER TABLE users ADD COLUMN last_error_report INTEGER DEFAULT 0", commit=True)
+    if "digest_mode" not in ucols:
+        await db_execute("ALTER TABLE users ADD COLUMN digest_mode INTEGER DEFAULT 0", commit=True)
 
     await db_execute(
         "CREATE INDEX IF NOT EXISTS idx_urls_user_added ON urls(user_id, added_at, url)",
         commit=True,
     )
+    await db_execute("CREATE INDEX IF NOT EXISTS idx_seen_at ON seen(seen_at)", commit=True)
+    await db_execute("CREATE INDEX IF NOT EXISTS idx_buy_attempted_at ON buy_attempted(attempted_at)", commit=True)
+
+    await db_execute("""
+        CREATE TABLE IF NOT EXISTS autobuy_endpoints (
+            host TEXT,
+            template TEXT,
+            payload INTEGER,
+            encoding TEXT,
+            attempts INTEGER DEFAULT 0,
+            hits INTEGER DEFAULT 0,
+            hit_ms REAL DEFAULT 0,
+            updated_at INTEGER DEFAULT 0,
+            PRIMARY KEY(host, template, payload, encoding)
+        )
+    """, commit=True)
 
 
 async def db_ensure_user(user_id: int):
+    is_owner = user_id in OWNER_IDS
     await db_execute(
         "INSERT OR IGNORE INTO users(user_id, role, allowed, last_error_report, last_request_ts) VALUES (?, ?, ?, ?, ?)",
-        (user_id, "unknown", 1 if user_id in OWNER_IDS else 0, 0, 0),
-        commit=True,
+        (user_id, "unknown", 1 if is_owner else 0, 0, 0),
+        commit=not is_owner,
     )
-    if user_id in OWNER_IDS:
+    if is_owner:
         await db_execute("UPDATE users SET allowed=1 WHERE user_id=?", (user_id,), commit=True)
 
 
+# Write-through кэш строк users: обработчик сообщений не ходит в БД для известных пользователей.
+# Все изменения users проходят через функции ниже и сразу обновляют кэш.
+user_profiles: dict[int, dict] = {}
+
+
+def _profile_update(user_id: int, **fields):
+    prof = user_profiles.get(user_id)
+    if prof is not None:
+        prof.update(fields)
+    hunter_workers.send(user_id, "profile", fields=fields)
+
+
+async def db_load_user_profile(user_id: int) -> dict | None:
+    row = await db_fetchone(
+        "SELECT allowed, role, last_request_ts, last_error_report, digest_mode FROM users WHERE user_id=?",
+        (user_id,),
+    )
+    if not row:
+        user_profiles.pop(user_id, None)
+        return None
+    prof = {
+        "allowed": bool(row[0]) or user_id in OWNER_IDS,
+        "role": str(row[1] or "unknown"),
+        "last_request_ts": int(row[2] or 0),
+        "last_error_report": int(row[3] or 0),
+        "digest": bool(row[4]),
+    }
+    user_profiles[user_id] = prof
+    user_roles[user_id] = prof["role"]
+    return prof
+
+
+async def _user_profile(user_id: int) -> dict | None:
+    prof = user_profiles.get(user_id)
+    if prof is None:
+        prof = await db_load_user_profile(user_id)
+    return prof
+
+
+def is_digest_mode(user_id: int) -> bool:
+    prof = user_profiles.get(user_id)
+    return bool(prof and prof.get("digest"))
+
+
+async def db_set_digest_mode(user_id: int, enabled: bool):
+    await db_execute("UPDATE users SET digest_mode=? WHERE user_id=?", (1 if enabled else 0, user_id), commit=True)
+    _profile_update(user_id, digest=bool(enabled))
+
+
 async def db_is_allowed(user_id: int) -> bool:
     if user_id in OWNER_IDS:
         return True
-    row = await db_fetchone("SELECT allowed FROM users WHERE user_id=?", (user_id,))
-    return bool(row[0]) if row else False
+    prof = await _user_profile(user_id)
+    return prof["allowed"] if prof else False
 
 
 async def db_toggle_allowed(target_user_id: int) -> bool:
@@ -758,7 +1342,9 @@ async def db_toggle_allowed(target_user_id: int) -> bool:
         commit=True,
     )
     row = await db_fetchone("SELECT allowed FROM users WHERE user_id=?", (target_user_id,))
-    return bool(row[0]) if row else False
+    allowed = bool(row[0]) if row else False
+    _profile_update(target_user_id, allowed=allowed)
+    return allowed
 
 
 async def db_list_users(limit: int, offset: int):
@@ -775,26 +1361,23 @@ async def db_count_users() -> int:
 
 
 async def db_get_last_request_ts(user_id: int) -> int:
-    row = await db_fetchone("SELECT last_request_ts FROM users WHERE user_id=?", (user_id,))
-    return int(row[0]) if row and row[0] is not None else 0
+    prof = await _user_profile(user_id)
+    return prof["last_request_ts"] if prof else 0
 
 
 async def db_set_last_request_ts(user_id: int, ts: int):
     await db_execute("UPDATE users SET last_request_ts=? WHERE user_id=?", (ts, user_id), commit=True)
-
-
-async def db_get_role(user_id: int) -> str:
-    row = await db_fetchone("SELECT role FROM users WHERE user_id=?", (user_id,))
-    return row[0] if row else "unknown"
+    _profile_update(user_id, last_request_ts=int(ts))
 
 
 async def db_get_last_report(user_id: int) -> int:
-    row = await db_fetchone("SELECT last_error_report FROM users WHERE user_id=?", (user_id,))
-    return int(row[0]) if row and row[0] is not None else 0
+    prof = await _user_profile(user_id)
+    return prof["last_error_report"] if prof else 0
 
 
 async def db_set_last_report(user_id: int, ts: int):
     await db_execute("UPDATE users SET last_error_report=? WHERE user_id=?", (ts, user_id), commit=True)
+    _profile_update(user_id, last_error_report=int(ts))
 
 
 async def db_get_urls(user_id: int):
@@ -805,29 +1388,117 @@ async def db_get_urls(user_id: int):
     return [{"url": url, "name": name or "", "enabled": bool(enabled), "autobuy": bool(autobuy)} for url, name, enabled, autobuy in rows]
 
 
+# URL-мутаторы сразу правят user_urls (write-through), поэтому перечитывать список из БД не нужно.
+# До load_user_data кэша ещё нет — его целиком заполнит загрузка.
+def _cached_url_entry(user_id: int, url: str) -> dict | None:
+    if user_id not in user_started:
+        return None
+    for src in user_urls[user_id]:
+        if src.get("url") == url:
+            return src
+    return None
+
+
 async def db_add_url(user_id: int, url: str, name: str):
     await db_execute(
-        "INSERT OR IGNORE INTO urls(user_id, url, name, added_at, enabled, autobuy) VALUES (?, ?, ?, ?, 1, 0)",
+        "INSERT INTO urls(user_id, url, name, added_at, enabled, autobuy) VALUES (?, ?, ?, ?, 1, 0) "
+        "ON CONFLICT(user_id, url) DO UPDATE SET name=excluded.name",
         (user_id, url, name or "", int(time.time())),
         commit=True,
     )
-    await db_execute("UPDATE urls SET name=? WHERE user_id=? AND url=?", (name or "", user_id, url), commit=True)
+    if user_id in user_started:
+        entry = _cached_url_entry(user_id, url)
+        if entry is not None:
+            entry["name"] = name or ""
+        else:
+            user_urls[user_id].append({"url": url, "name": name or "", "enabled": True, "autobuy": False})
+        bump_user_sources(user_id)
 
 
 async def db_set_url_name(user_id: int, url: str, name: str):
     await db_execute("UPDATE urls SET name=? WHERE user_id=? AND url=?", (name or "", user_id, url), commit=True)
+    entry = _cached_url_entry(user_id, url)
+    if entry is not None:
+        entry["name"] = name or ""
+        bump_user_sources(user_id)
 
 
 async def db_remove_url(user_id: int, url: str):
+    # Отложенные отметки по этому URL должны лечь до удаления, а не на повторно добавленную строку.
+    await persistence_writer.flush()
     await db_execute("DELETE FROM urls WHERE user_id=? AND url=?", (user_id, url), commit=True)
+    if user_id in user_started:
+        user_urls[user_id] = [src for src in user_urls[user_id] if src.get("url") != url]
+        bump_user_sources(user_id)
+    user_source_watermarks[user_id].pop(url, None)
 
 
 async def db_set_url_enabled(user_id: int, url: str, enabled: bool):
     await db_execute("UPDATE urls SET enabled=? WHERE user_id=? AND url=?", (1 if enabled else 0, user_id, url), commit=True)
+    entry = _cached_url_entry(user_id, url)
+    if entry is not None:
+        entry["enabled"] = bool(enabled)
+        bump_user_sources(user_id)
 
 
 async def db_set_url_autobuy(user_id: int, url: str, autobuy: bool):
     await db_execute("UPDATE urls SET autobuy=? WHERE user_id=? AND url=?", (1 if autobuy else 0, user_id, url), commit=True)
+    entry = _cached_url_entry(user_id, url)
+    if entry is not None:
+        entry["autobuy"] = bool(autobuy)
+        bump_user_sources(user_id)
+
+
+async def db_load_watermarks(user_id: int) -> dict[str, tuple[int, int]]:
+    await persistence_writer.flush()
+    rows = await db_fetchall(
+        "SELECT url, wm_published_at, wm_item_id FROM urls WHERE user_id=?",
+        (user_id,),
+    )
+    out = {}
+    for url, ts, iid in rows:
+        if ts or iid:
+            out[url] = (int(ts or 0), int(iid or 0))
+    return out
+
+
+async def db_set_watermarks_batch(user_id: int, marks: dict[str, tuple[int, int]]):
+    if not marks:
+        return
+    rows = [(ts, iid, user_id, url) for url, (ts, iid) in marks.items()]
+    persistence_writer.submit("UPDATE urls SET wm_published_at=?, wm_item_id=? WHERE user_id=? AND url=?", rows)
+
+
+async def db_clear_watermarks(user_id: int):
+    persistence_writer.submit("UPDATE urls SET wm_published_at=0, wm_item_id=0 WHERE user_id=?", [(user_id,)])
+
+
+async def db_load_autobuy_endpoints() -> list[tuple]:
+    return await db_fetchall(
+        "SELECT host, template, payload, encoding, attempts, hits, hit_ms FROM autobuy_endpoints"
+    )
+
+
+def db_save_autobuy_endpoints(items: list[tuple[tuple[str, str, int, str], list]]):
+    """items — приращения (attempts, hits, hit_ms) с прошлого сохранения.
+
+    Процессы-охотники пишут в одну таблицу, поэтому строки складываются, а не перезаписываются;
+    при превышении AUTOBUY_MODEL_MAX_ATTEMPTS счётчики делятся пополам, как в памяти.
+    """
+    if not items:
+        return
+    now = int(time.time())
+    over = f"attempts + excluded.attempts > {int(AUTOBUY_MODEL_MAX_ATTEMPTS)}"
+    persistence_writer.submit(
+        "INSERT INTO autobuy_endpoints(host, template, payload, encoding, attempts, hits, hit_ms, updated_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT(host, template, payload, encoding) DO UPDATE SET "
+        f"attempts=CASE WHEN {over} THEN (attempts + excluded.attempts) / 2 ELSE attempts + excluded.attempts END, "
+        f"hits=CASE WHEN {over} THEN (hits + excluded.hits) / 2 ELSE hits + excluded.hits END, "
+        f"hit_ms=CASE WHEN {over} THEN (hit_ms + excluded.hit_ms) / 2 ELSE hit_ms + excluded.hit_ms END, "
+        "updated_at=excluded.updated_at",
+        [(*key, row[0], row[1], row[2], now) for key, row in items],
+    )
 
 
 def _load_seed_urls() -> list[tuple[str, str]]:
@@ -874,24 +1545,32 @@ async def db_mark_seen_batch(user_id: int, keys: list[str]):
         return
     now = int(time.time())
     rows = [(user_id, k, now) for k in keys]
-    await db_executemany("INSERT OR IGNORE INTO seen(user_id, item_key, seen_at) VALUES (?, ?, ?)", rows, commit=True)
+    persistence_writer.submit("INSERT OR IGNORE INTO seen(user_id, item_key, seen_at) VALUES (?, ?, ?)", rows)
 
 
-async def db_load_seen(user_id: int):
-    rows = await db_fetchall("SELECT item_key FROM seen WHERE user_id=?", (user_id,))
-    return {r[0] for r in rows}
+async def db_touch_seen_batch(user_id: int, keys: list[str]):
+    if not keys:
+        return
+    now = int(time.time())
+    rows = [(now, user_id, k) for k in keys]
+    persistence_writer.submit("UPDATE seen SET seen_at=? WHERE user_id=? AND item_key=?", rows)
+
+
+async def db_load_seen(user_id: int) -> SeenStore:
+    await persistence_writer.flush()
+    rows = await db_fetchall("SELECT item_key, seen_at FROM seen WHERE user_id=? ORDER BY seen_at", (user_id,))
+    store = SeenStore.from_rows(rows)
+    if SEEN_BLOOM:
+        store.enable_bloom()
+    return store
 
 
 async def db_clear_seen(user_id: int):
-    await db_execute("DELETE FROM seen WHERE user_id=?", (user_id,), commit=True)
+    persistence_writer.submit("DELETE FROM seen WHERE user_id=?", [(user_id,)])
 
 
 async def db_mark_buy_attempted(user_id: int, key: str):
-    await db_execute(
-        "INSERT OR IGNORE INTO buy_attempted(user_id, item_key, attempted_at) VALUES (?, ?, ?)",
-        (user_id, key, int(time.time())),
-        commit=True,
-    )
+    await db_mark_buy_attempted_batch(user_id, [key])
 
 
 async def db_mark_buy_attempted_batch(user_id: int, keys: list[str]):
@@ -899,16 +1578,36 @@ async def db_mark_buy_attempted_batch(user_id: int, keys: list[str]):
         return
     ts = int(time.time())
     rows = [(user_id, k, ts) for k in keys]
-    await db_executemany("INSERT OR IGNORE INTO buy_attempted(user_id, item_key, attempted_at) VALUES (?, ?, ?)", rows, commit=True)
+    persistence_writer.submit("INSERT OR IGNORE INTO buy_attempted(user_id, item_key, attempted_at) VALUES (?, ?, ?)", rows)
 
 
-async def db_load_buy_attempted(user_id: int):
-    rows = await db_fetchall("SELECT item_key FROM buy_attempted WHERE user_id=?", (user_id,))
-    return {r[0] for r in rows}
+async def db_load_buy_attempted(user_id: int) -> SeenStore:
+    await persistence_writer.flush()
+    rows = await db_fetchall(
+        "SELECT item_key, attempted_at FROM buy_attempted WHERE user_id=? ORDER BY attempted_at",
+        (user_id,),
+    )
+    return SeenStore.from_rows(rows, ttl=0, max_size=0)
 
 
 async def db_clear_buy_attempted(user_id: int):
-    await db_execute("DELETE FROM buy_attempted WHERE user_id=?", (user_id,), commit=True)
+    persistence_writer.submit("DELETE FROM buy_attempted WHERE user_id=?", [(user_id,)])
+
+
+async def db_prune_history(ttl: int, max_per_user: int):
+    await persistence_writer.flush()
+    # buy_attempted не чистится: повторная покупка того же лота хуже лишней строки в базе.
+    if ttl > 0:
+        cutoff = int(time.time()) - ttl
+        await db_execute("DELETE FROM seen WHERE seen_at < ?", (cutoff,), commit=True)
+    if max_per_user > 0:
+        await db_execute(
+            "DELETE FROM seen WHERE rowid IN ("
+            "SELECT rowid FROM (SELECT rowid, ROW_NUMBER() OVER "
+            "(PARTITION BY user_id ORDER BY seen_at DESC) AS rn FROM seen) WHERE rn > ?)",
+            (max_per_user,),
+            commit=True,
+        )
 
 
 # ====================== LOAD USER DATA ======================
@@ -918,14 +1617,17 @@ async def load_user_data(user_id: int, force: bool = False):
     await db_ensure_user(user_id)
     await db_seed_urls_if_empty(user_id)
     user_urls[user_id] = await db_get_urls(user_id)
+    bump_user_sources(user_id)
     user_seen_items[user_id] = await db_load_seen(user_id)
     user_buy_attempted[user_id] = await db_load_buy_attempted(user_id)
-    user_roles[user_id] = await db_get_role(user_id)
+    user_source_watermarks[user_id] = await db_load_watermarks(user_id)
+    await db_load_user_profile(user_id)
     user_started.add(user_id)
 
 
 async def get_user_role(user_id: int) -> str | None:
-    await load_user_data(user_id)
+    if user_id not in user_started:
+        await load_user_data(user_id)
     role = user_roles.get(user_id, "unknown")
     return None if role == "unknown" else role
 
@@ -1006,6 +1708,18 @@ def normalize_url(url: str) -> str:
     return urlunsplit((scheme, netloc, path, query, ""))
 
 
+def _incremental_url(url: str, watermark: tuple[int, int] | None) -> str:
+    if not INCREMENTAL_QUERY_PARAM or not watermark or watermark[0] <= 0:
+        return url
+    try:
+        parts = urlsplit(url)
+        pairs = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k != INCREMENTAL_QUERY_PARAM]
+        pairs.append((INCREMENTAL_QUERY_PARAM, str(watermark[0])))
+        return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(pairs), ""))
+    except Exception:
+        return url
+
+
 def _item_sort_key(item: dict) -> tuple[int, int]:
     published_at = item.get("published_at") or item.get("created_at") or item.get("date") or item.get("time")
     try:
@@ -1022,34 +1736,459 @@ def _item_sort_key(item: dict) -> tuple[int, int]:
     return ts, iid
 
 
+# ====================== LATENCY ======================
+# Границы корзин гистограмм, мс. Последняя корзина — всё, что больше.
+LATENCY_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class StageHistogram:
+    __slots__ = ("counts", "count", "total_ms", "max_ms")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms: float):
+        self.counts[bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def percentile(self, pct: float) -> float:
+        """Верхняя граница корзины, в которую попадает перцентиль."""
+        if not self.count:
+            return 0.0
+        need = self.count * pct / 100
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= need:
+                bound = LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else self.max_ms
+                return round(min(bound, self.max_ms), 3)
+        return round(self.max_ms, 3)
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "p50_ms": self.percentile(50),
+            "p90_ms": self.percentile(90),
+            "p99_ms": self.percentile(99),
+            "max_ms": round(self.max_ms, 3),
+            "buckets_ms": list(LATENCY_BUCKETS_MS),
+            "counts": list(self.counts),
+        }
+
+
+latency_stages: dict[str, StageHistogram] = {}
+
+
+def record_stage(stage: str, ms: float):
+    hist = latency_stages.get(stage)
+    if hist is None:
+        hist = latency_stages[stage] = StageHistogram()
+    hist.add(ms)
+
+
+class BuyTrace:
+    """Монотонные отметки пути лота от ответа поиска до классификации ответа покупки.
+
+    Каждая отметка пишется один раз (первая попытка), этапы — разности соседних отметок.
+    """
+
+    __slots__ = ("marks",)
+
+    def __init__(self):
+        self.marks: list[tuple[str, float]] = []
+
+    def mark(self, name: str, at: float | None = None):
+        if at is None:
+            at = time.perf_counter()
+        elif not at:
+            return
+        for existing, _ in self.marks:
+            if existing == name:
+                return
+        self.marks.append((name, at))
+
+    def commit(self):
+        if len(self.marks) < 2:
+            return
+        marks = sorted(self.marks, key=lambda m: m[1])
+        for (prev, t_prev), (name, t) in zip(marks, marks[1:]):
+            record_stage(f"buy.{prev}→{name}", (t - t_prev) * 1000)
+        record_stage(f"buy.total.{marks[0][0]}→{marks[-1][0]}", (marks[-1][1] - marks[0][1]) * 1000)
+
+
+def latency_dump() -> dict:
+    return {
+        "generated_at": int(time.time()),
+        "stages": {name: hist.to_dict() for name, hist in sorted(latency_stages.items())},
+    }
+
+
+def latency_table() -> str:
+    rows = [f"{'этап':<44}{'n':>6}{'p50':>8}{'p90':>8}{'p99':>8}{'max':>8}"]
+    for name, hist in sorted(latency_stages.items()):
+        rows.append(
+            f"{name[:44]:<44}{hist.count:>6}{hist.percentile(50):>8g}{hist.percentile(90):>8g}"
+            f"{hist.percentile(99):>8g}{hist.max_ms:>8.0f}"
+        )
+    return "\n".join(rows)
+
+
+# ====================== LOTS ======================
+class Lot:
+    """Лот из выдачи: ключ, id, ключ сортировки и цена считаются один раз при декодировании."""
+
+    __slots__ = ("key", "item_id", "sort_key", "price", "raw", "recv_perf", "decoded_perf")
+
+    def __init__(self, raw: dict, recv_perf: float = 0.0, decoded_perf: float = 0.0):
+        self.raw = raw
+        self.item_id = raw.get("item_id") or raw.get("id")
+        self.key = make_item_key(raw)
+        self.sort_key = _item_sort_key(raw)
+        self.price = raw.get("price")
+        # когда пришли заголовки ответа поиска и когда тело было декодировано
+        self.recv_perf = recv_perf
+        self.decoded_perf = decoded_perf
+
+
+def lots_from_items(items: list, recv_perf: float = 0.0, decoded_perf: float = 0.0) -> list[Lot]:
+    return [Lot(it, recv_perf, decoded_perf) for it in items if isinstance(it, dict)]
+
+
+def _lot_sort_key(lot: Lot) -> tuple[int, int]:
+    return lot.sort_key
+
+
 # ====================== HTTP / API ======================
-semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
 _global_session: aiohttp.ClientSession | None = None
+_buy_session: aiohttp.ClientSession | None = None
+
+
+class RequestPriorityGate:
+    """Ограничивает параллельные поисковые запросы; пока идут покупки — сильнее."""
+
+    def __init__(self, search_limit: int, search_limit_during_buy: int):
+        self.search_limit = max(1, search_limit)
+        self.search_limit_during_buy = max(1, min(search_limit, search_limit_during_buy))
+        self.search_active = 0
+        self.buy_active = 0
+        self.search_deferred = 0
+        self._cond = asyncio.Condition()
+
+    def _search_cap(self) -> int:
+        return self.search_limit_during_buy if self.buy_active else self.search_limit
+
+    @asynccontextmanager
+    async def search(self):
+        async with self._cond:
+            if self.search_active >= self._search_cap():
+                self.search_deferred += 1
+                await self._cond.wait_for(lambda: self.search_active < self._search_cap())
+            self.search_active += 1
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self.search_active -= 1
+                self._cond.notify()
+
+    @asynccontextmanager
+    async def buy(self):
+        # покупка никогда не ждёт: она только сужает окно для поиска
+        self.buy_active += 1
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self.buy_active -= 1
+                if not self.buy_active:
+                    self._cond.notify_all()
 
 
-class RequestRateLimiter:
-    def __init__(self):
-        self._lock = asyncio.Lock()
-        self._next_allowed_at: dict[str, float] = {}
+request_priority = RequestPriorityGate(MAX_CONCURRENT_REQUESTS, SEARCH_CONCURRENCY_DURING_BUY)
 
-    async def wait(self, bucket: str, min_interval: float):
-        if min_interval <= 0:
+
+def _parse_retry_after(value) -> float | None:
+    if not value:
+        return None
+    value = str(value).strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+
+class TokenBucket:
+    """Token bucket с FIFO-очередью ожидающих, которых будит таймер loop.call_at."""
+
+    def __init__(self, name: str, rate: float, burst: int):
+        self.name = name
+        self.base_rate = max(0.0, rate)
+        self.rate = self.base_rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.throttled = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._timer: asyncio.TimerHandle | None = None
+
+    def _refill(self, now: float):
+        if self.rate > 0:
+            self.tokens = min(float(self.burst), self.tokens + (now - self.updated) * self.rate)
+        else:
+            self.tokens = float(self.burst)
+        self.updated = now
+
+    def _ready_at(self, now: float) -> float:
+        at = max(now, self.blocked_until)
+        if self.tokens < 1 and self.rate > 0:
+            at = max(at, now + (1 - self.tokens) / self.rate)
+        return at
+
+    def _try_take(self, now: float) -> bool:
+        self._refill(now)
+        if now >= self.blocked_until and self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def ready_in(self) -> float:
+        """Через сколько секунд новый вызывающий получит токен (inf — впереди очередь ожидающих)."""
+        if any(not f.done() for f in self._waiters):
+            return float("inf")
+        now = time.monotonic()
+        self._refill(now)
+        return self._ready_at(now) - now
+
+    def try_take(self) -> bool:
+        """Забрать токен без ожидания; False, если его нет или впереди кто-то ждёт."""
+        if any(not f.done() for f in self._waiters):
+            return False
+        return self._try_take(time.monotonic())
+
+    async def acquire(self):
+        if not self._waiters and self._try_take(time.monotonic()):
             return
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        self._schedule()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # токен уже выдан, но забрать его некому — возвращаем
+                self.tokens = min(float(self.burst), self.tokens + 1)
+            self._schedule()
+            raise
+
+    def _schedule(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._waiters and self._waiters[0].done():
+            self._waiters.popleft()
+        if not self._waiters:
+            return
+        loop = asyncio.get_running_loop()
+        now = time.monotonic()
+        self._refill(now)
+        delay = self._ready_at(now) - now
+        self._timer = loop.call_at(loop.time() + delay, self._wake)
+
+    def _wake(self):
+        self._timer = None
+        now = time.monotonic()
+        while self._waiters:
+            fut = self._waiters[0]
+            if fut.done():
+                self._waiters.popleft()
+                continue
+            if not self._try_take(now):
+                break
+            self._waiters.popleft()
+            fut.set_result(None)
+        self._schedule()
+
+    def penalize(self, retry_after: float | None):
+        now = time.monotonic()
+        pause = RATE_LIMIT_DEFAULT_PENALTY if retry_after is None else retry_after
+        self.blocked_until = max(self.blocked_until, now + min(pause, RATE_LIMIT_MAX_PENALTY))
+        if self.base_rate > 0:
+            self.rate = max(self.base_rate * 0.05, self.rate * RATE_LIMIT_BACKOFF_FACTOR)
+        self.throttled += 1
+        if self._waiters:
+            self._schedule()
+
+    def recover(self):
+        if self.rate < self.base_rate:
+            self.rate = min(self.base_rate, self.rate + self.base_rate * RATE_LIMIT_RECOVERY_STEP)
+
+    def snapshot(self) -> dict:
+        return {
+            "rate": round(self.rate, 3),
+            "base_rate": round(self.base_rate, 3),
+            "burst": self.burst,
+            "waiters": sum(1 for f in self._waiters if not f.done()),
+            "throttled": self.throttled,
+            "blocked_for": round(max(0.0, self.blocked_until - time.monotonic()), 2),
+        }
+
+
+def _parse_host_rate_limits(spec: str) -> dict[str, tuple[float, int]]:
+    limits = {}
+    for part in spec.split(","):
+        host, _, value = part.strip().partition("=")
+        if not host or not value:
+            continue
+        rate, _, burst = value.partition(":")
+        try:
+            limits[host.strip().lower()] = (float(rate), int(burst or "1"))
+        except ValueError:
+            continue
+    return limits
 
-        while True:
-            async with self._lock:
-                now = time.monotonic()
-                allowed_at = self._next_allowed_at.get(bucket, 0.0)
-                wait_for = allowed_at - now
-                if wait_for <= 0:
-                    self._next_allowed_at[bucket] = now + min_interval
-                    return
-            await asyncio.sleep(min(wait_for, min_interval))
+
+class RequestRateLimiter:
+    """Глобальные бакеты по типу запроса плюс бакеты по хосту API с адаптацией к 429."""
+
+    def __init__(self):
+        self._buckets: dict[str, TokenBucket] = {}
+        self._host_limits = _parse_host_rate_limits(HOST_RATE_LIMITS)
+        # Доля общих лимитов API на этот процесс (при HUNTER_WORKERS лимиты делятся между процессами).
+        self.share = 1.0
+
+    def _bucket(self, name: str, rate: float, burst: int) -> TokenBucket:
+        bucket = self._buckets.get(name)
+        if bucket is None:
+            if self.share < 1.0:
+                rate *= self.share
+                burst = max(1, int(burst * self.share))
+            bucket = self._buckets[name] = TokenBucket(name, rate, burst)
+        return bucket
+
+    def _buckets_for(self, method: str, url: str) -> tuple[TokenBucket, TokenBucket]:
+        name, min_interval, burst = _api_limit_bucket(method, url)
+        rate = 1.0 / min_interval if min_interval > 0 else 0.0
+        host = (urlsplit(url).hostname or "").lower()
+        host_rate, host_burst = self._host_limits.get(host, (0.0, 1))
+        # Бакет хоста свой у каждого типа запросов: 429 на опросе не должен задерживать покупки.
+        return self._bucket(name, rate, burst), self._bucket(f"host:{host}:{name}", host_rate, host_burst)
+
+    async def acquire(self, method: str, url: str):
+        for bucket in self._buckets_for(method, url):
+            await bucket.acquire()
+
+    def feedback(self, method: str, url: str, status: int, headers=None):
+        if status == 429:
+            retry_after = _parse_retry_after(headers.get("Retry-After")) if headers is not None else None
+            for bucket in self._buckets_for(method, url):
+                bucket.penalize(retry_after)
+            log_autobuy(f"RATE_LIMITED {method} {url} retry_after={retry_after}")
+        elif 200 <= status < 400:
+            for bucket in self._buckets_for(method, url):
+                bucket.recover()
+
+    def stats(self) -> dict[str, dict]:
+        return {name: b.snapshot() for name, b in self._buckets.items()}
 
 
 request_rate_limiter = RequestRateLimiter()
 
 
+class HostHealth:
+    __slots__ = ("rtt_ms", "error_rate", "samples", "requests", "errors", "last_error_at")
+
+    def __init__(self):
+        self.rtt_ms = 0.0
+        self.error_rate = 0.0
+        self.samples: deque[float] = deque(maxlen=200)
+        self.requests = 0
+        self.errors = 0
+        self.last_error_at = 0.0
+
+    def percentile(self, pct: float) -> float | None:
+        if len(self.samples) < 20:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class HostHealthTracker:
+    """EWMA задержки и доли ошибок по хостам API; питается из fetch_items_raw."""
+
+    def __init__(self, alpha: float):
+        self.alpha = min(1.0, max(0.01, alpha))
+        self.hosts: dict[str, HostHealth] = {}
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.hedge_denied = 0
+        self._hedge_budget = 0.0
+
+    def get(self, host: str) -> HostHealth:
+        h = self.hosts.get(host)
+        if h is None:
+            h = self.hosts[host] = HostHealth()
+        return h
+
+    def record(self, host: str, rtt_ms: float, ok: bool):
+        h = self.get(host)
+        a = self.alpha
+        h.requests += 1
+        h.rtt_ms = rtt_ms if h.requests == 1 else (1 - a) * h.rtt_ms + a * rtt_ms
+        h.error_rate = (1 - a) * h.error_rate + (0.0 if ok else a)
+        if ok:
+            h.samples.append(rtt_ms)
+        else:
+            h.errors += 1
+            h.last_error_at = time.monotonic()
+
+    def _score(self, host: str) -> float:
+        h = self.hosts.get(host)
+        if h is None or not h.requests:
+            return 0.0  # ещё не опрошенный хост пробуем первым
+        score = h.rtt_ms * (1 + 4 * h.error_rate)
+        if h.error_rate > 0.5 and time.monotonic() - h.last_error_at < 30:
+            score += 1e6
+        return score
+
+    def note_request(self):
+        # бюджет пополняется долей от каждого запроса, поэтому дублей не больше SEARCH_HEDGE_MAX_RATIO
+        self._hedge_budget = min(5.0, self._hedge_budget + SEARCH_HEDGE_MAX_RATIO)
+
+    def take_hedge(self) -> bool:
+        if self._hedge_budget >= 1.0:
+            self._hedge_budget -= 1.0
+            self.hedged += 1
+            return True
+        self.hedge_denied += 1
+        return False
+
+    def ranked(self, hosts) -> list[str]:
+        ordered = sorted(hosts, key=self._score)
+        if len(ordered) > 1 and random.random() < SEARCH_MIRROR_EXPLORE:
+            ordered[0], ordered[1] = ordered[1], ordered[0]
+        return ordered
+
+
+host_health = HostHealthTracker(HOST_HEALTH_ALPHA)
+
+
+def _with_host(url: str, host: str) -> str:
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme, host, parts.path, parts.query, parts.fragment))
+
+
 def _is_search_endpoint(url: str) -> bool:
     try:
         path = (urlsplit(url).path or "").strip().lower()
@@ -1071,12 +2210,12 @@ def _is_buy_endpoint(url: str) -> bool:
     return "buy" in path
 
 
-def _api_limit_bucket(method: str, url: str) -> tuple[str, float]:
+def _api_limit_bucket(method: str, url: str) -> tuple[str, float, int]:
     if method.upper() == "POST" and _is_buy_endpoint(url):
-        return "buy-global", BUY_MIN_REQUEST_INTERVAL
+        return "buy-global", BUY_MIN_REQUEST_INTERVAL, BUY_REQUEST_BURST
     if method.upper() == "GET" and _is_search_endpoint(url):
-        return "search-global", SEARCH_MIN_REQUEST_INTERVAL
-    return "other-global", OTHER_MIN_REQUEST_INTERVAL
+        return "search-global", SEARCH_MIN_REQUEST_INTERVAL, SEARCH_REQUEST_BURST
+    return "other-global", OTHER_MIN_REQUEST_INTERVAL, OTHER_REQUEST_BURST
 
 
 def _default_api_headers() -> dict[str, str]:
@@ -1099,53 +2238,287 @@ async def get_session():
     return _global_session
 
 
+class BuyConnectionWarmer:
+    """Прогревает соединения к хостам покупки и считает задержку POST на холодных и тёплых соединениях."""
+
+    def __init__(self):
+        self.warmups = 0
+        self.warmup_errors = 0
+        self.warm_at: dict[str, float] = {}
+        # kind -> [запросов, сумма мс, максимум мс]
+        self.latency = {"cold": [0, 0.0, 0.0], "warm": [0, 0.0, 0.0]}
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        tc = aiohttp.TraceConfig()
+        tc.on_request_start.append(self._on_request_start)
+        tc.on_connection_create_end.append(self._on_connection_create)
+        tc.on_connection_reuseconn.append(self._on_connection_reuse)
+        tc.on_request_end.append(self._on_request_end)
+        return tc
+
+    async def _on_request_start(self, session, ctx, params):
+        ctx.started = time.perf_counter()
+        ctx.cold = None
+
+    async def _on_connection_create(self, session, ctx, params):
+        ctx.cold = True
+        if isinstance(ctx.trace_request_ctx, BuyTrace):
+            ctx.trace_request_ctx.mark("connection")
+
+    async def _on_connection_reuse(self, session, ctx, params):
+        ctx.cold = False
+        if isinstance(ctx.trace_request_ctx, BuyTrace):
+            ctx.trace_request_ctx.mark("connection")
+
+    async def _on_request_end(self, session, ctx, params):
+        if isinstance(ctx.trace_request_ctx, BuyTrace):
+            ctx.trace_request_ctx.mark("first_byte")
+        if params.method != "POST" or getattr(ctx, "cold", None) is None:
+            return
+        ms = (time.perf_counter() - ctx.started) * 1000
+        row = self.latency["cold" if ctx.cold else "warm"]
+        row[0] += 1
+        row[1] += ms
+        row[2] = max(row[2], ms)
+
+    async def warm(self, bases: list[str]):
+        session = await get_buy_session()
+        headers = {"User-Agent": _default_api_headers()["User-Agent"]}
+
+        async def _one(base: str):
+            try:
+                async with session.head(base + "/", headers=headers, timeout=BUY_WARMUP_TIMEOUT) as resp:
+                    await resp.read()
+                self.warm_at[base] = time.monotonic()
+                self.warmups += 1
+            except Exception as e:
+                self.warmup_errors += 1
+                log_autobuy(f"BUY_WARMUP_ERR base={base} err='{_safe_compact(str(e),160)}'")
+
+        await asyncio.gather(*(_one(b) for b in bases))
+
+    def summary(self) -> str:
+        parts = []
+        for kind, label in (("cold", "холодных"), ("warm", "тёплых")):
+            n, total, worst = self.latency[kind]
+            avg = f"{total / n:.0f}" if n else "—"
+            parts.append(f"{label} <b>{n}</b> (ср. {avg} мс, макс. {worst:.0f} мс)")
+        return ", ".join(parts) + f"; прогревов <b>{self.warmups}</b>, ошибок <b>{self.warmup_errors}</b>"
+
+
+buy_warmer = BuyConnectionWarmer()
+
+
+async def get_buy_session():
+    global _buy_session
+    if _buy_session is None or _buy_session.closed:
+        timeout = aiohttp.ClientTimeout(total=BUY_TIMEOUT, connect=3, sock_connect=3, sock_read=BUY_TIMEOUT)
+        connector = aiohttp.TCPConnector(
+            limit=BUY_CONNECTOR_LIMIT,
+            limit_per_host=BUY_CONNECTOR_LIMIT,
+            ttl_dns_cache=300,
+            keepalive_timeout=BUY_KEEPALIVE_SEC,
+            enable_cleanup_closed=True,
+        )
+        _buy_session = aiohttp.ClientSession(
+            timeout=timeout,
+            connector=connector,
+            trace_configs=[buy_warmer.trace_config()],
+        )
+    return _buy_session
+
+
 async def close_session():
-    global _global_session
+    global _global_session, _buy_session
     if _global_session:
         await _global_session.close()
         _global_session = None
+    if _buy_session:
+        await _buy_session.close()
+        _buy_session = None
+
+
+# Кэш последней страницы по URL: валидаторы для условного GET и отпечаток тела.
+# Для неизменной страницы fetch_items_raw возвращает тот же объект списка items,
+# поэтому потребители могут распознать её сравнением `is`, не перебирая лоты.
+_search_page_cache: dict[str, dict] = {}
+search_page_stats = {"decoded": 0, "not_modified": 0, "fingerprint_hits": 0}
+
+
+def _page_fingerprint(body: bytes) -> tuple[int, int]:
+    # Новые лоты приходят в начало выдачи, поэтому длины и первого блока items достаточно.
+    start = body.find(b'"items"')
+    if start < 0:
+        start = 0
+    return len(body), hash(body[start:start + PAGE_FINGERPRINT_BLOCK])
+
+
+def _remember_search_page(url: str, resp_headers, fingerprint: tuple[int, int], items: list):
+    if url not in _search_page_cache and len(_search_page_cache) >= SEARCH_PAGE_CACHE_MAX:
+        _search_page_cache.pop(next(iter(_search_page_cache)), None)
+    _search_page_cache[url] = {
+        "etag": resp_headers.get("ETag"),
+        "last_modified": resp_headers.get("Last-Modified"),
+        "fingerprint": fingerprint,
+        "items": items,
+    }
 
 
-async def fetch_items_raw(url: str):
-    bucket, min_interval = _api_limit_bucket("GET", url)
-    await request_rate_limiter.wait(bucket, min_interval)
+async def fetch_items_raw(url: str, request_url: str | None = None):
+    """url — ключ кэша страницы; request_url — фактический адрес (тот же запрос на зеркале)."""
+    request_url = request_url or url
+    host = (urlsplit(request_url).hostname or "").lower()
+    await request_rate_limiter.acquire("GET", request_url)
     headers = _default_api_headers()
+    cached = _search_page_cache.get(url)
+    if cached is not None:
+        if cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        if cached["last_modified"]:
+            headers["If-Modified-Since"] = cached["last_modified"]
+    t0 = time.perf_counter()
     try:
         session = await get_session()
-        async with session.get(url, headers=headers, timeout=FETCH_TIMEOUT) as resp:
-            text = await resp.text()
+        async with session.get(request_url, headers=headers, timeout=FETCH_TIMEOUT) as resp:
+            recv_perf = time.perf_counter()
+            host_health.record(host, (recv_perf - t0) * 1000, resp.status < 500 and resp.status != 429)
+            record_stage("search.first_byte", (recv_perf - t0) * 1000)
+            request_rate_limiter.feedback("GET", request_url, resp.status, resp.headers)
+            if resp.status == 304 and cached is not None:
+                search_page_stats["not_modified"] += 1
+                return cached["items"], None, resp.status
+
+            body = await resp.read()
 
             if resp.status in (400, 401, 403, 404):
+                text = body.decode("utf-8", "replace")
                 return None, f"HTTP {resp.status}: {text[:300]}", resp.status
 
+            fingerprint = _page_fingerprint(body)
+            if cached is not None and cached["fingerprint"] == fingerprint:
+                search_page_stats["fingerprint_hits"] += 1
+                return cached["items"], None, resp.status
+
             try:
-                data = json.loads(text)
+                data = json_loads(body)
             except Exception:
+                text = body.decode("utf-8", "replace")
                 return None, f"❌ API вернул не JSON:\n{text[:300]}", resp.status
 
             items = data.get("items")
             if not isinstance(items, list):
                 return None, "⚠ API не вернул список items", resp.status
 
-            return items, None, resp.status
+            decoded_perf = time.perf_counter()
+            record_stage("search.read+decode", (decoded_perf - recv_perf) * 1000)
+            lots = lots_from_items(items, recv_perf, decoded_perf)
+            search_page_stats["decoded"] += 1
+            if resp.status == 200:
+                _remember_search_page(url, resp.headers, fingerprint, lots)
+            return lots, None, resp.status
 
     except asyncio.TimeoutError:
+        host_health.record(host, (time.perf_counter() - t0) * 1000, False)
         return None, "❌ Таймаут запроса", 0
     except aiohttp.ClientError as e:
+        host_health.record(host, (time.perf_counter() - t0) * 1000, False)
         return None, f"❌ Ошибка сети: {e}", 0
     except Exception as e:
         return None, f"❌ Ошибка: {e}", 0
 
 
-async def fetch_with_retry(url: str, max_retries: int = RETRY_MAX):
+class SingleFlight:
+    """Склеивает одновременные вызовы с одинаковым ключом в один общий запрос."""
+
+    def __init__(self):
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.calls = 0
+        self.executed = 0
+
+    @property
+    def saved(self) -> int:
+        return self.calls - self.executed
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            self._inflight.pop(key, None)
+
+    async def do(self, key: str, factory):
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            self.executed += 1
+            task = asyncio.create_task(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._forget(k, t))
+        # shield: отмена одного из ожидающих не должна обрывать запрос для остальных
+        return await asyncio.shield(task)
+
+
+search_single_flight = SingleFlight()
+
+
+async def fetch_items_hedged(url: str):
+    """fetch_items_raw с выбором зеркала и хеджированием хвостовых задержек."""
+    host = (urlsplit(url).hostname or "").lower()
+    mirrored = SEARCH_MIRROR_MODE and host in VALID_API_HOSTS and _is_search_endpoint(url)
+    if not (mirrored or SEARCH_HEDGE):
+        return await fetch_items_raw(url)
+
+    if mirrored:
+        ranked = host_health.ranked(VALID_API_HOSTS)
+        primary_host, backup_host = ranked[0], ranked[1] if len(ranked) > 1 else ranked[0]
+    else:
+        primary_host = backup_host = host
+
+    host_health.note_request()
+    primary = asyncio.create_task(fetch_items_raw(url, _with_host(url, primary_host)))
+    backup = None
+    # Отмена вызывающего (или исключение) не должна оставлять запросы висеть в фоне.
+    try:
+        hedge_after = host_health.get(primary_host).percentile(SEARCH_HEDGE_PCT)
+        if hedge_after is None:
+            return await primary
+
+        done, _ = await asyncio.wait({primary}, timeout=hedge_after / 1000)
+        if done or not host_health.take_hedge():
+            return await primary
+
+        backup = asyncio.create_task(fetch_items_raw(url, _with_host(url, backup_host)))
+        pending = {primary, backup}
+        result = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = task.result()
+                if result[1] is None:
+                    if task is backup:
+                        host_health.hedge_wins += 1
+                    return result
+        return result
+    finally:
+        for task in (primary, backup):
+            if task is not None and not task.done():
+                task.cancel()
+
+
+async def _fetch_search_attempt(url: str, on_request=None):
+    if on_request is not None:
+        on_request()
+    async with request_priority.search():
+        return await fetch_items_hedged(url)
+
+
+async def fetch_with_retry(url: str, max_retries: int = RETRY_MAX, on_request=None):
+    """on_request вызывается только для реально отправленной попытки, а не для склеенной."""
     attempt = 0
     delay = RETRY_BASE_DELAY
 
     while attempt < max_retries:
         attempt += 1
         try:
-            async with semaphore:
-                items, err, status = await fetch_items_raw(url)
+            # Склеивается каждая попытка по URL, а бюджет повторов у каждого вызывающего свой.
+            items, err, status = await search_single_flight.do(url, lambda: _fetch_search_attempt(url, on_request))
         except Exception as e:
             items, err, status = None, f"❌ Ошибка: {e}", 0
 
@@ -1244,11 +2617,11 @@ async def get_account_buy_balance_text(force: bool = False) -> str:
     for url in urls:
         try:
             async with session.get(url, headers=headers, timeout=FETCH_TIMEOUT) as resp:
-                text = await resp.text()
                 if resp.status != 200:
                     continue
+                body = await resp.read()
                 try:
-                    data = json.loads(text)
+                    data = json_loads(body)
                 except Exception:
                     continue
                 parsed = _extract_account_buy_balance_text(data)
@@ -1260,9 +2633,291 @@ async def get_account_buy_balance_text(force: bool = False) -> str:
 
     return cache["text"] if cache["text"] != "—" else "—"
 
+
+# ====================== TELEGRAM SEND ======================
+# Меньше — раньше. Всё, что ниже NOTIFY_PRIO_CARD, не склеивается и не выбрасывается.
+NOTIFY_PRIO_AUTOBUY = 1
+NOTIFY_PRIO_SERVICE = 2
+NOTIFY_PRIO_CARD = 3
+TG_MESSAGE_MAX = 4096
+
+
+class TelegramSendScheduler:
+    """Единый планировщик уведомлений охотника с проактивными бюджетами Telegram.
+
+    Очередь у каждого чата своя (приоритет, порядок постановки); диспетчер выбирает лучший
+    готовый чат, у которого есть токен чата, и ждёт общий токен. В одном чате одновременно
+    летит не больше одного сообщения, поэтому порядок внутри чата сохраняется.
+    Прямые отправки (send_bot_message) ждут те же бакеты и обслуживаются раньше очереди.
+    """
+
+    def __init__(self):
+        self.global_bucket = TokenBucket("tg-global", TG_GLOBAL_RATE, TG_GLOBAL_BURST)
+        self._chat_buckets: dict[int, TokenBucket] = {}
+        self._pending: dict[int, list] = {}
+        self._busy: set[int] = set()
+        self._seq = 0
+        self._depth = 0
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self.stats = {"sent": 0, "errors": 0, "dropped": 0, "merged": 0, "max_depth": 0, "retry_after": 0}
+
+    @property
+    def depth(self) -> int:
+        return self._depth
+
+    def chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(f"tg-chat:{chat_id}", TG_CHAT_RATE, TG_CHAT_BURST)
+        return bucket
+
+    async def acquire_direct(self, chat_id: int):
+        await self.chat_bucket(chat_id).acquire()
+        await self.global_bucket.acquire()
+
+    def try_acquire_now(self, chat_id: int) -> bool:
+        """Токены для необязательного сообщения: только если чат простаивает и бюджет есть сразу."""
+        if self._pending.get(chat_id) or chat_id in self._busy:
+            return False
+        chat = self.chat_bucket(chat_id)
+        if chat.ready_in() > 0 or self.global_bucket.ready_in() > 0:
+            return False
+        return chat.try_take() and self.global_bucket.try_take()
+
+    def throttled(self, chat_id: int, retry_after: float):
+        self.stats["retry_after"] += 1
+        self.chat_bucket(chat_id).penalize(retry_after)
+        # общий бакет только притормаживаем: RetryAfter одного чата не должен глушить остальные
+        self.global_bucket.penalize(min(retry_after, 1.0))
+
+    def delivered(self, chat_id: int):
+        self.chat_bucket(chat_id).recover()
+        self.global_bucket.recover()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    def submit(self, chat_id: int, text: str, priority: int, kwargs: dict):
+        self._seq += 1
+        heap = self._pending.setdefault(chat_id, [])
+        heapq.heappush(heap, (priority, self._seq, time.perf_counter(), text, kwargs))
+        self._depth += 1
+        if priority >= NOTIFY_PRIO_CARD:
+            cards = sum(1 for e in heap if e[0] >= NOTIFY_PRIO_CARD)
+            if (0 < TG_CARD_MERGE_BACKLOG < cards) or (0 < TG_CARD_DROP_BACKLOG < cards):
+                self._shed(chat_id, heap)
+        self.stats["max_depth"] = max(self.stats["max_depth"], self._depth)
+        self.start()
+        self._wakeup.set()
+
+    def _shed(self, chat_id: int, heap: list):
+        keep = [e for e in heap if e[0] < NOTIFY_PRIO_CARD]
+        cards = sorted((e for e in heap if e[0] >= NOTIFY_PRIO_CARD), key=lambda e: e[1])
+        dropped = 0
+        if TG_CARD_DROP_BACKLOG > 0 and len(cards) > TG_CARD_DROP_BACKLOG:
+            dropped = len(cards) - TG_CARD_DROP_BACKLOG
+            cards = cards[dropped:]
+            self.stats["dropped"] += dropped
+            log_autobuy(f"NOTIFY_QUEUE_DROP chat_id={chat_id} dropped={dropped}")
+
+        merged = []
+        for entry in cards:
+            prev = merged[-1] if merged else None
+            if (
+                TG_CARD_MERGE_BACKLOG > 0
+                and prev is not None
+                and prev[4] == entry[4]
+                and len(prev[3]) + 2 + len(entry[3]) <= TG_MESSAGE_MAX
+            ):
+                merged[-1] = (prev[0], prev[1], min(prev[2], entry[2]), f"{prev[3]}\n\n{entry[3]}", prev[4])
+                self.stats["merged"] += 1
+            else:
+                merged.append(entry)
+        if dropped:
+            notice = f"⚠️ Пропущено карточек: {dropped} (очередь Telegram переполнена)"
+            first = merged[0] if merged else None
+            if first is not None and len(first[3]) + len(notice) + 2 <= TG_MESSAGE_MAX:
+                merged[0] = (first[0], first[1], first[2], f"{notice}\n\n{first[3]}", first[4])
+            else:
+                merged.insert(0, (NOTIFY_PRIO_CARD, cards[0][1] if cards else self._seq, time.perf_counter(), notice, {}))
+
+        heap[:] = keep + merged
+        heapq.heapify(heap)
+        self._depth += len(heap) - len(keep) - len(cards) - dropped
+
+    def _pick(self) -> tuple[int | None, float]:
+        best = None
+        wait = 1.0
+        for chat_id, heap in self._pending.items():
+            if chat_id in self._busy or not heap:
+                continue
+            # inf — прямая отправка в этот чат идёт первой, её разбудит _wakeup
+            ready = self.chat_bucket(chat_id).ready_in()
+            if ready > 0:
+                wait = min(wait, ready)
+                continue
+            head = heap[0][:2]
+            if best is None or head < best[0]:
+                best = (head, chat_id)
+        if best is None:
+            return None, wait
+        chat_id = best[1]
+        self.chat_bucket(chat_id).try_take()
+        return chat_id, 0.0
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            chat_id, wait = self._pick()
+            if chat_id is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._busy.add(chat_id)
+            try:
+                await self.global_bucket.acquire()
+            except BaseException:
+                self._busy.discard(chat_id)
+                raise
+            heap = self._pending.get(chat_id)
+            if not heap:
+                self._busy.discard(chat_id)
+                continue
+            entry = heapq.heappop(heap)
+            if not heap:
+                self._pending.pop(chat_id, None)
+            self._depth -= 1
+            asyncio.create_task(self._deliver(chat_id, entry))
+
+    async def _deliver(self, chat_id: int, entry: tuple):
+        _, _, enqueued_at, text, kwargs = entry
+        try:
+            async with get_send_lock(chat_id):
+                await _tg_send(chat_id, text, **kwargs)
+            self.stats["sent"] += 1
+        except Exception as e:
+            self.stats["errors"] += 1
+            log_autobuy(f"NOTIFY_SEND_ERR chat_id={chat_id} err='{_safe_compact(str(e),240)}'")
+        finally:
+            self._busy.discard(chat_id)
+            # задержка от постановки в очередь до ответа Telegram
+            record_stage("notify.lag", (time.perf_counter() - enqueued_at) * 1000)
+            self._wakeup.set()
+
+
+tg_scheduler = TelegramSendScheduler()
+
+
+def enqueue_hunter_notification(user_id: int, chat_id: int, text: str, priority: int = NOTIFY_PRIO_CARD, **kwargs):
+    if hunter_ipc is not None:
+        hunter_ipc.emit("notify", user_id=user_id, chat_id=chat_id, text=text, priority=priority, kwargs=kwargs)
+        return
+    tg_scheduler.submit(chat_id, text, priority, kwargs)
+
+
+# ====================== SHARED POLLER ======================
+class SharedSourcePoller:
+    """Общий опрос источников: один запрос на нормализованный URL за тик для всех охотников."""
+
+    def __init__(self, tick: float):
+        self.max_tick = tick
+        self.tick = tick
+        self._user_keys: dict[int, frozenset[str]] = {}
+        self._user_intervals: dict[int, float] = {}
+        self._results: dict[str, tuple[float, list, str | None]] = {}
+        self.fetches = 0
+        self.fanouts = 0
+
+    @staticmethod
+    def key(url: str) -> str:
+        return normalize_url((url or "").strip())
+
+    def _retick(self):
+        # Тик не длиннее интервала самого быстрого охотника, иначе кэш добавляет ему задержку.
+        self.tick = min([self.max_tick, *self._user_intervals.values()])
+
+    def subscribe(self, user_id: int, keys: frozenset[str], interval: float | None = None) -> None:
+        """keys — уже нормализованные через SharedSourcePoller.key URL."""
+        self._user_keys[user_id] = keys
+        if interval is not None and self._user_intervals.get(user_id) != interval:
+            self._user_intervals[user_id] = interval
+            self._retick()
+
+    def unsubscribe(self, user_id: int) -> None:
+        self._user_keys.pop(user_id, None)
+        if self._user_intervals.pop(user_id, None) is not None:
+            self._retick()
+
+    def stats(self) -> dict:
+        distinct: set[str] = set()
+        subscriptions = 0
+        for keys in self._user_keys.values():
+            distinct.update(keys)
+            subscriptions += len(keys)
+        return {
+            "users": len(self._user_keys),
+            "subscriptions": subscriptions,
+            "distinct": len(distinct),
+            "tick": self.tick,
+            "fetches": self.fetches,
+            "fanouts": self.fanouts,
+        }
+
+    def _count_fetch(self):
+        self.fetches += 1
+
+    def _prune(self, now: float):
+        if len(self._results) <= 64:
+            return
+        live: set[str] = set()
+        for keys in self._user_keys.values():
+            live.update(keys)
+        for key, (ts, _items, _err) in list(self._results.items()):
+            if key not in live and now - ts > max(self.tick, 1.0) * 10:
+                self._results.pop(key, None)
+
+    async def fetch(self, url: str):
+        key = self.key(url)
+        now = time.monotonic()
+        cached = self._results.get(key)
+        if cached is not None and now - cached[0] < self.tick:
+            self.fanouts += 1
+            return cached[1], cached[2]
+
+        self._prune(now)
+        # Одновременные промахи по одному URL склеивает fetch_with_retry (single-flight);
+        # fetches считает только реальные запросы.
+        items, err = await fetch_with_retry(key, on_request=self._count_fetch)
+        self._results[key] = (time.monotonic(), items, err)
+        return items, err
+
+
+source_poller = SharedSourcePoller(SOURCE_POLL_TICK)
+
+
 # ====================== SOURCES ======================
-async def get_all_sources(user_id: int, enabled_only: bool = False):
-    await load_user_data(user_id)
+# Снимок источников пользователя пересобирается только при смене версии,
+# которую поднимают URL-мутаторы и load_user_data.
+user_sources_version = defaultdict(int)
+user_source_snapshots: dict[int, dict] = {}
+
+
+def bump_user_sources(user_id: int):
+    user_sources_version[user_id] += 1
+    hunter_workers.send(user_id, "sources", urls=user_urls[user_id])
+
+
+def get_source_snapshot(user_id: int) -> dict:
+    version = user_sources_version[user_id]
+    snap = user_source_snapshots.get(user_id)
+    if snap is not None and snap["version"] == version:
+        return snap
 
     deduped = []
     seen = set()
@@ -1274,12 +2929,28 @@ async def get_all_sources(user_id: int, enabled_only: bool = False):
         deduped.append(src)
     user_urls[user_id] = deduped
 
-    out = []
-    for i, s in enumerate(user_urls[user_id], start=1):
-        if enabled_only and not s.get("enabled", True):
-            continue
-        out.append({**s, "idx": i})
-    return out
+    all_sources = [{**s, "idx": i} for i, s in enumerate(deduped, start=1)]
+    enabled = [s for s in all_sources if s.get("enabled", True)]
+    snap = {
+        "version": version,
+        "all": all_sources,
+        "enabled": enabled,
+        # Для минимальной задержки автобая URL с автобаем всегда опрашиваются первыми.
+        "autobuy": [_build_source_info(s) for s in enabled if s.get("autobuy", False)],
+        "plain": [_build_source_info(s) for s in enabled if not s.get("autobuy", False)],
+        "poll_keys": frozenset(SharedSourcePoller.key(s["url"]) for s in enabled),
+    }
+    for info in snap["autobuy"]:
+        # план покупки собирается при появлении автобай-источника, а не на первой находке
+        get_buy_plan(info["url"])
+    user_source_snapshots[user_id] = snap
+    return snap
+
+
+async def get_all_sources(user_id: int, enabled_only: bool = False):
+    await load_user_data(user_id)
+    snap = get_source_snapshot(user_id)
+    return list(snap["enabled"] if enabled_only else snap["all"])
 
 
 def _build_source_info(src: dict) -> dict:
@@ -1293,20 +2964,18 @@ def _build_source_info(src: dict) -> dict:
     }
 
 
-async def _fetch_source_items(src: dict):
-    source_info = _build_source_info(src)
-    items, err = await fetch_with_retry(source_info["url"])
+async def _fetch_source_items(source_info: dict, watermark: tuple[int, int] | None = None):
+    items, err = await source_poller.fetch(_incremental_url(source_info["url"], watermark))
     return source_info, items, err
 
 
 async def fetch_all_sources(user_id: int):
-    sources = await get_all_sources(user_id, enabled_only=True)
+    await load_user_data(user_id)
+    snap = get_source_snapshot(user_id)
+    sources = snap["autobuy"] + snap["plain"]
     if not sources:
         return [], []
 
-    # Для минимальной задержки автобая сначала запускаем опрос URL с включённым автобаем.
-    sources.sort(key=lambda s: (not bool(s.get("autobuy", False)), s.get("idx", 0)))
-
     tasks = [asyncio.create_task(_fetch_source_items(s)) for s in sources]
     results = await asyncio.gather(*tasks, return_exceptions=True)
 
@@ -1327,13 +2996,12 @@ async def fetch_all_sources(user_id: int):
 
 
 async def iter_sources_results(user_id: int):
-    sources = await get_all_sources(user_id, enabled_only=True)
+    await load_user_data(user_id)
+    snap = get_source_snapshot(user_id)
+    sources = snap["autobuy"] + snap["plain"]
     if not sources:
         return
 
-    # Для минимальной задержки автобая сначала запускаем опрос URL с включённым автобаем.
-    sources.sort(key=lambda s: (not bool(s.get("autobuy", False)), s.get("idx", 0)))
-
     tasks = [asyncio.create_task(_fetch_source_items(s)) for s in sources]
     try:
         for fut in asyncio.as_completed(tasks):
@@ -1348,18 +3016,19 @@ async def iter_sources_results(user_id: int):
 
 
 async def iter_sources_results_split(user_id: int, include_non_autobuy: bool):
-    sources = await get_all_sources(user_id, enabled_only=True)
-    if not sources:
+    await load_user_data(user_id)
+    snap = get_source_snapshot(user_id)
+    if not snap["enabled"]:
         return
 
-    autobuy_sources = [s for s in sources if s.get("autobuy", False)]
-    plain_sources = [s for s in sources if not s.get("autobuy", False)]
+    source_poller.subscribe(user_id, snap["poll_keys"], await user_hunter_interval(user_id))
 
-    scheduled = autobuy_sources + (plain_sources if include_non_autobuy else [])
+    scheduled = snap["autobuy"] + snap["plain"] if include_non_autobuy else snap["autobuy"]
     if not scheduled:
         return
 
-    tasks = [asyncio.create_task(_fetch_source_items(s)) for s in scheduled]
+    watermarks = user_source_watermarks[user_id] if HUNTER_INCREMENTAL else {}
+    tasks = [asyncio.create_task(_fetch_source_items(s, watermarks.get(s["url"]))) for s in scheduled]
     try:
         for fut in asyncio.as_completed(tasks):
             try:
@@ -1373,12 +3042,80 @@ async def iter_sources_results_split(user_id: int, include_non_autobuy: bool):
 
 
 # ====================== DISPLAY ======================
-def make_card(item: dict, source_name: str) -> str:
+def make_digest_line(lot: Lot) -> str:
+    item = lot.raw
+    title = str(item.get("title", "Без названия"))
+    if len(title) > 90:
+        title = title[:89] + "…"
+    link = item.get("url") or item.get("link") or (f"https://lzt.market/{lot.item_id}" if lot.item_id is not None else None)
+    head = f'<a href="{html.escape(str(link), quote=True)}">{html.escape(title)}</a>' if link else html.escape(title)
+    price = f" — <b>{html.escape(_format_value(lot.price))} ₽</b>" if lot.price not in (None, "") else ""
+    return f"• {head}{price}"
+
+
+def make_digest_messages(lots: list[Lot], source_name: str) -> list[str]:
+    """Компактные строки лотов, упакованные в сообщения до лимита Telegram."""
+    header = f"🗞 <b>{html.escape(str(source_name or 'Источник'))}</b>: новых лотов <b>{len(lots)}</b>"
+    messages = []
+    current = header
+    for lot in lots:
+        line = make_digest_line(lot)
+        if len(current) + 1 + len(line) > TG_MESSAGE_MAX:
+            messages.append(current)
+            current = f"🗞 <b>{html.escape(str(source_name or 'Источник'))}</b> (продолжение)"
+        current += "\n" + line
+    messages.append(current)
+    return messages
+
+
+# Одна и та же карточка рисуется для каждого пользователя, отслеживающего лот,
+# и повторно в «Проверке лотов»/«Тесте URL», поэтому готовый текст кэшируется.
+card_render_cache: OrderedDict = OrderedDict()
+card_cache_stats = {"hits": 0, "misses": 0}
+
+
+# Поля, которые render_card читает напрямую или через _collect_item_specs: их значение
+# попадает в карточку через str()/_format_value, даже если это словарь или список.
+_CARD_READ_KEYS = _SPEC_IGNORED | {"original_price"} | frozenset(k for _, keys in _KNOWN_SPECS for k in keys)
+
+
+def _card_payload_hash(item: dict) -> int:
+    # Прочие вложенные структуры в карточку не попадают, поэтому в отпечаток идут
+    # скаляры и repr читаемых полей — без сериализации чужих списков персонажей.
+    return hash(tuple(
+        (k, v) if isinstance(v, _SCALAR_TYPES) else (k, repr(v))
+        for k, v in item.items()
+        if isinstance(v, _SCALAR_TYPES) or k in _CARD_READ_KEYS
+    ))
+
+
+def make_card(lot: Lot, source_name: str) -> str:
+    if CARD_CACHE_MAX <= 0:
+        return render_card(lot, source_name)
+    try:
+        key = (lot.item_id, source_name, _card_payload_hash(lot.raw))
+    except TypeError:
+        return render_card(lot, source_name)
+    card = card_render_cache.get(key)
+    if card is not None:
+        card_render_cache.move_to_end(key)
+        card_cache_stats["hits"] += 1
+        return card
+    card_cache_stats["misses"] += 1
+    card = render_card(lot, source_name)
+    card_render_cache[key] = card
+    if len(card_render_cache) > CARD_CACHE_MAX:
+        card_render_cache.popitem(last=False)
+    return card
+
+
+def render_card(lot: Lot, source_name: str) -> str:
+    item = lot.raw
     title = str(item.get("title", "Без названия"))
-    price = item.get("price", None)
+    price = lot.price
     old_price = item.get("old_price") or item.get("original_price")
     discount = item.get("discount")
-    item_id = item.get("item_id") or item.get("id")
+    item_id = lot.item_id
 
     seller_id = item.get("seller_id") or item.get("owner_id") or item.get("user_id")
     category = item.get("category") or item.get("category_name") or item.get("game") or item.get("type")
@@ -1452,7 +3189,7 @@ def make_card(item: dict, source_name: str) -> str:
         lines.append(f"🔗 Ссылка: {html.escape(link)}")
 
     if desc:
-        clean = re.sub(r"\s{3,}", "  ", desc).strip()
+        clean = _DESC_WS_RE.sub("  ", desc).strip()
         if len(clean) > 1200:
             clean = clean[:1200] + "…"
         lines.append("")
@@ -1467,8 +3204,7 @@ def make_card(item: dict, source_name: str) -> str:
 
 
 # ====================== AUTOBUY ======================
-def _autobuy_payload_variants(item: dict):
-    price = item.get("price")
+def _autobuy_payload_variants(price):
     payload = {"balance_id": LZT_BALANCE_ID}
     if price is not None:
         payload.update({"price": price, "item_price": price, "amount": price})
@@ -1499,7 +3235,27 @@ def _autobuy_payload_variants(item: dict):
     return dedup
 
 
-def _autobuy_buy_urls(source_url: str, item_id: int):
+AUTOBUY_BASE_HOSTS = ("https://prod-api.lzt.market", "https://api.lzt.market", "https://api.lolz.live")
+
+
+def _autobuy_warm_bases() -> list[str]:
+    """Хосты покупки для прогрева; пусто, если ни у кого нет включённого автобая."""
+    bases = list(AUTOBUY_BASE_HOSTS)
+    found = False
+    for sources in list(user_urls.values()):
+        for src in sources:
+            if not (src.get("autobuy") and src.get("enabled", True)):
+                continue
+            found = True
+            parts = urlsplit(src.get("url") or "")
+            base = f"{parts.scheme}://{parts.netloc}" if parts.scheme and parts.netloc else ""
+            if base and "api." in base.lower() and base not in bases:
+                bases.append(base)
+    return bases if found else []
+
+
+def _autobuy_buy_templates(source_url: str) -> list[tuple[str, str]]:
+    """(база, шаблон пути) в статическом порядке: fast-пути по всем хостам, затем остальные."""
     source_url = (source_url or "").strip()
     source_base = ""
     try:
@@ -1509,7 +3265,7 @@ def _autobuy_buy_urls(source_url: str, item_id: int):
     except Exception:
         source_base = ""
 
-    base_hosts = ["https://prod-api.lzt.market", "https://api.lzt.market", "https://api.lolz.live"]
+    base_hosts = list(AUTOBUY_BASE_HOSTS)
 
     source_low = source_url.lower()
     source_is_api = source_base and any(marker in source_low for marker in ("api.", "prod-api."))
@@ -1543,72 +3299,187 @@ def _autobuy_buy_urls(source_url: str, item_id: int):
         "items/{id}/purchase",
     ]
 
-    urls = []
-    seen = set()
-    for path_list in (fast_paths, slow_paths):
-        for base in dedup_bases:
-            for tpl in path_list:
-                url = f"{base}/{tpl.format(id=item_id)}"
-                if url in seen:
-                    continue
-                seen.add(url)
-                urls.append(url)
-    return urls
+    return [(base, tpl) for path_list in (fast_paths, slow_paths) for base in dedup_bases for tpl in path_list]
 
 
-def _autobuy_cache_key(source_url: str) -> str:
-    try:
-        p = urlsplit(source_url or "")
-        if p.netloc:
-            return f"{p.scheme}://{p.netloc}"
-    except Exception:
-        pass
-    return (source_url or "").strip().lower() or "default"
-
-
-def _autobuy_prioritized_urls(source_url: str, item_id: int):
-    all_urls = _autobuy_buy_urls(source_url, item_id)
-    cache_key = _autobuy_cache_key(source_url)
-    preferred = autobuy_endpoint_cache.get(cache_key, [])
-    if preferred:
-        pref_item_urls = [tpl.format(id=item_id) for tpl in preferred]
-        ordered = []
-        seen = set()
-        for u in pref_item_urls + all_urls:
-            if u in seen:
-                continue
-            seen.add(u)
-            ordered.append(u)
-        return ordered
-    return all_urls
+# Состояния ответа, означающие, что маршрут существует и принял запрос.
+AUTOBUY_ROUTE_HIT_STATES = {"success", "terminal", "queue", "secret"}
 
 
-def _remember_autobuy_endpoint(source_url: str, used_url: str):
-    cache_key = _autobuy_cache_key(source_url)
-    try:
-        parts = urlsplit(used_url)
-        path = parts.path.lstrip("/")
-        item_id_match = re.search(r"/(\d+)(?:/|$)", "/" + path)
-        if not item_id_match:
+class BuyRoute:
+    """Маршрут покупки без привязки к лоту; URL собирается подстановкой item_id между prefix и suffix."""
+
+    __slots__ = ("base", "template", "payload_idx", "encoding", "key", "_prefix", "_suffix")
+
+    def __init__(self, base: str, template: str, payload_idx: int, encoding: str = "json"):
+        self.base = base
+        self.template = template
+        self.payload_idx = payload_idx
+        self.encoding = encoding
+        self.key = (base, template, payload_idx, encoding)
+        head, _, tail = template.partition("{id}")
+        self._prefix = f"{base}/{head}"
+        self._suffix = tail
+
+    def url(self, item_id: int) -> str:
+        return f"{self._prefix}{item_id}{self._suffix}"
+
+    def label(self, item_id: int) -> str:
+        url = self.url(item_id)
+        return url if self.encoding == "json" else f"{url} (form)"
+
+    def as_form(self) -> "BuyRoute":
+        return BuyRoute(self.base, self.template, self.payload_idx, "form")
+
+
+class AutobuyEndpointModel:
+    """Попытки, попадания и задержка попаданий по (хост, шаблон, payload, кодировка).
+
+    Попытки упорядочиваются по вероятности попадания на миллисекунду; оценки сглажены
+    пессимистичным априорным значением, так как большинство маршрутов отвечает 404.
+    """
+
+    def __init__(self):
+        self.stats: dict[tuple[str, str, int, str], list] = {}
+        self.version = 0
+        # приращения с прошлого save(): в базе они складываются со счётчиками других процессов
+        self._delta: dict[tuple[str, str, int, str], list] = {}
+
+    def load(self, rows):
+        for host, template, payload, encoding, attempts, hits, hit_ms in rows:
+            self.stats[(host, template, int(payload), encoding)] = [int(attempts), int(hits), float(hit_ms)]
+        self.version += 1
+
+    def score(self, key) -> float:
+        attempts, hits, hit_ms = self.stats.get(key) or (0, 0, 0.0)
+        p = (hits + 1) / (attempts + 4)
+        ms = (hit_ms + 2 * AUTOBUY_MODEL_PRIOR_MS) / (hits + 2)
+        return p / max(1.0, ms)
+
+    def record(self, route: BuyRoute, hit: bool, ms: float):
+        key = route.key
+        row = self.stats.get(key)
+        if row is None:
+            row = self.stats[key] = [0, 0, 0.0]
+        row[0] += 1
+        if hit:
+            row[1] += 1
+            row[2] += ms
+        if row[0] > AUTOBUY_MODEL_MAX_ATTEMPTS:
+            row[0] //= 2
+            row[1] //= 2
+            row[2] /= 2
+        self.version += 1
+        delta = self._delta.get(key)
+        if delta is None:
+            delta = self._delta[key] = [0, 0, 0.0]
+        delta[0] += 1
+        if hit:
+            delta[1] += 1
+            delta[2] += ms
+
+    def save(self):
+        """Сбрасывает изменённые строки в базу (периодически, а не на каждый POST)."""
+        if not self._delta:
             return
-        item_id_str = item_id_match.group(1)
-        template_path = path.replace(item_id_str, "{id}", 1)
-        template_url = f"{parts.scheme}://{parts.netloc}/{template_path}"
-        current = autobuy_endpoint_cache.get(cache_key, [])
-        current = [template_url] + [u for u in current if u != template_url]
-        autobuy_endpoint_cache[cache_key] = current[:3]
-    except Exception:
-        pass
+        items = list(self._delta.items())
+        self._delta = {}
+        db_save_autobuy_endpoints(items)
+
+    def has_hits(self, key) -> bool:
+        row = self.stats.get(key)
+        return bool(row and row[1])
+
+    def rank(self, templates: list[tuple[str, str]], payload_count: int) -> list[BuyRoute]:
+        ranked = []
+        for payload_idx in range(1, payload_count + 1):
+            for order, (base, template) in enumerate(templates):
+                encodings = ["json"]
+                # form-кодировку пробуем заранее только там, где она уже срабатывала
+                if self.has_hits((base, template, payload_idx, "form")):
+                    encodings.append("form")
+                for encoding in encodings:
+                    route = BuyRoute(base, template, payload_idx, encoding)
+                    # при равных оценках сохраняется прежний порядок: базовый payload по всем URL, затем остальные
+                    ranked.append((-self.score(route.key), 0 if payload_idx == 1 else 1, order, payload_idx, route))
+        ranked.sort(key=lambda row: row[:4])
+        routes = [row[4] for row in ranked]
+
+        if AUTOBUY_URL_LIMIT > 0:
+            allowed = set(list(dict.fromkeys(r.key[:2] for r in routes))[:AUTOBUY_URL_LIMIT])
+            routes = [r for r in routes if r.key[:2] in allowed]
+        return routes
+
+    def best(self, limit: int = 3) -> list[tuple[tuple, list]]:
+        rows = [(key, row) for key, row in self.stats.items() if row[1]]
+        rows.sort(key=lambda kv: -self.score(kv[0]))
+        return rows[:limit]
+
+
+autobuy_model = AutobuyEndpointModel()
+
+_BUY_PRICE_SENTINEL = "@@PRICE@@"
+
+
+class BuyPlan:
+    """Заранее собранная покупка для источника: заголовки, JSON-тела в байтах и порядок маршрутов.
+
+    От находки лота до первого POST остаётся подставить item_id в URL и цену в тело.
+    """
+
+    def __init__(self, source_url: str):
+        common_headers = _default_api_headers()
+        self.headers_json = {**common_headers, "Content-Type": "application/json"}
+        self.headers_form = dict(common_headers)
+        self.templates = _autobuy_buy_templates(source_url)
+        sentinel = f'"{_BUY_PRICE_SENTINEL}"'.encode("utf-8")
+        self._priced = [
+            json_dumps(v).encode("utf-8").split(sentinel)
+            for v in _autobuy_payload_variants(_BUY_PRICE_SENTINEL)
+        ]
+        self._unpriced = [json_dumps(v).encode("utf-8") for v in _autobuy_payload_variants(None)]
+        self.routes: list[BuyRoute] = []
+        self.model_version = -1
+        self.refresh()
+
+    def refresh(self):
+        if self.model_version != autobuy_model.version:
+            self.routes = autobuy_model.rank(self.templates, len(self._priced))
+            self.model_version = autobuy_model.version
+
+    def payload_count(self, price) -> int:
+        return len(self._unpriced if price is None else self._priced)
+
+    def json_body(self, payload_idx: int, price) -> bytes:
+        if price is None:
+            return self._unpriced[payload_idx - 1]
+        return json_dumps(price).encode("utf-8").join(self._priced[payload_idx - 1])
+
+    def form_payload(self, payload_idx: int, price) -> dict:
+        return _autobuy_payload_variants(price)[payload_idx - 1]
+
+
+buy_plans: dict[str, BuyPlan] = {}
+
+
+def get_buy_plan(source_url: str) -> BuyPlan:
+    plan = buy_plans.get(source_url)
+    if plan is None:
+        plan = buy_plans[source_url] = BuyPlan(source_url)
+    else:
+        plan.refresh()
+    return plan
 
 
 def _autobuy_classify_response(status: int, text: str):
     raw = html.unescape(text or "")
-    lower = raw.lower()
-    try:
-        data = json.loads(raw)
-        joined = json.dumps(data, ensure_ascii=False).lower()
-    except Exception:
-        joined = lower
+    joined = raw.lower()
+    if "\\u" in raw:
+        # Перекодируем только ответы с \uXXXX: иначе кириллические маркеры не найти в сыром тексте.
+        try:
+            joined = json_dumps(json_loads(raw)).lower()
+        except Exception:
+            pass
 
     success_markers = ("success", "ok", "purchased", "purchase complete", "already bought", "уже куп")
     terminal_error_markers = (
@@ -1670,11 +3541,63 @@ def _autobuy_is_terminal_failure(state: str, status: int, info: str) -> bool:
     return False
 
 
-async def _try_autobuy_once(source: dict, item: dict, found_perf: float | None = None):
+def _autobuy_verdict(label: str, status: int, state: str, info: str):
+    """(итог или None, если стоит пробовать дальше; текст последней ошибки)."""
+    if state == "success":
+        return (True, f"{label} -> {info}"), None
+    if state == "auth":
+        return (False, f"{label} -> HTTP {status}: ошибка авторизации API ({info})"), None
+    if state == "secret":
+        return (False, f"{label} -> нужен/неверный ответ на секретный вопрос ({info})"), None
+    if state == "terminal":
+        return (False, f"{label} -> {info}"), None
+    if state == "queue":
+        return None, f"{label} -> queue: {info}"
+    err = f"{label} -> HTTP {status}: {info}"
+    if _autobuy_is_terminal_failure(state, status, info):
+        return (False, err), err
+    return None, err
+
+
+async def _autobuy_post(
+    session, plan: BuyPlan, route: BuyRoute, item_id: int, price, timeout: float,
+    trace: BuyTrace | None = None, deadline: float | None = None,
+):
+    url = route.url(item_id)
+    if deadline is None:
+        await request_rate_limiter.acquire("POST", url)
+    else:
+        # Ожидание лимита не должно пережить AUTOBUY_MAX_DURATION_SEC.
+        await asyncio.wait_for(request_rate_limiter.acquire("POST", url), max(0.0, deadline - time.perf_counter()))
+    started = time.perf_counter()
+    if trace is not None:
+        trace.mark("rate_limited", started)
+    try:
+        if route.encoding == "form":
+            data, headers = plan.form_payload(route.payload_idx, price), plan.headers_form
+        else:
+            data, headers = plan.json_body(route.payload_idx, price), plan.headers_json
+        request = session.post(url, headers=headers, data=data, timeout=timeout, trace_request_ctx=trace)
+        async with request as resp:
+            request_rate_limiter.feedback("POST", url, resp.status, resp.headers)
+            body = await resp.text()
+    except (asyncio.TimeoutError, aiohttp.ClientError):
+        # Таймаут или обрыв не говорит, что маршрута нет (мог быть холодный коннект) — в модель не пишем.
+        raise
+    state, info, retry_as_form = _autobuy_classify_response(resp.status, body)
+    classified = time.perf_counter()
+    if trace is not None:
+        trace.mark("classified", classified)
+    record_stage("buy.post", (classified - started) * 1000)
+    autobuy_model.record(route, state in AUTOBUY_ROUTE_HIT_STATES, (classified - started) * 1000)
+    return resp.status, state, info, retry_as_form
+
+
+async def _try_autobuy_once(source: dict, lot: Lot, found_perf: float | None = None, trace: BuyTrace | None = None):
     if not LZT_API_KEY:
         return False, "LZT_API_KEY не задан"
 
-    item_id = item.get("item_id") or item.get("id")
+    item_id = lot.item_id
     if not item_id:
         return False, "missing_item_id"
 
@@ -1686,16 +3609,9 @@ async def _try_autobuy_once(source: dict, item: dict, found_perf: float | None =
     t0 = time.perf_counter()
     source_name = (source.get("name") or "UNKNOWN").strip()
     source_url = (source.get("url") or "").strip()
-    common_headers = _default_api_headers()
-    headers_json = {**common_headers, "Content-Type": "application/json"}
-    headers_form = dict(common_headers)
-    payload_variants = _autobuy_payload_variants(item)
-    buy_urls = _autobuy_prioritized_urls(source_url, item_id)
-    if AUTOBUY_URL_LIMIT > 0:
-        buy_urls = buy_urls[:AUTOBUY_URL_LIMIT]
-
-    fast_payload = payload_variants[0] if payload_variants else {"balance_id": LZT_BALANCE_ID}
-    fast_url = buy_urls[0] if buy_urls else None
+    price = lot.price
+    plan = get_buy_plan(source_url)
+    payload_count = plan.payload_count(price)
 
     since_found_ms = None
     if found_perf is not None:
@@ -1703,249 +3619,139 @@ async def _try_autobuy_once(source: dict, item: dict, found_perf: float | None =
 
     log_autobuy(
         f"BUY_START item_id={item_id} src='{_safe_compact(source_name,120)}' "
-        f"since_found_ms={since_found_ms} urls={len(buy_urls)} payloads={len(payload_variants)}"
+        f"since_found_ms={since_found_ms} plan={len(plan.routes)} payloads={payload_count}"
     )
 
     last_err = "unknown"
-    session = await get_session()
+    session = await get_buy_session()
     request_attempts = 0
     unlimited_http_attempts = AUTOBUY_MAX_HTTP_ATTEMPTS <= 0
     deadline = None if AUTOBUY_MAX_DURATION_SEC <= 0 else (t0 + max(0.2, AUTOBUY_MAX_DURATION_SEC))
+    pending = deque(r for r in plan.routes if r.payload_idx <= payload_count)
+    tried = set()
+
+    def budget_left() -> int:
+        if deadline is not None and time.perf_counter() >= deadline:
+            return 0
+        if unlimited_http_attempts:
+            return len(pending)
+        return AUTOBUY_MAX_HTTP_ATTEMPTS - request_attempts
+
+    def next_attempt() -> BuyRoute | None:
+        while pending:
+            route = pending.popleft()
+            if route.key not in tried:
+                tried.add(route.key)
+                return route
+        return None
 
-    async with buy_semaphore:
-        if fast_url:
-            try:
-                if (not unlimited_http_attempts and request_attempts >= AUTOBUY_MAX_HTTP_ATTEMPTS) or (deadline is not None and time.perf_counter() >= deadline):
+    def post(route: BuyRoute, timeout: float):
+        return _autobuy_post(session, plan, route, item_id, price, timeout, trace, deadline)
+
+    try:
+        async with buy_semaphore, request_priority.buy():
+            if trace is not None:
+                trace.mark("semaphore")
+            # 1) лучший по модели маршрут с коротким таймаутом
+            fast = next_attempt()
+            if fast is not None:
+                if budget_left() <= 0:
                     return False, last_err
                 request_attempts += 1
-                bucket, min_interval = _api_limit_bucket("POST", fast_url)
-                await request_rate_limiter.wait(bucket, min_interval)
-                async with session.post(fast_url, headers=headers_json, json=fast_payload, timeout=FAST_AUTOBUY_TIMEOUT) as resp:
-                    body = await resp.text()
-                    state, info, retry_as_form = _autobuy_classify_response(resp.status, body)
+                try:
+                    status, state, info, retry_as_form = await post(fast, FAST_AUTOBUY_TIMEOUT)
                     log_autobuy(
-                        f"BUY_FAST item_id={item_id} status={resp.status} state={state} url={fast_url} info='{_safe_compact(info,220)}'"
+                        f"BUY_FAST item_id={item_id} status={status} state={state} url={fast.label(item_id)} info='{_safe_compact(info,220)}'"
                     )
-                    if state == "success":
-                        _remember_autobuy_endpoint(source_url, fast_url)
-                        return True, f"{fast_url} -> {info}"
-                    if state == "auth":
-                        return False, f"{fast_url} -> HTTP {resp.status}: ошибка авторизации API ({info})"
-                    if state == "secret":
-                        return False, f"{fast_url} -> нужен/неверный ответ на секретный вопрос ({info})"
-                    if state == "terminal":
-                        _remember_autobuy_endpoint(source_url, fast_url)
-                        return False, f"{fast_url} -> {info}"
-                    if state == "queue":
-                        last_err = f"{fast_url} -> queue: {info}"
-                    else:
-                        last_err = f"{fast_url} -> HTTP {resp.status}: {info}"
-
-                    if _autobuy_is_terminal_failure(state, resp.status, info):
-                        return False, last_err
-
+                    result, last_err = _autobuy_verdict(fast.label(item_id), status, state, info)
+                    if result is not None:
+                        return result
                     if retry_as_form:
+                        pending.appendleft(fast.as_form())
+                except asyncio.TimeoutError:
+                    last_err = f"{fast.label(item_id)} -> fast_buy_timeout"
+                except Exception as e:
+                    last_err = f"{fast.label(item_id)} -> {e}"
+
+            # 2) до трёх следующих URL параллельно
+            parallel = []
+            used_urls = {fast.key[:2]} if fast is not None else set()
+            for route in list(pending):
+                if len(parallel) >= min(3, budget_left()):
+                    break
+                if route.key[:2] in used_urls or route.encoding != "json":
+                    continue
+                used_urls.add(route.key[:2])
+                pending.remove(route)
+                tried.add(route.key)
+                parallel.append(route)
+
+            if parallel:
+                request_attempts += len(parallel)
+
+                async def _parallel_try(route: BuyRoute):
+                    return route, await post(route, FAST_AUTOBUY_TIMEOUT)
+
+                tasks = [asyncio.create_task(_parallel_try(route)) for route in parallel]
+                try:
+                    for done in asyncio.as_completed(tasks):
                         try:
-                            if (not unlimited_http_attempts and request_attempts >= AUTOBUY_MAX_HTTP_ATTEMPTS) or (deadline is not None and time.perf_counter() >= deadline):
-                                return False, last_err
-                            request_attempts += 1
-                            bucket, min_interval = _api_limit_bucket("POST", fast_url)
-                            await request_rate_limiter.wait(bucket, min_interval)
-                            async with session.post(fast_url, headers=headers_form, data=fast_payload, timeout=FAST_AUTOBUY_TIMEOUT) as form_resp:
-                                form_body = await form_resp.text()
-                                form_state, form_info, _ = _autobuy_classify_response(form_resp.status, form_body)
-                                log_autobuy(
-                                    f"BUY_FAST_FORM item_id={item_id} status={form_resp.status} state={form_state} url={fast_url} info='{_safe_compact(form_info,220)}'"
-                                )
-                                if form_state == "success":
-                                    _remember_autobuy_endpoint(source_url, fast_url)
-                                    return True, f"{fast_url} (form) -> {form_info}"
-                                if form_state == "auth":
-                                    return False, f"{fast_url} (form) -> HTTP {form_resp.status}: ошибка авторизации API ({form_info})"
-                                if form_state == "secret":
-                                    return False, f"{fast_url} (form) -> нужен/неверный ответ на секретный вопрос ({form_info})"
-                                if form_state == "terminal":
-                                    _remember_autobuy_endpoint(source_url, fast_url)
-                                    return False, f"{fast_url} (form) -> {form_info}"
-                                if form_state == "queue":
-                                    last_err = f"{fast_url} (form) -> queue: {form_info}"
-                                else:
-                                    last_err = f"{fast_url} (form) -> HTTP {form_resp.status}: {form_info}"
-                                if _autobuy_is_terminal_failure(form_state, form_resp.status, form_info):
-                                    return False, last_err
+                            route, (status, state, info, retry_as_form) = await done
                         except asyncio.TimeoutError:
-                            last_err = f"{fast_url} (form) -> fast_buy_timeout"
+                            continue
                         except Exception as e:
-                            last_err = f"{fast_url} (form) -> {e}"
-
-            except asyncio.TimeoutError:
-                last_err = f"{fast_url} -> fast_buy_timeout"
-            except Exception as e:
-                last_err = f"{fast_url} -> {e}"
-
-        parallel_urls = [u for u in buy_urls if u != fast_url][:3]
-        if parallel_urls and (deadline is None or time.perf_counter() < deadline):
-            async def _parallel_try(url: str):
-                bucket, min_interval = _api_limit_bucket("POST", url)
-                await request_rate_limiter.wait(bucket, min_interval)
-                async with session.post(url, headers=headers_json, json=fast_payload, timeout=FAST_AUTOBUY_TIMEOUT) as resp:
-                    body = await resp.text()
-                    state, info, retry_as_form = _autobuy_classify_response(resp.status, body)
-                    return url, resp.status, state, info, retry_as_form
-
-            tasks = [asyncio.create_task(_parallel_try(url)) for url in parallel_urls]
-            try:
-                for done in asyncio.as_completed(tasks):
-                    try:
-                        if (not unlimited_http_attempts and request_attempts >= AUTOBUY_MAX_HTTP_ATTEMPTS) or (deadline is not None and time.perf_counter() >= deadline):
-                            break
-                        request_attempts += 1
-                        buy_url, status_code, state, info, _ = await done
-                        if status_code not in (404, 405):
+                            last_err = f"parallel -> {e}"
+                            continue
+                        if status not in (404, 405):
                             log_autobuy(
-                                f"BUY_PARALLEL item_id={item_id} status={status_code} state={state} url={buy_url} info='{_safe_compact(info,220)}'"
+                                f"BUY_PARALLEL item_id={item_id} status={status} state={state} url={route.label(item_id)} info='{_safe_compact(info,220)}'"
                             )
-                        if state == "success":
-                            _remember_autobuy_endpoint(source_url, buy_url)
-                            for t in tasks:
-                                if not t.done():
-                                    t.cancel()
-                            return True, f"{buy_url} -> {info}"
-                        if state == "auth":
-                            for t in tasks:
-                                if not t.done():
-                                    t.cancel()
-                            return False, f"{buy_url} -> HTTP {status_code}: ошибка авторизации API ({info})"
-                        if state == "secret":
-                            for t in tasks:
-                                if not t.done():
-                                    t.cancel()
-                            return False, f"{buy_url} -> нужен/неверный ответ на секретный вопрос ({info})"
-                        if state == "terminal":
-                            _remember_autobuy_endpoint(source_url, buy_url)
-                            for t in tasks:
-                                if not t.done():
-                                    t.cancel()
-                            return False, f"{buy_url} -> {info}"
-                        if state == "queue":
-                            last_err = f"{buy_url} -> queue: {info}"
-                        else:
-                            last_err = f"{buy_url} -> HTTP {status_code}: {info}"
-                    except asyncio.TimeoutError:
-                        continue
-                    except Exception as e:
-                        last_err = f"parallel -> {e}"
-                        continue
-            finally:
-                for t in tasks:
-                    if not t.done():
-                        t.cancel()
-
-        attempt_pairs = []
-        for payload_idx, payload in enumerate(payload_variants, start=1):
-            for buy_url in buy_urls:
-                if buy_url == fast_url and payload_idx == 1:
-                    continue
-                attempt_pairs.append((payload_idx, payload, buy_url))
-
-        # Сначала пробуем все URL с базовым payload: это даёт более раннее попадание
-        # в рабочий эндпоинт, если у конкретного зеркала/домена отличается маршрут покупки.
-        buy_url_order = {u: i for i, u in enumerate(buy_urls)}
-        attempt_pairs.sort(key=lambda row: (0 if row[0] == 1 else 1, buy_url_order.get(row[2], 999), row[0]))
-
-        for payload_idx, payload, buy_url in attempt_pairs:
-            need_form_retry = False
-            try:
-                if (not unlimited_http_attempts and request_attempts >= AUTOBUY_MAX_HTTP_ATTEMPTS) or (deadline is not None and time.perf_counter() >= deadline):
-                    return False, last_err
-                request_attempts += 1
-                bucket, min_interval = _api_limit_bucket("POST", buy_url)
-                await request_rate_limiter.wait(bucket, min_interval)
-                async with session.post(buy_url, headers=headers_json, json=payload, timeout=BUY_TIMEOUT) as resp:
-                    body = await resp.text()
-                    state, info, retry_as_form = _autobuy_classify_response(resp.status, body)
-
-                    if resp.status not in (404, 405):
-                        log_autobuy(
-                            f"BUY_TRY item_id={item_id} payload={payload_idx} status={resp.status} "
-                            f"state={state} url={buy_url} info='{_safe_compact(info,220)}'"
-                        )
-
-                    if state == "success":
-                        _remember_autobuy_endpoint(source_url, buy_url)
-                        return True, f"{buy_url} -> {info}"
-                    if state == "auth":
-                        return False, f"{buy_url} -> HTTP {resp.status}: ошибка авторизации API ({info})"
-                    if state == "secret":
-                        return False, f"{buy_url} -> нужен/неверный ответ на секретный вопрос ({info})"
-                    if state == "terminal":
-                        _remember_autobuy_endpoint(source_url, buy_url)
-                        return False, f"{buy_url} -> {info}"
-                    if state == "queue":
-                        last_err = f"{buy_url} -> queue: {info}"
-                        continue
-
-                    last_err = f"{buy_url} -> HTTP {resp.status}: {info}"
-                    if _autobuy_is_terminal_failure(state, resp.status, info):
-                        return False, last_err
-                    need_form_retry = retry_as_form
-
-            except asyncio.TimeoutError:
-                last_err = f"{buy_url} -> buy_timeout"
-                continue
-            except Exception as e:
-                last_err = f"{buy_url} -> {e}"
-                continue
-
-            if not need_form_retry:
-                continue
-
-            try:
-                if (not unlimited_http_attempts and request_attempts >= AUTOBUY_MAX_HTTP_ATTEMPTS) or (deadline is not None and time.perf_counter() >= deadline):
+                        result, last_err = _autobuy_verdict(route.label(item_id), status, state, info)
+                        if result is not None:
+                            return result
+                        if retry_as_form:
+                            pending.appendleft(route.as_form())
+                finally:
+                    for t in tasks:
+                        if not t.done():
+                            t.cancel()
+
+            # 3) остальные маршруты по убыванию оценки модели
+            while True:
+                route = next_attempt()
+                if route is None:
+                    break
+                if budget_left() <= 0:
                     return False, last_err
                 request_attempts += 1
-                bucket, min_interval = _api_limit_bucket("POST", buy_url)
-                await request_rate_limiter.wait(bucket, min_interval)
-                async with session.post(buy_url, headers=headers_form, data=payload, timeout=BUY_TIMEOUT) as form_resp:
-                    form_body = await form_resp.text()
-                    state, info, _ = _autobuy_classify_response(form_resp.status, form_body)
-
-                    if form_resp.status not in (404, 405):
-                        log_autobuy(
-                            f"BUY_TRY_FORM item_id={item_id} payload={payload_idx} status={form_resp.status} "
-                            f"state={state} url={buy_url} info='{_safe_compact(info,220)}'"
-                        )
-
-                    if state == "success":
-                        _remember_autobuy_endpoint(source_url, buy_url)
-                        return True, f"{buy_url} (form) -> {info}"
-                    if state == "auth":
-                        return False, f"{buy_url} (form) -> HTTP {form_resp.status}: ошибка авторизации API ({info})"
-                    if state == "secret":
-                        return False, f"{buy_url} (form) -> нужен/неверный ответ на секретный вопрос ({info})"
-                    if state == "terminal":
-                        _remember_autobuy_endpoint(source_url, buy_url)
-                        return False, f"{buy_url} (form) -> {info}"
-                    if state == "queue":
-                        last_err = f"{buy_url} (form) -> queue: {info}"
-                        continue
-
-                    last_err = f"{buy_url} (form) -> HTTP {form_resp.status}: {info}"
-                    if _autobuy_is_terminal_failure(state, form_resp.status, info):
-                        return False, last_err
+                try:
+                    status, state, info, retry_as_form = await post(route, BUY_TIMEOUT)
+                except asyncio.TimeoutError:
+                    last_err = f"{route.label(item_id)} -> buy_timeout"
+                    continue
+                except Exception as e:
+                    last_err = f"{route.label(item_id)} -> {e}"
+                    continue
 
-            except asyncio.TimeoutError:
-                last_err = f"{buy_url} (form) -> buy_timeout"
-                continue
-            except Exception as e:
-                last_err = f"{buy_url} (form) -> {e}"
-                continue
+                if status not in (404, 405):
+                    log_autobuy(
+                        f"BUY_TRY item_id={item_id} payload={route.payload_idx} status={status} "
+                        f"state={state} url={route.label(item_id)} info='{_safe_compact(info,220)}'"
+                    )
+                result, last_err = _autobuy_verdict(route.label(item_id), status, state, info)
+                if result is not None:
+                    return result
+                if retry_as_form:
+                    pending.appendleft(route.as_form())
+    finally:
+        # перестроить порядок маршрутов с учётом этой покупки — уже вне горячего пути
+        asyncio.get_running_loop().call_soon(plan.refresh)
 
     return False, last_err
 
 
-async def try_autobuy_item(source: dict, item: dict, found_perf: float | None = None):
-    item_key = make_item_key(item)
+async def try_autobuy_item(source: dict, lot: Lot, found_perf: float | None = None, trace: BuyTrace | None = None):
+    item_key = lot.key
     lock = get_buy_lock(item_key)
 
     attempts = AUTOBUY_RETRY_ATTEMPTS
@@ -1954,11 +3760,13 @@ async def try_autobuy_item(source: dict, item: dict, found_perf: float | None =
     max_delay = AUTOBUY_RETRY_MAX_DELAY
 
     async with lock:
+        if trace is not None:
+            trace.mark("lock")
         last_result = (False, "unknown")
         attempt = 0
         while unlimited_attempts or attempt < attempts:
             attempt += 1
-            bought, info = await _try_autobuy_once(source, item, found_perf=found_perf)
+            bought, info = await _try_autobuy_once(source, lot, found_perf=found_perf, trace=trace)
             last_result = (bought, info)
 
             if bought:
@@ -1999,21 +3807,86 @@ async def error_reporter_loop():
                 count = user_api_errors.get(uid, 0)
                 last = await db_get_last_report(uid)
                 if count and (now - last >= ERROR_REPORT_INTERVAL):
-                    try:
-                        await send_bot_message(uid, f"⚠️ За последний час ошибок API: <b>{count}</b>", parse_mode="HTML")
-                    except Exception:
-                        pass
+                    enqueue_hunter_notification(
+                        uid, uid, f"⚠️ За последний час ошибок API: <b>{count}</b>", priority=NOTIFY_PRIO_SERVICE, parse_mode="HTML"
+                    )
                     user_api_errors[uid] = 0
                     await db_set_last_report(uid, now)
         except Exception:
             await asyncio.sleep(ERROR_REPORT_INTERVAL)
 
 
+async def history_prune_loop():
+    while True:
+        await asyncio.sleep(SEEN_PRUNE_INTERVAL)
+        try:
+            now = time.time()
+            evicted = 0
+            for store in list(user_seen_items.values()):
+                evicted += store.prune(now)
+            await db_prune_history(SEEN_TTL_SEC, SEEN_MAX_PER_USER)
+            if evicted:
+                log_autobuy(f"HISTORY_PRUNE evicted={evicted}")
+        except Exception as e:
+            log_autobuy(f"HISTORY_PRUNE_ERR err='{_safe_compact(str(e),240)}'")
+
+
+async def buy_warmup_loop():
+    if BUY_WARMUP_INTERVAL <= 0:
+        return
+    while True:
+        try:
+            bases = _autobuy_warm_bases()
+            if bases:
+                await buy_warmer.warm(bases)
+        except Exception as e:
+            log_autobuy(f"BUY_WARMUP_LOOP_ERR err='{_safe_compact(str(e),240)}'")
+        await asyncio.sleep(min(BUY_WARMUP_INTERVAL, max(1.0, BUY_KEEPALIVE_SEC * 0.8)))
+
+
+async def autobuy_model_save_loop():
+    while True:
+        await asyncio.sleep(max(1.0, AUTOBUY_MODEL_SAVE_INTERVAL))
+        try:
+            autobuy_model.save()
+        except Exception as e:
+            log_autobuy(f"AUTOBUY_MODEL_SAVE_ERR err='{_safe_compact(str(e),240)}'")
+
+
+async def latency_dump_loop():
+    if not LATENCY_DUMP_FILE:
+        return
+    while True:
+        await asyncio.sleep(max(1.0, LATENCY_DUMP_INTERVAL))
+        try:
+            tmp = f"{LATENCY_DUMP_FILE}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(json_dumps(latency_dump()))
+            os.replace(tmp, LATENCY_DUMP_FILE)
+        except Exception as e:
+            log_autobuy(f"LATENCY_DUMP_ERR err='{_safe_compact(str(e),240)}'")
+
+
 # ====================== ACTIONS ======================
 async def show_denied(user_id: int, chat_id: int):
     await send_screen(chat_id, user_id, DENIED_TEXT, reply_markup=kb_request())
 
 
+def _bloom_status_line(store: SeenStore) -> str:
+    bloom = store.bloom
+    if bloom is None:
+        return ""
+    st = store.bloom_stats
+    # наблюдаемая доля ложных срабатываний — среди проверок ключей, которых нет в истории
+    negatives = st["definitely_new"] + st["false_positives"]
+    observed = st["false_positives"] / negatives * 100 if negatives else 0.0
+    return (
+        f"• Bloom: <b>{bloom.memory_bytes / 1024:.0f} КБ</b> на {bloom.capacity} ключей, "
+        f"FP≈<b>{bloom.estimated_fp_rate() * 100:.2f}%</b> (факт <b>{observed:.2f}%</b>), "
+        f"точно новых <b>{st['definitely_new']}</b>/{st['checks']}\n"
+    )
+
+
 async def show_status(user_id: int, chat_id: int):
     await load_user_data(user_id)
     role = await get_user_role(user_id) or "not set"
@@ -2036,11 +3909,69 @@ async def show_status(user_id: int, chat_id: int):
         f"• URL: <b>{len(enabled_sources)}/{len(all_sources)}</b> (автобай: <b>{ab}</b>)\n"
         f"• Увидено: <b>{len(user_seen_items[user_id])}</b>\n"
         f"• Попыток автобая: <b>{len(user_buy_attempted[user_id])}</b>\n"
+        f"{_bloom_status_line(user_seen_items[user_id])}"
         f"• Balance ID: <code>{LZT_BALANCE_ID}</code>\n"
         f"• Баланс покупки: <b>{html.escape(balance_text)}</b>\n"
         f"• Ошибок API: <b>{user_api_errors.get(user_id, 0)}</b>\n"
         f"• Лог: <code>{html.escape(AUTOBUY_LOG_FILE)}</code>"
     )
+    if user_id in OWNER_IDS:
+        ps = source_poller.stats()
+        text += (
+            "\n\n<b>⚙️ Общий опрос</b>\n"
+            f"• Охотников: <b>{ps['users']}</b>, подписок: <b>{ps['subscriptions']}</b>, уникальных URL: <b>{ps['distinct']}</b>\n"
+            f"• Тик опроса: <b>{ps['tick']:.2f} сек</b>, опросов: <b>{ps['fetches']}</b>, раздано из общего опроса: <b>{ps['fanouts']}</b>\n"
+            f"• Склеено одновременных запросов: <b>{search_single_flight.saved}</b> "
+            f"из <b>{search_single_flight.calls}</b>\n"
+            f"• Страниц: разобрано <b>{search_page_stats['decoded']}</b>, "
+            f"304 <b>{search_page_stats['not_modified']}</b>, "
+            f"без изменений по отпечатку <b>{search_page_stats['fingerprint_hits']}</b>\n"
+            f"• БД (отложенная запись): коммитов <b>{persistence_writer.commits}</b>, "
+            f"строк <b>{persistence_writer.rows_written}</b>, в очереди <b>{persistence_writer.pending_rows}</b>, выброшено <b>{persistence_writer.rows_dropped}</b>\n"
+            f"• Покупок в полёте: <b>{request_priority.buy_active}</b>, поиск ждал слот: <b>{request_priority.search_deferred}</b> раз\n"
+            f"• POST покупки: {buy_warmer.summary()}"
+        )
+        lag = latency_stages.get("notify.lag")
+        ns = tg_scheduler.stats
+        text += (
+            f"\n• Очередь уведомлений: сейчас <b>{tg_scheduler.depth}</b>, максимум <b>{ns['max_depth']}</b>, "
+            f"отправлено <b>{ns['sent']}</b>, склеено <b>{ns['merged']}</b>, выброшено <b>{ns['dropped']}</b>, "
+            f"RetryAfter <b>{ns['retry_after']}</b>"
+        )
+        if lag is not None:
+            text += f", задержка p50/p90 <b>{lag.percentile(50):g}/{lag.percentile(90):g}</b> мс"
+        if hunter_workers.enabled:
+            text += (
+                f"\n• Процессы-охотники: <b>{hunter_workers.alive}</b>/{hunter_workers.workers}, "
+                f"охотников по процессам: {hunter_workers.load()}, сообщений от них <b>{hunter_workers.received}</b>, "
+                f"перезапусков <b>{hunter_workers.restarts}</b>"
+            )
+        text += (
+            f"\n• Кэш карточек: <b>{len(card_render_cache)}</b>/{CARD_CACHE_MAX}, "
+            f"попаданий <b>{card_cache_stats['hits']}</b>, промахов <b>{card_cache_stats['misses']}</b>"
+        )
+        best_routes = autobuy_model.best()
+        if best_routes:
+            text += "\n• Лучшие маршруты покупки: " + ", ".join(
+                f"{html.escape(base.split('//', 1)[-1])}/{html.escape(tpl)} p{payload} {enc} "
+                f"({row[1]}/{row[0]}, {row[2] / row[1]:.0f} мс)"
+                for (base, tpl, payload, enc), row in best_routes
+            )
+        for host_name, h in sorted(host_health.hosts.items()):
+            text += (
+                f"\n• {html.escape(host_name)}: {h.rtt_ms:.0f} мс, ошибок {h.error_rate * 100:.0f}% "
+                f"({h.errors}/{h.requests})"
+            )
+        if SEARCH_MIRROR_MODE or SEARCH_HEDGE:
+            text += (
+                f"\n• Хеджей: <b>{host_health.hedged}</b>, выиграл дубль: <b>{host_health.hedge_wins}</b>, "
+                f"отклонено лимитом: <b>{host_health.hedge_denied}</b>"
+            )
+        throttled = [(name, b) for name, b in request_rate_limiter.stats().items() if b["throttled"] or b["rate"] < b["base_rate"]]
+        if throttled:
+            text += "\n• 429 по бакетам: " + ", ".join(
+                f"{html.escape(name)} ×{b['throttled']} ({b['rate']}/{b['base_rate']} rps)" for name, b in throttled
+            )
     await send_screen(chat_id, user_id, text, reply_markup=kb_main(user_id), parse_mode="HTML")
 
 
@@ -2104,16 +4035,15 @@ async def send_compact_10_for_user(user_id: int, chat_id: int):
         return
 
     aggregated = {}
-    for item, source in items_with_sources:
-        key = make_item_key(item)
-        if key not in aggregated:
-            aggregated[key] = (item, source)
+    for lot, source in items_with_sources:
+        if lot.key not in aggregated:
+            aggregated[lot.key] = (lot, source)
 
     items_list = list(aggregated.values())[:10]
     await send_screen(chat_id, user_id, f"✅ <b>Проверка лотов</b>\n• Показано: <b>{len(items_list)}</b>", reply_markup=kb_main(user_id), parse_mode="HTML")
 
-    for item, source in items_list:
-        await send_bot_message(chat_id, make_card(item, source["name"]), parse_mode="HTML", disable_web_page_preview=True)
+    for lot, source in items_list:
+        await send_bot_message(chat_id, make_card(lot, source["name"]), parse_mode="HTML", disable_web_page_preview=True)
 
 
 async def send_test_for_single_url(user_id: int, chat_id: int, src: dict):
@@ -2129,8 +4059,8 @@ async def send_test_for_single_url(user_id: int, chat_id: int, src: dict):
         return
 
     aggregated = {}
-    for it in items:
-        aggregated.setdefault(make_item_key(it), it)
+    for lot in items:
+        aggregated.setdefault(lot.key, lot)
 
     limited = list(aggregated.values())[:10]
     await send_screen(
@@ -2141,20 +4071,20 @@ async def send_test_for_single_url(user_id: int, chat_id: int, src: dict):
         parse_mode="HTML",
     )
 
-    for it in limited:
-        await send_bot_message(chat_id, make_card(it, label), parse_mode="HTML", disable_web_page_preview=True)
+    for lot in limited:
+        await send_bot_message(chat_id, make_card(lot, label), parse_mode="HTML", disable_web_page_preview=True)
 
 
 async def seed_existing_without_notifications(user_id: int):
     items_with_sources, _ = await fetch_all_sources(user_id)
     aggregated = {}
-    for item, source in items_with_sources:
-        aggregated.setdefault(make_item_key(item), (item, source))
+    for lot, source in items_with_sources:
+        aggregated.setdefault(lot.key, (lot, source))
 
     seen_batch = []
     buy_batch = []
-    for item, _source in aggregated.values():
-        key = make_item_key(item)
+    for lot, _source in aggregated.values():
+        key = lot.key
         if key not in user_seen_items[user_id]:
             user_seen_items[user_id].add(key)
             seen_batch.append(key)
@@ -2166,14 +4096,20 @@ async def seed_existing_without_notifications(user_id: int):
     await db_mark_buy_attempted_batch(user_id, buy_batch)
 
 
-async def _run_autobuy_and_notify(user_id: int, chat_id: int, source: dict, item: dict, found_perf: float):
-    item_id = item.get("item_id") or item.get("id")
+async def _run_autobuy_and_notify(user_id: int, chat_id: int, source: dict, lot: Lot, found_perf: float):
+    item_id = lot.item_id
     src_name = source.get("name") or "UNKNOWN"
-    bought, buy_info = await try_autobuy_item(source, item, found_perf=found_perf)
+    trace = BuyTrace()
+    trace.mark("response", lot.recv_perf)
+    trace.mark("decoded", lot.decoded_perf)
+    trace.mark("detected", found_perf)
+    trace.mark("task_started")
+    bought, buy_info = await try_autobuy_item(source, lot, found_perf=found_perf, trace=trace)
+    trace.commit()
 
     if bought:
         dur_ms = int((time.perf_counter() - found_perf) * 1000)
-        bought_link = item.get("url") or item.get("link") or (f"https://lzt.market/{item_id}" if item_id is not None else "")
+        bought_link = lot.raw.get("url") or lot.raw.get("link") or (f"https://lzt.market/{item_id}" if item_id is not None else "")
         buy_result_text = (
             f"🛒 <b>Автобай</b> ✅ [{html.escape(src_name)}] "
             f"item_id=<code>{html.escape(str(item_id))}</code> "
@@ -2187,12 +4123,14 @@ async def _run_autobuy_and_notify(user_id: int, chat_id: int, source: dict, item
             f"item_id=<code>{html.escape(str(item_id))}</code>\n{html.escape(_sanitize_buy_info_for_user(str(buy_info)))}"
         )
 
-    enqueue_hunter_notification(user_id, chat_id, buy_result_text, parse_mode="HTML", disable_web_page_preview=True)
+    enqueue_hunter_notification(
+        user_id, chat_id, buy_result_text, priority=NOTIFY_PRIO_AUTOBUY, parse_mode="HTML", disable_web_page_preview=True
+    )
 
 
 async def hunter_loop_for_user(user_id: int, chat_id: int):
     await load_user_data(user_id)
-    ensure_notify_worker(user_id)
+    tg_scheduler.start()
     no_lots_streak = 0
     cycle_num = 0
     pending_autobuy_tasks: set[asyncio.Task] = set()
@@ -2215,7 +4153,9 @@ async def hunter_loop_for_user(user_id: int, chat_id: int):
         cycle_num += 1
         include_non_autobuy = NON_AUTOBUY_CYCLE_EVERY <= 1 or (cycle_num % NON_AUTOBUY_CYCLE_EVERY == 0)
         seen_batch = []
+        touched_batch = []
         buy_attempt_batch = []
+        watermark_batch: dict[str, tuple[int, int]] = {}
         new_items_processed = 0
         try:
             async for source, items, err in iter_sources_results_split(user_id, include_non_autobuy=include_non_autobuy):
@@ -2224,36 +4164,84 @@ async def hunter_loop_for_user(user_id: int, chat_id: int):
                     continue
                 if not items:
                     continue
+                page = items
+                cached_page = user_source_pages[user_id].get(source["url"])
+                if cached_page is not None and page is cached_page[0]:
+                    # Страница не изменилась с последнего полного прохода. Её лоты всё ещё
+                    # в выдаче, поэтому раз в refresh_sec продлеваем их, чтобы не вытеснил TTL.
+                    seen_store = user_seen_items[user_id]
+                    now_ts = int(time.time())
+                    if now_ts - cached_page[1] >= seen_store.refresh_sec:
+                        for lot in page:
+                            if seen_store.refresh(lot.key, now_ts):
+                                touched_batch.append(lot.key)
+                        user_source_pages[user_id][source["url"]] = (page, now_ts)
+                    continue
 
-                items = sorted(items, key=_item_sort_key, reverse=True)
+                items = sorted(items, key=_lot_sort_key, reverse=True)
                 if MAX_ITEMS_PER_SOURCE_SCAN > 0:
                     items = items[:MAX_ITEMS_PER_SOURCE_SCAN]
 
-                for item in items:
-                    if MAX_NEW_ITEMS_PER_CYCLE > 0 and new_items_processed >= MAX_NEW_ITEMS_PER_CYCLE:
-                        break
-
-                    key = make_item_key(item)
-                    if key in user_seen_items[user_id]:
-                        continue
-
-                    found_perf = time.perf_counter()
-                    src_name = source.get("name") or "UNKNOWN"
+                watermark = user_source_watermarks[user_id].get(source["url"]) if HUNTER_INCREMENTAL else None
+                scan_complete = True
+                digest = is_digest_mode(user_id)
+                digest_lots: list[Lot] = []
+                try:
+                    for lot in items:
+                        if watermark is not None and lot.sort_key <= watermark:
+                            break
+                        if MAX_NEW_ITEMS_PER_CYCLE > 0 and new_items_processed >= MAX_NEW_ITEMS_PER_CYCLE:
+                            scan_complete = False
+                            break
 
-                    if source.get("autobuy", False) and key not in user_buy_attempted[user_id]:
-                        user_buy_attempted[user_id].add(key)
-                        buy_attempt_batch.append(key)
-                        t = asyncio.create_task(_run_autobuy_and_notify(user_id, chat_id, source, item, found_perf))
-                        _track_task(t)
+                        key = lot.key
+                        if key in user_seen_items[user_id]:
+                            if user_seen_items[user_id].refresh(key):
+                                touched_batch.append(key)
+                            continue
+
+                        found_perf = time.perf_counter()
+                        src_name = source.get("name") or "UNKNOWN"
+
+                        if source.get("autobuy", False) and key not in user_buy_attempted[user_id]:
+                            user_buy_attempted[user_id].add(key)
+                            buy_attempt_batch.append(key)
+                            t = asyncio.create_task(_run_autobuy_and_notify(user_id, chat_id, source, lot, found_perf))
+                            _track_task(t)
+
+                        user_seen_items[user_id].add(key)
+                        seen_batch.append(key)
+                        new_items_processed += 1
+
+                        if digest:
+                            digest_lots.append(lot)
+                            continue
+                        # Отправку карточки ведёт планировщик уведомлений: скан и автобай не ждут Telegram.
+                        enqueue_hunter_notification(
+                            user_id, chat_id, make_card(lot, src_name), parse_mode="HTML", disable_web_page_preview=True
+                        )
+                finally:
+                    # Лоты уже отмечены увиденными: дайджест уходит, даже если проход прервался.
+                    if len(digest_lots) == 1:
+                        enqueue_hunter_notification(
+                            user_id, chat_id, make_card(digest_lots[0], source.get("name") or "UNKNOWN"),
+                            parse_mode="HTML", disable_web_page_preview=True,
+                        )
+                    elif digest_lots:
+                        for digest_text in make_digest_messages(digest_lots, source.get("name") or "UNKNOWN"):
+                            enqueue_hunter_notification(
+                                user_id, chat_id, digest_text, parse_mode="HTML", disable_web_page_preview=True
+                            )
 
-                    user_seen_items[user_id].add(key)
-                    seen_batch.append(key)
-                    new_items_processed += 1
+                if scan_complete:
+                    user_source_pages[user_id][source["url"]] = (page, int(time.time()))
 
-                    try:
-                        await send_bot_message(chat_id, make_card(item, src_name), parse_mode="HTML", disable_web_page_preview=True)
-                    except Exception as e:
-                        log_autobuy(f"LOT_NOTIFY_SEND_ERR user_id={user_id} err='{_safe_compact(str(e),240)}'")
+                # Отметку двигаем только после полного прохода: недосканированные лоты старше неё.
+                if HUNTER_INCREMENTAL and scan_complete:
+                    top = items[0].sort_key
+                    if watermark is None or top > watermark:
+                        user_source_watermarks[user_id][source["url"]] = top
+                        watermark_batch[source["url"]] = top
 
                 if MAX_NEW_ITEMS_PER_CYCLE > 0 and new_items_processed >= MAX_NEW_ITEMS_PER_CYCLE:
                     break
@@ -2275,28 +4263,301 @@ async def hunter_loop_for_user(user_id: int, chat_id: int):
                 reset_no_lots_message(user_id)
 
             await db_mark_seen_batch(user_id, seen_batch)
+            await db_touch_seen_batch(user_id, touched_batch)
             await db_mark_buy_attempted_batch(user_id, buy_attempt_batch)
+            await db_set_watermarks_batch(user_id, watermark_batch)
             await asyncio.sleep(await user_hunter_interval(user_id))
 
         except asyncio.CancelledError:
             user_hunter_mode[user_id] = "off"
             break
         except Exception as e:
-            if seen_batch:
+            if seen_batch or touched_batch:
                 try:
                     await db_mark_seen_batch(user_id, seen_batch)
+                    await db_touch_seen_batch(user_id, touched_batch)
                     await db_mark_buy_attempted_batch(user_id, buy_attempt_batch)
+                    await db_set_watermarks_batch(user_id, watermark_batch)
                 except Exception:
                     pass
             user_api_errors[user_id] += 1
             log_autobuy(f"HUNTER_EXC user_id={user_id} err='{_safe_compact(str(e),400)}'")
             await asyncio.sleep(max(await user_hunter_interval(user_id), 0.01))
 
+    source_poller.unsubscribe(user_id)
     if pending_autobuy_tasks:
         for task in list(pending_autobuy_tasks):
             task.cancel()
 
 
+# ====================== HUNTER WORKERS ======================
+# При HUNTER_WORKERS=N процесс бота держит Telegram и настройки пользователей, а охотники
+# (опрос, декодирование, карточки, автобай) живут в N процессах `main.py --hunter-worker i`.
+# Обмен — JSON-строки: команды в stdin воркера, уведомления из его stdout.
+def hunter_shard(user_id: int, workers: int) -> int:
+    digest = hashlib.blake2b(str(user_id).encode("ascii"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") % workers
+
+
+class HunterWorkerPool:
+    """Сторона бота: запускает воркеров, шлёт им команды, принимает уведомления, перезапускает упавших."""
+
+    def __init__(self, workers: int):
+        self.workers = max(0, workers)
+        self._procs: list = [None] * self.workers
+        self._readers: list[asyncio.Task | None] = [None] * self.workers
+        self._pending: set[asyncio.Task] = set()
+        self.chats: dict[int, int] = {}  # user_id -> chat_id запущенных охотников
+        self.received = 0
+        self.restarts = 0
+        self._closing = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 0
+
+    @property
+    def alive(self) -> int:
+        return sum(1 for proc in self._procs if proc is not None and proc.returncode is None)
+
+    def load(self) -> list[int]:
+        counts = [0] * self.workers
+        for user_id in self.chats:
+            counts[hunter_shard(user_id, self.workers)] += 1
+        return counts
+
+    def is_running(self, user_id: int) -> bool:
+        return user_id in self.chats
+
+    async def start(self):
+        for index in range(self.workers):
+            await self._spawn(index)
+
+    async def _spawn(self, index: int):
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.abspath(__file__), "--hunter-worker", str(index),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            limit=HUNTER_IPC_LINE_MAX,
+        )
+        self._procs[index] = proc
+        self._readers[index] = asyncio.create_task(self._read(index, proc))
+        log_autobuy(f"HUNTER_WORKER_START index={index} pid={proc.pid}")
+        # После перезапуска возобновляем охотников, которые числились за этим воркером.
+        for user_id, chat_id in list(self.chats.items()):
+            if hunter_shard(user_id, self.workers) == index:
+                self._write(index, {"op": "start", "user_id": user_id, "chat_id": chat_id})
+
+    def _write(self, index: int, msg: dict) -> bool:
+        proc = self._procs[index]
+        if proc is None or proc.returncode is not None or proc.stdin is None or proc.stdin.is_closing():
+            return False
+        proc.stdin.write((json_dumps(msg) + "\n").encode("utf-8"))
+        return True
+
+    def send(self, user_id: int, op: str, **fields):
+        if not self.enabled:
+            return
+        fields["op"] = op
+        fields["user_id"] = user_id
+        self._write(hunter_shard(user_id, self.workers), fields)
+
+    def start_user(self, user_id: int, chat_id: int):
+        self.chats[user_id] = chat_id
+        self.send(user_id, "start", chat_id=chat_id)
+
+    def stop_user(self, user_id: int):
+        if self.chats.pop(user_id, None) is not None:
+            self.send(user_id, "stop")
+
+    async def _read(self, index: int, proc):
+        while True:
+            try:
+                line = await proc.stdout.readline()
+            except ValueError as e:
+                log_autobuy(f"HUNTER_IPC_ERR index={index} err='{_safe_compact(str(e),240)}'")
+                continue
+            if not line:
+                break
+            try:
+                self._dispatch(json_loads(line))
+                self.received += 1
+            except Exception as e:
+                log_autobuy(f"HUNTER_IPC_ERR index={index} err='{_safe_compact(str(e),240)}'")
+
+        code = await proc.wait()
+        if self._closing:
+            return
+        log_autobuy(f"HUNTER_WORKER_EXIT index={index} code={code}")
+        self.restarts += 1
+        await asyncio.sleep(HUNTER_WORKER_RESTART_DELAY)
+        if not self._closing:
+            await self._spawn(index)
+
+    def _dispatch(self, msg: dict):
+        op = msg.get("op")
+        user_id = int(msg["user_id"])
+        if op == "notify":
+            enqueue_hunter_notification(
+                user_id, int(msg["chat_id"]), msg["text"], priority=int(msg.get("priority", NOTIFY_PRIO_CARD)),
+                **(msg.get("kwargs") or {}),
+            )
+        elif op == "status":
+            task = asyncio.create_task(upsert_no_lots_message(int(msg["chat_id"]), user_id, msg["text"]))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+        elif op == "status_reset":
+            reset_no_lots_message(user_id)
+
+    async def close(self):
+        if not self.enabled:
+            return
+        self._closing = True
+        # EOF в stdin — сигнал воркеру остановить охотников, дописать историю и выйти.
+        for proc in self._procs:
+            if proc is not None and proc.stdin is not None and not proc.stdin.is_closing():
+                proc.stdin.close()
+        for proc in self._procs:
+            if proc is None:
+                continue
+            try:
+                await asyncio.wait_for(proc.wait(), HUNTER_WORKER_STOP_TIMEOUT)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+        for task in self._readers:
+            if task is not None and not task.done():
+                task.cancel()
+
+
+class HunterWorkerChannel:
+    """Сторона воркера: уведомления и статусы охотников уходят в stdout процессу бота."""
+
+    def __init__(self, index: int, writer: asyncio.StreamWriter):
+        self.index = index
+        self._writer = writer
+        self._status_at: dict[int, float] = {}
+        self.status_skipped = 0
+
+    def emit(self, op: str, **fields):
+        fields["op"] = op
+        self._writer.write((json_dumps(fields) + "\n").encode("utf-8"))
+
+    def status(self, user_id: int, chat_id: int, text: str):
+        # Статус «нет лотов» обновляется каждый пустой цикл, а бот всё равно может
+        # показать его не чаще бюджета чата — лишние строки не шлём вовсе.
+        now = time.monotonic()
+        interval = 1.0 / TG_CHAT_RATE if TG_CHAT_RATE > 0 else 0.0
+        if now - self._status_at.get(user_id, 0.0) < interval:
+            self.status_skipped += 1
+            return
+        self._status_at[user_id] = now
+        self.emit("status", user_id=user_id, chat_id=chat_id, text=text)
+
+
+hunter_workers = HunterWorkerPool(HUNTER_WORKERS)
+hunter_ipc: HunterWorkerChannel | None = None
+
+
+async def _hunter_worker_stop(user_id: int):
+    user_search_active[user_id] = False
+    user_hunter_mode[user_id] = "off"
+    task = user_hunter_tasks.pop(user_id, None)
+    if task is not None and not task.done():
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+
+async def _hunter_worker_command(msg: dict):
+    op = msg.get("op")
+    user_id = int(msg["user_id"])
+    if op == "start":
+        await _hunter_worker_stop(user_id)
+        # Настройки и история могли поменяться в процессе бота — берём их из базы.
+        await load_user_data(user_id, force=True)
+        user_search_active[user_id] = True
+        user_hunter_mode[user_id] = "classic"
+        user_hunter_tasks[user_id] = asyncio.create_task(hunter_loop_for_user(user_id, int(msg["chat_id"])))
+        log_autobuy(f"HUNTER_START user_id={user_id} worker={hunter_ipc.index if hunter_ipc else '-'}")
+    elif op == "stop":
+        await _hunter_worker_stop(user_id)
+        log_autobuy(f"HUNTER_STOP user_id={user_id} worker={hunter_ipc.index if hunter_ipc else '-'}")
+    elif op == "sources":
+        if user_id in user_started:
+            user_urls[user_id] = list(msg.get("urls") or [])
+            bump_user_sources(user_id)
+            keep = {src.get("url") for src in user_urls[user_id]}
+            for url in list(user_source_watermarks[user_id]):
+                if url not in keep:
+                    user_source_watermarks[user_id].pop(url, None)
+    elif op == "profile":
+        _profile_update(user_id, **(msg.get("fields") or {}))
+    elif op == "reset_history":
+        user_seen_items[user_id].clear()
+        user_buy_attempted[user_id].clear()
+        user_source_watermarks[user_id].clear()
+        user_source_pages[user_id].clear()
+        # Отметки, накопленные здесь до сброса, ещё в очереди: повторная очистка встаёт
+        # за ними, иначе они записались бы поверх DELETE из основного процесса.
+        await db_clear_seen(user_id)
+        await db_clear_buy_attempted(user_id)
+        await db_clear_watermarks(user_id)
+        await persistence_writer.flush()
+
+
+async def hunter_worker_main(index: int):
+    global hunter_ipc, hunter_workers, LATENCY_DUMP_FILE
+    hunter_workers = HunterWorkerPool(0)
+    if HUNTER_WORKERS > 0:
+        request_rate_limiter.share = 1.0 / (HUNTER_WORKERS + 1)
+    if LATENCY_DUMP_FILE:
+        LATENCY_DUMP_FILE = f"{LATENCY_DUMP_FILE}.w{index}"
+
+    # stdout занят каналом к боту: случайные print() перенаправляем в stderr.
+    loop = asyncio.get_running_loop()
+    ipc_fd = os.dup(1)
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+    transport, protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin, os.fdopen(ipc_fd, "wb"))
+    hunter_ipc = HunterWorkerChannel(index, asyncio.StreamWriter(transport, protocol, None, loop))
+    reader = asyncio.StreamReader(limit=HUNTER_IPC_LINE_MAX)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+
+    await init_db()
+    autobuy_model.load(await db_load_autobuy_endpoints())
+    background = [
+        asyncio.create_task(error_reporter_loop()),
+        asyncio.create_task(history_prune_loop()),
+        asyncio.create_task(buy_warmup_loop()),
+        asyncio.create_task(latency_dump_loop()),
+        asyncio.create_task(autobuy_model_save_loop()),
+    ]
+    log_autobuy(f"HUNTER_WORKER_READY index={index} pid={os.getpid()}")
+
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                await _hunter_worker_command(json_loads(line))
+            except Exception as e:
+                log_autobuy(f"HUNTER_WORKER_CMD_ERR index={index} err='{_safe_compact(str(e),240)}'")
+    finally:
+        for user_id in list(user_hunter_tasks):
+            await _hunter_worker_stop(user_id)
+        for task in background:
+            task.cancel()
+        await close_session()
+        autobuy_model.save()
+        try:
+            await persistence_writer.close()
+        except Exception as e:
+            log_autobuy(f"WRITE_BEHIND_CLOSE_ERR err='{_safe_compact(str(e),240)}'")
+        await db_close()
+        transport.close()
+
+
 # ====================== HANDLERS ======================
 @dp.message(Command("start"))
 async def start_cmd(message: types.Message):
@@ -2327,6 +4588,28 @@ async def health_cmd(message: types.Message):
     await safe_delete(message)
 
 
+@dp.message(Command("latency"))
+async def latency_cmd(message: types.Message):
+    user_id = message.from_user.id
+    if user_id not in OWNER_IDS:
+        return await safe_delete(message)
+
+    arg = (message.text or "").split(maxsplit=1)[1:]
+    if arg and arg[0].strip().lower() == "json":
+        # Полный дамп в сообщение не влезает — отправляем файлом.
+        await tg_scheduler.acquire_direct(message.chat.id)
+        data = json_dumps(latency_dump()).encode("utf-8")
+        await bot.send_document(message.chat.id, BufferedInputFile(data, filename="latency.json"))
+        return await safe_delete(message)
+
+    text = html.escape(latency_table() if latency_stages else "Замеров ещё нет.")
+    if len(text) > 3900:
+        # Режем по строке уже после экранирования, чтобы не разорвать сущность и не превысить лимит.
+        text = text[:text.rfind("\n", 0, 3900)] + "\n…"
+    await send_bot_message(message.chat.id, f"<pre>{text}</pre>", parse_mode="HTML")
+    await safe_delete(message)
+
+
 @dp.message()
 async def buttons_handler(message: types.Message):
     user_id = message.from_user.id
@@ -2454,7 +4737,6 @@ async def buttons_handler(message: types.Message):
                 return await safe_delete(message)
 
             await db_add_url(user_id, url, name)
-            user_urls[user_id] = await db_get_urls(user_id)
             await send_screen(chat_id, user_id, f"✅ URL добавлен: <b>{html.escape(name)}</b>", reply_markup=kb_urls_menu(), parse_mode="HTML")
             return await safe_delete(message)
 
@@ -2468,7 +4750,6 @@ async def buttons_handler(message: types.Message):
                 await send_screen(chat_id, user_id, "⚠️ Не нашёл URL для переименования. Повтори ✏️ Переименовать URL.", reply_markup=kb_urls_menu())
                 return await safe_delete(message)
             await db_set_url_name(user_id, url, new_name)
-            user_urls[user_id] = await db_get_urls(user_id)
             await send_screen(chat_id, user_id, f"✅ Переименовано в: <b>{html.escape(new_name)}</b>", reply_markup=kb_urls_menu(), parse_mode="HTML")
             return await safe_delete(message)
 
@@ -2507,7 +4788,6 @@ async def buttons_handler(message: types.Message):
             if mode == "pick_autobuy":
                 new_ab = not src.get("autobuy", False)
                 await db_set_url_autobuy(user_id, src["url"], new_ab)
-                user_urls[user_id] = await db_get_urls(user_id)
                 user_modes[user_id] = None
                 user_page_state[user_id] = {"ctx": None, "page": 0}
                 await send_screen(chat_id, user_id, f"🛒 <b>{html.escape(name)}</b>: {'ВКЛ' if new_ab else 'ВЫКЛ'}", reply_markup=kb_urls_menu(), parse_mode="HTML")
@@ -2516,7 +4796,6 @@ async def buttons_handler(message: types.Message):
             if mode == "pick_toggle":
                 new_enabled = not src.get("enabled", True)
                 await db_set_url_enabled(user_id, src["url"], new_enabled)
-                user_urls[user_id] = await db_get_urls(user_id)
                 user_modes[user_id] = None
                 user_page_state[user_id] = {"ctx": None, "page": 0}
                 await send_screen(chat_id, user_id, f"🔁 <b>{html.escape(name)}</b>: {'ВКЛ' if new_enabled else 'ВЫКЛ'}", reply_markup=kb_urls_menu(), parse_mode="HTML")
@@ -2524,7 +4803,6 @@ async def buttons_handler(message: types.Message):
 
             if mode == "pick_delete":
                 await db_remove_url(user_id, src["url"])
-                user_urls[user_id] = await db_get_urls(user_id)
                 exists_after = any(x.get("url") == src["url"] for x in user_urls[user_id])
                 user_modes[user_id] = None
                 user_page_state[user_id] = {"ctx": None, "page": 0}
@@ -2551,6 +4829,18 @@ async def buttons_handler(message: types.Message):
             await show_users_screen(user_id, chat_id, page=0)
             return await safe_delete(message)
 
+        if text in (DIGEST_ON_LABEL, DIGEST_OFF_LABEL):
+            prof = await _user_profile(user_id)
+            enabled = not bool(prof and prof.get("digest"))
+            await db_set_digest_mode(user_id, enabled)
+            note = (
+                "🗞 Дайджест включён: несколько новых лотов одного URL приходят одним сообщением со ссылками."
+                if enabled else
+                "🗞 Дайджест выключен: каждый лот приходит отдельной карточкой."
+            )
+            await send_screen(chat_id, user_id, note, reply_markup=kb_main(user_id))
+            return await safe_delete(message)
+
         if text == "ℹ️ Инфо":
             await send_screen(
                 chat_id,
@@ -2558,7 +4848,8 @@ async def buttons_handler(message: types.Message):
                 "ℹ️ Управление только нижними кнопками.\n"
                 "📚 Мои URL → управление источниками.\n"
                 "🚀 Старт охотника → максимально быстрый классический режим.\n"
-                "🛒 Обычный автобай включается по конкретному URL.\n\n"
+                "🛒 Обычный автобай включается по конкретному URL.\n"
+                "🗞 Дайджест → пачка новых лотов одним сообщением.\n\n"
                 f"✏️ Названия URL автоматически очищаются и ограничены {MAX_URL_NAME_LEN} символами.\n"
                 f"🧾 Лог автобая: {AUTOBUY_LOG_FILE}",
                 reply_markup=kb_main(user_id),
@@ -2577,9 +4868,20 @@ async def buttons_handler(message: types.Message):
         if text == "♻️ Сбросить историю":
             user_seen_items[user_id].clear()
             user_buy_attempted[user_id].clear()
+            user_source_watermarks[user_id].clear()
+            user_source_pages[user_id].clear()
             user_history_reset_pending[user_id] = True
             await db_clear_seen(user_id)
             await db_clear_buy_attempted(user_id)
+            await db_clear_watermarks(user_id)
+            if hunter_workers.enabled:
+                # Процесс-охотник перечитывает историю из базы при старте: DELETE должен
+                # быть закоммичен до того, как он получит reset_history или start.
+                try:
+                    await persistence_writer.flush()
+                except Exception as e:
+                    log_autobuy(f"WRITE_BEHIND_ERR rows={persistence_writer.pending_rows} err='{_safe_compact(str(e),240)}'")
+            hunter_workers.send(user_id, "reset_history")
             await send_screen(chat_id, user_id, "♻️ История сброшена. Следующий запуск охотника обработает все лоты как новые (включая автобай по URL, где он активен).", reply_markup=kb_main(user_id))
             return await safe_delete(message)
 
@@ -2593,22 +4895,26 @@ async def buttons_handler(message: types.Message):
                     return await safe_delete(message)
 
                 task = user_hunter_tasks.get(user_id)
-                if task and not task.done():
+                if (task and not task.done()) or hunter_workers.is_running(user_id):
                     await send_screen(chat_id, user_id, "⚠️ Охотник уже запущен. Сначала останови его.", reply_markup=kb_main(user_id))
                     return await safe_delete(message)
 
                 user_search_active[user_id] = True
                 user_hunter_mode[user_id] = requested_mode
-                user_seen_items[user_id] = await db_load_seen(user_id)
-                user_buy_attempted[user_id] = await db_load_buy_attempted(user_id)
+                if hunter_workers.enabled:
+                    # История просмотров загрузится в процессе-охотнике этого пользователя.
+                    hunter_workers.start_user(user_id, chat_id)
+                else:
+                    user_seen_items[user_id] = await db_load_seen(user_id)
+                    user_buy_attempted[user_id] = await db_load_buy_attempted(user_id)
 
-                if not user_seen_items[user_id] and user_history_reset_pending[user_id]:
-                    log_autobuy(f"HUNTER_RESET_MODE user_id={user_id} mode={requested_mode} treat_all_as_new=1")
+                    if not user_seen_items[user_id] and user_history_reset_pending[user_id]:
+                        log_autobuy(f"HUNTER_RESET_MODE user_id={user_id} mode={requested_mode} treat_all_as_new=1")
 
-                user_history_reset_pending[user_id] = False
+                    task = asyncio.create_task(hunter_loop_for_user(user_id, chat_id))
+                    user_hunter_tasks[user_id] = task
 
-                task = asyncio.create_task(hunter_loop_for_user(user_id, chat_id))
-                user_hunter_tasks[user_id] = task
+                user_history_reset_pending[user_id] = False
 
                 log_autobuy(f"HUNTER_START user_id={user_id} active_urls={len(active_sources)} interval={HUNTER_INTERVAL_BASE}")
                 await send_screen(chat_id, user_id, f"🚀 Охотник запущен! Активных URL: {len(active_sources)}\nИнтервал цикла: {HUNTER_INTERVAL_BASE:.2f} сек", reply_markup=kb_main(user_id))
@@ -2617,6 +4923,7 @@ async def buttons_handler(message: types.Message):
         if text == "🛑 Стоп охотника":
             user_search_active[user_id] = False
             user_hunter_mode[user_id] = "off"
+            hunter_workers.stop_user(user_id)
             task = user_hunter_tasks.get(user_id)
             if task:
                 task.cancel()
@@ -2720,16 +5027,35 @@ async def main():
     bot = Bot(token=API_TOKEN)
 
     await init_db()
+    autobuy_model.load(await db_load_autobuy_endpoints())
     asyncio.create_task(error_reporter_loop())
+    asyncio.create_task(history_prune_loop())
+    asyncio.create_task(latency_dump_loop())
+    asyncio.create_task(autobuy_model_save_loop())
+    if hunter_workers.enabled:
+        # Покупают процессы-охотники, поэтому и соединения покупки прогревают они.
+        request_rate_limiter.share = 1.0 / (hunter_workers.workers + 1)
+        await hunter_workers.start()
+    else:
+        asyncio.create_task(buy_warmup_loop())
 
     try:
         await dp.start_polling(bot)
     finally:
+        await hunter_workers.close()
         await close_session()
+        autobuy_model.save()
+        try:
+            await persistence_writer.close()
+        except Exception as e:
+            log_autobuy(f"WRITE_BEHIND_CLOSE_ERR err='{_safe_compact(str(e),240)}'")
         await db_close()
         if bot is not None and getattr(bot, "session", None) is not None and not bot.session.closed:
             await bot.session.close()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if len(sys.argv) >= 3 and sys.argv[1] == "--hunter-worker":
+        asyncio.run(hunter_worker_main(int(sys.argv[2])))
+    else:
+        asyncio.run(main())
@@ -0,0 +1,28 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def main(tmp_path, monkeypatch):
+    """main.py целиком; без зависимостей бота тесты пропускаются."""
+    for dep in ("aiogram", "aiohttp", "aiosqlite"):
+        pytest.importorskip(dep)
+    import main as module
+
+    monkeypatch.setattr(module, "AUTOBUY_LOG_FILE", str(tmp_path / "autobuy.log"))
+    return module
+
+
+@pytest.fixture
+def db(main, tmp_path, monkeypatch):
+    """main с пустой базой во временном каталоге; соединение открывается внутри теста."""
+    monkeypatch.setattr(main, "DB_FILE", str(tmp_path / "bot.sqlite"))
+    monkeypatch.setattr(main, "DB_READ_POOL_SIZE", 0)
+    monkeypatch.setattr(main, "_db", None)
+    monkeypatch.setattr(main, "_db_read_pool", None)
+    monkeypatch.setattr(main, "_db_lock", main.asyncio.Lock())
+    return main
@@ -0,0 +1,89 @@
+import asyncio
+
+
+def _route(main, template="{id}/buy", payload=1, encoding="json"):
+    return main.BuyRoute("https://api.lzt.market", template, payload, encoding)
+
+
+def test_rank_prefers_routes_that_hit(main):
+    model = main.AutobuyEndpointModel()
+    templates = [("https://api.lzt.market", "{id}/fast-buy"), ("https://api.lzt.market", "{id}/buy")]
+    assert [r.key[1] for r in model.rank(templates, 1)] == ["{id}/fast-buy", "{id}/buy"]
+    for _ in range(3):
+        model.record(_route(main, "{id}/fast-buy"), False, 0.0)
+        model.record(_route(main, "{id}/buy"), True, 50.0)
+    assert [r.key[1] for r in model.rank(templates, 1)] == ["{id}/buy", "{id}/fast-buy"]
+
+
+def test_form_encoding_is_ranked_only_after_a_hit(main):
+    model = main.AutobuyEndpointModel()
+    templates = [("https://api.lzt.market", "{id}/buy")]
+    assert [r.key[3] for r in model.rank(templates, 1)] == ["json"]
+    model.record(_route(main, encoding="form"), True, 30.0)
+    assert [r.key[3] for r in model.rank(templates, 1)] == ["form", "json"]
+
+
+def test_record_halves_counters_over_the_cap(main, monkeypatch):
+    monkeypatch.setattr(main, "AUTOBUY_MODEL_MAX_ATTEMPTS", 4)
+    model = main.AutobuyEndpointModel()
+    route = _route(main)
+    for _ in range(5):
+        model.record(route, True, 10.0)
+    assert model.stats[route.key] == [2, 2, 25.0]
+
+
+def test_processes_merge_their_stats_in_the_table(db):
+    main = db
+    route = _route(main)
+
+    async def run():
+        await main.init_db()
+        try:
+            first, second = main.AutobuyEndpointModel(), main.AutobuyEndpointModel()
+            for _ in range(3):
+                first.record(route, False, 0.0)
+            second.record(route, True, 40.0)
+            second.record(route, True, 60.0)
+            first.save()
+            second.save()
+            await main.persistence_writer.flush()
+            rows = await main.db_load_autobuy_endpoints()
+            assert rows == [(*route.key, 5, 2, 100.0)]
+
+            # повторное сохранение без новых попыток ничего не добавляет
+            first.save()
+            second.record(route, False, 0.0)
+            second.save()
+            await main.persistence_writer.flush()
+            assert await main.db_load_autobuy_endpoints() == [(*route.key, 6, 2, 100.0)]
+
+            loaded = main.AutobuyEndpointModel()
+            loaded.load(await main.db_load_autobuy_endpoints())
+            assert loaded.stats[route.key] == [6, 2, 100.0]
+        finally:
+            await main.persistence_writer.close()
+            await main.db_close()
+
+    asyncio.run(run())
+
+
+def test_merged_stats_decay_over_the_cap(db, monkeypatch):
+    main = db
+    monkeypatch.setattr(main, "AUTOBUY_MODEL_MAX_ATTEMPTS", 10)
+    route = _route(main)
+
+    async def run():
+        await main.init_db()
+        try:
+            for _ in range(2):
+                model = main.AutobuyEndpointModel()
+                for i in range(6):
+                    model.record(route, i % 2 == 0, 10.0)
+                model.save()
+                await main.persistence_writer.flush()
+            assert await main.db_load_autobuy_endpoints() == [(*route.key, 6, 3, 30.0)]
+        finally:
+            await main.persistence_writer.close()
+            await main.db_close()
+
+    asyncio.run(run())
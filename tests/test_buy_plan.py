@@ -0,0 +1,17 @@
+import json
+
+import pytest
+
+
+@pytest.mark.parametrize("secret", ["", 'слово "в кавычках"'])
+@pytest.mark.parametrize("price", [None, 0, 150, 99.5, "120", 10**12])
+def test_json_body_matches_full_serialization(main, monkeypatch, secret, price):
+    monkeypatch.setattr(main, "LZT_SECRET_WORD", secret)
+    plan = main.BuyPlan("https://api.lzt.market/mihoyo")
+    variants = main._autobuy_payload_variants(price)
+    assert plan.payload_count(price) == len(variants)
+    for idx, variant in enumerate(variants, start=1):
+        body = plan.json_body(idx, price)
+        assert body == main.json_dumps(variant).encode("utf-8")
+        assert json.loads(body) == json.loads(json.dumps(variant))
+        assert plan.form_payload(idx, price) == variant
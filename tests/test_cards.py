@@ -0,0 +1,69 @@
+import html
+
+import pytest
+
+
+def _old_collect_item_specs(main, item: dict) -> list[str]:
+    """Прежняя реализация: 12 проходов по известным характеристикам и множество used."""
+    specs: list[str] = []
+    used: set[str] = set()
+    for label, keys in main._KNOWN_SPECS:
+        raw = main._pick_first(item, keys)
+        if raw is None:
+            continue
+        for k in keys:
+            if k in item:
+                used.add(k)
+        bool_label = main._to_bool_label(raw)
+        value = bool_label if bool_label is not None else main._format_value(raw)
+        specs.append(f"• {label}: <b>{html.escape(value)}</b>")
+
+    extras_added = 0
+    for k, v in item.items():
+        if extras_added >= 8:
+            break
+        if k in main._SPEC_IGNORED or k in used:
+            continue
+        if v in (None, "", [], {}):
+            continue
+        if isinstance(v, (dict, list, tuple, set)):
+            continue
+        human_key = k.replace("_", " ").strip().title()
+        specs.append(f"• {html.escape(human_key)}: <b>{html.escape(main._format_value(v, limit=90))}</b>")
+        extras_added += 1
+    return specs
+
+
+ITEMS = [
+    {},
+    {"item_id": 1, "title": "t", "price": 10},
+    {"level": 60, "lvl": 5, "region": "EU", "phone": True, "email": "no", "2fa": "1"},
+    {"server": "Asia", "country": "", "locale": None, "rank": 0, "elo": 1500},
+    {"level": "", "lvl": None, "genshin_level": 58, "prime": False, "vip": "yes"},
+    {"inventory": 1234567.891, "skin_count": 12, "platform": "PC", "os": "win"},
+    {"guard": "disabled", "ga": "on", "mail_access": 1, "email_access": 0},
+    {"th": 14, "townhall": None, "cups": 5000, "trophies": ""},
+    {f"extra_{i}": i for i in range(12)},
+    {"characters": ["a", "b"], "meta": {"x": 1}, "note": "  много   пробелов  ", "long_text": "я" * 200},
+    {"phone": "", "phone_bound": "", "email": None, "seller_note": "<b>html</b>", "a_b_c": 3.5},
+    {"title": "x", "category": "genshin", "views": 10, "rating": 4.75, "device": "android", "custom": "v"},
+]
+
+
+@pytest.mark.parametrize("item", ITEMS)
+def test_specs_match_old_renderer(main, item):
+    assert main._collect_item_specs(item) == _old_collect_item_specs(main, item)
+
+
+def test_spec_order_follows_known_specs(main):
+    item = {"platform": "PC", "level": 10, "trophies": 5}
+    labels = [line.split(":")[0] for line in main._collect_item_specs(item)]
+    assert labels == ["• 🏆 Трофеи", "• 🔼 Уровень", "• 🧭 Платформа"]
+
+
+def test_card_cache_sees_nested_field_changes(main):
+    main.card_render_cache.clear()
+    first = main.make_card(main.Lot({"item_id": 1, "price": 5, "category": {"name": "a"}}), "src")
+    second = main.make_card(main.Lot({"item_id": 1, "price": 5, "category": {"name": "b"}}), "src")
+    assert first != second
+    assert second == main.render_card(main.Lot({"item_id": 1, "price": 5, "category": {"name": "b"}}), "src")
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+
+@pytest.fixture
+def pooled(db, monkeypatch):
+    main = db
+    monkeypatch.setattr(main, "DB_READ_POOL_SIZE", 2)
+    monkeypatch.setattr(main, "_db_read_conns", [])
+    monkeypatch.setattr(main, "_db_read_pool_lock", asyncio.Lock())
+    return main
+
+
+def test_reads_use_the_pool_and_see_commits(pooled):
+    main = pooled
+
+    async def run():
+        await main.init_db()
+        try:
+            await main.db_execute("INSERT INTO users(user_id) VALUES (1)", commit=True)
+            pool = await main._db_read_pool_get()
+            assert pool is not None and pool.qsize() == 2
+            assert await main.db_fetchone("SELECT user_id FROM users WHERE user_id=1") == (1,)
+            await main.db_execute("INSERT INTO users(user_id) VALUES (2)", commit=True)
+            rows = await asyncio.gather(*[main.db_fetchall("SELECT user_id FROM users ORDER BY user_id") for _ in range(6)])
+            assert all(r == [(1,), (2,)] for r in rows)
+            assert pool.qsize() == 2
+        finally:
+            await main.db_close()
+        assert main._db_read_conns == []
+        assert main._db_read_pool is None
+
+    asyncio.run(run())
+
+
+def test_uncommitted_writes_are_invisible_to_readers(pooled):
+    main = pooled
+
+    async def run():
+        await main.init_db()
+        try:
+            await main.db_execute("INSERT INTO users(user_id) VALUES (3)", commit=False)
+            assert await main.db_fetchone("SELECT user_id FROM users WHERE user_id=3") is None
+            await (await main.db_conn()).commit()
+            assert await main.db_fetchone("SELECT user_id FROM users WHERE user_id=3") == (3,)
+        finally:
+            await main.db_close()
+
+    asyncio.run(run())
+
+
+def test_read_connections_are_read_only(pooled):
+    main = pooled
+
+    async def run():
+        await main.init_db()
+        try:
+            pool = await main._db_read_pool_get()
+            conn = await pool.get()
+            try:
+                with pytest.raises(Exception):
+                    await conn.execute("INSERT INTO users(user_id) VALUES (4)")
+            finally:
+                pool.put_nowait(conn)
+        finally:
+            await main.db_close()
+
+    asyncio.run(run())
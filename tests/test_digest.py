@@ -0,0 +1,54 @@
+import asyncio
+
+
+def _lot(main, item_id, **extra):
+    return main.Lot({"item_id": item_id, "title": f"Lot <{item_id}>", "price": 1500, **extra})
+
+
+def test_digest_line(main):
+    line = main.make_digest_line(_lot(main, 7))
+    assert line == '• <a href="https://lzt.market/7">Lot &lt;7&gt;</a> — <b>1 500 ₽</b>'
+    own = main.make_digest_line(_lot(main, 8, url='https://x/"q"', price=None))
+    assert own == '• <a href="https://x/&quot;q&quot;">Lot &lt;8&gt;</a>'
+    long_title = main.make_digest_line(main.Lot({"item_id": 9, "title": "я" * 200}))
+    assert "я" * 89 + "…" in long_title
+
+
+def test_digest_messages_fit_the_telegram_limit(main):
+    lots = [_lot(main, i, title="t" * 90) for i in range(200)]
+    messages = main.make_digest_messages(lots, "src")
+    assert len(messages) > 1
+    assert all(len(m) <= main.TG_MESSAGE_MAX for m in messages)
+    assert messages[0].startswith("🗞 <b>src</b>: новых лотов <b>200</b>")
+    assert all(m.startswith("🗞 <b>src</b> (продолжение)") for m in messages[1:])
+    assert sum(m.count("\n• ") for m in messages) == 200
+
+
+def test_single_page_digest(main):
+    messages = main.make_digest_messages([_lot(main, 1), _lot(main, 2)], "")
+    assert messages == [
+        "🗞 <b>Источник</b>: новых лотов <b>2</b>\n"
+        + main.make_digest_line(_lot(main, 1)) + "\n"
+        + main.make_digest_line(_lot(main, 2))
+    ]
+
+
+def test_digest_mode_is_persisted(db):
+    main = db
+    user_id = 4023
+
+    async def run():
+        await main.init_db()
+        try:
+            await main.load_user_data(user_id)
+            assert not main.is_digest_mode(user_id)
+            await main.db_set_digest_mode(user_id, True)
+            assert main.is_digest_mode(user_id)
+            main.user_profiles.pop(user_id, None)
+            await main.db_load_user_profile(user_id)
+            assert main.is_digest_mode(user_id)
+        finally:
+            await main.persistence_writer.close()
+            await main.db_close()
+
+    asyncio.run(run())
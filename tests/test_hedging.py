@@ -0,0 +1,81 @@
+import asyncio
+
+SEARCH = "https://api.lzt.market/mihoyo"
+
+
+def _tracker(main, monkeypatch, ratio=1.0, warm_ms=5.0):
+    monkeypatch.setattr(main, "SEARCH_HEDGE", True)
+    monkeypatch.setattr(main, "SEARCH_HEDGE_MAX_RATIO", ratio)
+    tracker = main.HostHealthTracker(0.2)
+    for _ in range(20):
+        tracker.record("api.lzt.market", warm_ms, True)
+    monkeypatch.setattr(main, "host_health", tracker)
+    return tracker
+
+
+def _fake_raw(main, monkeypatch, delays):
+    calls = []
+
+    async def fake(url, request_url=None):
+        n = len(calls)
+        calls.append(n)
+        try:
+            await asyncio.sleep(delays[n])
+        except asyncio.CancelledError:
+            calls.append(f"cancelled:{n}")
+            raise
+        return [n], None, 200
+
+    monkeypatch.setattr(main, "fetch_items_raw", fake)
+    return calls
+
+
+def test_hedge_budget(main, monkeypatch):
+    monkeypatch.setattr(main, "SEARCH_HEDGE_MAX_RATIO", 0.5)
+    tracker = main.HostHealthTracker(0.2)
+    assert not tracker.take_hedge()
+    tracker.note_request()
+    tracker.note_request()
+    assert tracker.take_hedge()
+    assert not tracker.take_hedge()
+    for _ in range(100):
+        tracker.note_request()
+    assert sum(tracker.take_hedge() for _ in range(10)) == 5
+    assert tracker.hedged == 6
+    assert tracker.hedge_denied == 7
+
+
+def test_slow_primary_is_hedged_and_backup_wins(main, monkeypatch):
+    tracker = _tracker(main, monkeypatch)
+    calls = _fake_raw(main, monkeypatch, [1.0, 0.0])
+    assert asyncio.run(main.fetch_items_hedged(SEARCH)) == ([1], None, 200)
+    assert calls[:2] == [0, 1]
+    assert "cancelled:0" in calls
+    assert tracker.hedged == 1
+    assert tracker.hedge_wins == 1
+
+
+def test_fast_primary_is_not_hedged(main, monkeypatch):
+    tracker = _tracker(main, monkeypatch, warm_ms=500.0)
+    calls = _fake_raw(main, monkeypatch, [0.0])
+    assert asyncio.run(main.fetch_items_hedged(SEARCH)) == ([0], None, 200)
+    assert calls == [0]
+    assert tracker.hedged == 0
+
+
+def test_no_hedge_without_budget(main, monkeypatch):
+    tracker = _tracker(main, monkeypatch, ratio=0.0)
+    calls = _fake_raw(main, monkeypatch, [0.05])
+    assert asyncio.run(main.fetch_items_hedged(SEARCH)) == ([0], None, 200)
+    assert calls == [0]
+    assert tracker.hedge_denied == 1
+
+
+def test_no_hedge_before_latency_is_known(main, monkeypatch):
+    monkeypatch.setattr(main, "SEARCH_HEDGE", True)
+    tracker = main.HostHealthTracker(0.2)
+    monkeypatch.setattr(main, "host_health", tracker)
+    calls = _fake_raw(main, monkeypatch, [0.02])
+    assert asyncio.run(main.fetch_items_hedged(SEARCH)) == ([0], None, 200)
+    assert calls == [0]
+    assert tracker.hedged == tracker.hedge_denied == 0
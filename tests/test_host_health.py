@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+SEARCH = "https://api.lzt.market/mihoyo"
+
+
+def test_rtt_and_error_rate_are_smoothed(main):
+    tracker = main.HostHealthTracker(0.5)
+    tracker.record("a", 100.0, True)
+    tracker.record("a", 200.0, True)
+    h = tracker.get("a")
+    assert h.rtt_ms == pytest.approx(150.0)
+    tracker.record("a", 150.0, False)
+    assert h.error_rate == pytest.approx(0.5)
+    assert h.errors == 1
+    assert len(h.samples) == 2
+
+
+def test_percentile_needs_enough_samples(main):
+    tracker = main.HostHealthTracker(0.2)
+    for ms in range(1, 20):
+        tracker.record("a", float(ms), True)
+    assert tracker.get("a").percentile(90) is None
+    tracker.record("a", 20.0, True)
+    assert tracker.get("a").percentile(90) == 19.0
+
+
+def test_ranked_prefers_fast_healthy_and_unprobed_hosts(main, monkeypatch):
+    monkeypatch.setattr(main, "SEARCH_MIRROR_EXPLORE", 0.0)
+    tracker = main.HostHealthTracker(1.0)
+    tracker.record("slow", 300.0, True)
+    tracker.record("fast", 50.0, True)
+    assert tracker.ranked(["slow", "fast"]) == ["fast", "slow"]
+    assert tracker.ranked(["slow", "fast", "new"])[0] == "new"
+    tracker.record("fast", 50.0, False)
+    assert tracker.ranked(["slow", "fast"]) == ["slow", "fast"]
+
+
+def _fake_raw(main, monkeypatch, delays):
+    calls = []
+
+    async def fake(url, request_url=None):
+        host = main.urlsplit(request_url or url).hostname
+        calls.append(host)
+        try:
+            await asyncio.sleep(delays[host])
+        except asyncio.CancelledError:
+            calls.append(f"cancelled:{host}")
+            raise
+        return [host], None, 200
+
+    monkeypatch.setattr(main, "fetch_items_raw", fake)
+    return calls
+
+
+def test_mirror_mode_polls_the_best_host(main, monkeypatch):
+    monkeypatch.setattr(main, "SEARCH_MIRROR_MODE", True)
+    monkeypatch.setattr(main, "SEARCH_MIRROR_EXPLORE", 0.0)
+    tracker = main.HostHealthTracker(1.0)
+    for host in main.VALID_API_HOSTS:
+        tracker.record(host, 10.0 if host == "api.lolz.live" else 100.0, True)
+    monkeypatch.setattr(main, "host_health", tracker)
+    calls = _fake_raw(main, monkeypatch, {h: 0 for h in main.VALID_API_HOSTS})
+
+    assert asyncio.run(main.fetch_items_hedged(SEARCH)) == (["api.lolz.live"], None, 200)
+    assert calls == ["api.lolz.live"]
+
+
+def test_cancelling_the_caller_cancels_the_request(main, monkeypatch):
+    monkeypatch.setattr(main, "SEARCH_HEDGE", True)
+    monkeypatch.setattr(main, "host_health", main.HostHealthTracker(0.2))
+    calls = _fake_raw(main, monkeypatch, {"api.lzt.market": 10})
+
+    async def run():
+        task = asyncio.create_task(main.fetch_items_hedged(SEARCH))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    assert calls == ["api.lzt.market", "cancelled:api.lzt.market"]
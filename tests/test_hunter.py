@@ -0,0 +1,69 @@
+import asyncio
+
+SOURCE = "https://api.lzt.market/mihoyo?order_by=pdate_to_down_upload"
+
+
+def _lots(main, ids):
+    return main.lots_from_items([{"item_id": i, "title": f"Lot {i}", "price": 100 + i, "published_at": 1000 + i} for i in ids])
+
+
+async def _until(predicate, timeout: float = 2.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not predicate():
+        assert loop.time() < deadline
+        await asyncio.sleep(0.01)
+
+
+def test_unchanged_page_refreshes_seen_ids(db, monkeypatch):
+    main = db
+    user_id = 4004
+    clock = [1_000_000]
+    monkeypatch.setattr(main.time, "time", lambda: clock[0])
+    cards = []
+    monkeypatch.setattr(main, "enqueue_hunter_notification", lambda *a, **kw: cards.append(a[2]))
+
+    async def no_lots(*_args):
+        pass
+
+    monkeypatch.setattr(main, "upsert_no_lots_message", no_lots)
+    page = _lots(main, [1, 2, 3])
+    fetches = []
+
+    async def fake_search(url):
+        fetches.append(url)
+        # один и тот же объект списка, как у кэша отпечатка страницы в fetch_items_raw
+        return page, None, 200
+
+    monkeypatch.setattr(main, "fetch_items_hedged", fake_search)
+
+    async def run():
+        await main.init_db()
+        await main.db_add_url(user_id, SOURCE, "src")
+        await main.load_user_data(user_id)
+        store = main.user_seen_items[user_id]
+        store.ttl, store.refresh_sec = 500, 100
+        main.user_search_active[user_id] = True
+        task = asyncio.create_task(main.hunter_loop_for_user(user_id, user_id))
+        try:
+            await _until(lambda: len(store) == 3 and main.user_source_pages[user_id])
+            assert len(cards) == 3
+
+            # страница не меняется, но лоты продолжают висеть в выдаче дольше refresh_sec
+            clock[0] += 150
+            seen_fetches = len(fetches)
+            await _until(lambda: len(fetches) > seen_fetches + 2)
+            assert main.user_source_pages[user_id][SOURCE][1] == clock[0]
+
+            clock[0] += 400
+            assert store.prune(clock[0]) == 0
+            assert all(lot.key in store for lot in page)
+            assert len(cards) == 3
+        finally:
+            main.user_search_active[user_id] = False
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await main.persistence_writer.close()
+            await main.db_close()
+
+    asyncio.run(run())
@@ -0,0 +1,25 @@
+import asyncio
+
+
+def test_reset_history_lands_after_queued_seen_rows(db):
+    main = db
+    user_id = 4025
+
+    async def run():
+        await main.init_db()
+        try:
+            await main.load_user_data(user_id)
+            main.user_seen_items[user_id].add("id::1")
+            # отметка из цикла охотника, ещё не сброшенная очередью на момент сброса
+            await main.db_mark_seen_batch(user_id, ["id::1"])
+            assert main.persistence_writer.pending_rows
+
+            await main._hunter_worker_command({"op": "reset_history", "user_id": user_id})
+            assert main.persistence_writer.pending_rows == 0
+            assert not main.user_seen_items[user_id]
+            assert len(await main.db_load_seen(user_id)) == 0
+        finally:
+            await main.persistence_writer.close()
+            await main.db_close()
+
+    asyncio.run(run())
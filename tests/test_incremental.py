@@ -0,0 +1,86 @@
+import asyncio
+
+
+def test_item_sort_key(main):
+    assert main._item_sort_key({"published_at": 100, "item_id": 5}) == (100, 5)
+    assert main._item_sort_key({"created_at": "200.5", "id": "7"}) == (200, 7)
+    assert main._item_sort_key({"title": "x"}) == (0, 0)
+    assert main._item_sort_key({"published_at": 1, "item_id": 9}) < main._item_sort_key({"published_at": 2, "item_id": 1})
+
+
+def test_incremental_url(main, monkeypatch):
+    url = "https://api.lzt.market/mihoyo?order_by=pdate_to_down_upload"
+    monkeypatch.setattr(main, "INCREMENTAL_QUERY_PARAM", "")
+    assert main._incremental_url(url, (100, 5)) == url
+    monkeypatch.setattr(main, "INCREMENTAL_QUERY_PARAM", "published_startDate")
+    assert main._incremental_url(url, None) == url
+    assert main._incremental_url(url, (0, 5)) == url
+    assert main._incremental_url(url, (100, 5)) == url + "&published_startDate=100"
+    assert main._incremental_url(url + "&published_startDate=1", (100, 5)) == url + "&published_startDate=100"
+
+
+def test_watermarks_roundtrip(db):
+    main = db
+    user_id = 4003
+    url = "https://api.lzt.market/mihoyo?order_by=pdate_to_down_upload"
+
+    async def run():
+        await main.init_db()
+        try:
+            await main.db_add_url(user_id, url, "src")
+            assert await main.db_load_watermarks(user_id) == {}
+            await main.db_set_watermarks_batch(user_id, {url: (1000, 5)})
+            assert await main.db_load_watermarks(user_id) == {url: (1000, 5)}
+            await main.db_clear_watermarks(user_id)
+            assert await main.db_load_watermarks(user_id) == {}
+        finally:
+            await main.persistence_writer.close()
+            await main.db_close()
+
+    asyncio.run(run())
+
+
+def test_hunter_stops_at_watermark(db, monkeypatch):
+    main = db
+    user_id = 4033
+    url = "https://api.lzt.market/mihoyo?order_by=pdate_to_down_upload"
+    monkeypatch.setattr(main, "HUNTER_INCREMENTAL", True)
+    cards = []
+    monkeypatch.setattr(main, "enqueue_hunter_notification", lambda *a, **kw: cards.append(a[2]))
+
+    async def no_lots(*_args):
+        pass
+
+    monkeypatch.setattr(main, "upsert_no_lots_message", no_lots)
+    page = main.lots_from_items([{"item_id": i, "title": f"Lot {i}", "price": 100, "published_at": 1000 + i} for i in range(1, 6)])
+
+    async def fake_search(_url):
+        return page, None, 200
+
+    monkeypatch.setattr(main, "fetch_items_hedged", fake_search)
+
+    async def run():
+        await main.init_db()
+        await main.db_add_url(user_id, url, "src")
+        await main.db_set_watermarks_batch(user_id, {url: (1003, 3)})
+        await main.load_user_data(user_id)
+        main.user_search_active[user_id] = True
+        task = asyncio.create_task(main.hunter_loop_for_user(user_id, user_id))
+        try:
+            for _ in range(200):
+                if main.user_source_watermarks[user_id].get(url) == (1005, 5):
+                    break
+                await asyncio.sleep(0.01)
+            assert main.user_source_watermarks[user_id][url] == (1005, 5)
+            assert len(cards) == 2
+            assert "Lot 5" in cards[0] and "Lot 4" in cards[1]
+            assert "id::3" not in main.user_seen_items[user_id]
+            assert await main.db_load_watermarks(user_id) == {url: (1005, 5)}
+        finally:
+            main.user_search_active[user_id] = False
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await main.persistence_writer.close()
+            await main.db_close()
+
+    asyncio.run(run())
@@ -0,0 +1,38 @@
+def test_empty_histogram(main):
+    assert main.StageHistogram().percentile(50) == 0.0
+
+
+def test_percentile_returns_bucket_upper_bound(main):
+    hist = main.StageHistogram()
+    for ms in [0.05] * 50 + [3.0] * 40 + [40.0] * 10:
+        hist.add(ms)
+    assert hist.percentile(50) == 0.1
+    assert hist.percentile(51) == 5
+    assert hist.percentile(90) == 5
+    assert hist.percentile(99) == 40.0
+    assert hist.percentile(100) == 40.0
+
+
+def test_percentile_never_exceeds_max(main):
+    hist = main.StageHistogram()
+    hist.add(3.0)
+    assert hist.percentile(50) == 3.0
+
+
+def test_percentile_overflow_bucket(main):
+    hist = main.StageHistogram()
+    hist.add(1.0)
+    hist.add(12345.6789)
+    assert hist.counts[-1] == 1
+    assert hist.percentile(99) == 12345.679
+
+
+def test_to_dict(main):
+    hist = main.StageHistogram()
+    for ms in (1.0, 2.0, 3.0):
+        hist.add(ms)
+    d = hist.to_dict()
+    assert d["count"] == 3
+    assert d["avg_ms"] == 2.0
+    assert d["max_ms"] == 3.0
+    assert sum(d["counts"]) == 3
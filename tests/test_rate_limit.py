@@ -0,0 +1,82 @@
+import time
+
+import pytest
+
+
+def test_bucket_burst_then_empty(main):
+    bucket = main.TokenBucket("t", rate=1.0, burst=2)
+    assert bucket.try_take()
+    assert bucket.try_take()
+    assert not bucket.try_take()
+    assert 0 < bucket.ready_in() <= 1.0
+
+
+def test_penalize_blocks_and_slows_down(main, monkeypatch):
+    monkeypatch.setattr(main, "RATE_LIMIT_BACKOFF_FACTOR", 0.5)
+    bucket = main.TokenBucket("t", rate=10.0, burst=5)
+    bucket.penalize(3.0)
+    assert bucket.rate == pytest.approx(5.0)
+    assert bucket.throttled == 1
+    assert not bucket.try_take()
+    assert bucket.ready_in() == pytest.approx(3.0, abs=0.1)
+
+
+def test_penalize_caps_pause_and_uses_default(main, monkeypatch):
+    monkeypatch.setattr(main, "RATE_LIMIT_MAX_PENALTY", 5.0)
+    monkeypatch.setattr(main, "RATE_LIMIT_DEFAULT_PENALTY", 2.0)
+    bucket = main.TokenBucket("t", rate=1.0, burst=1)
+    bucket.penalize(600.0)
+    assert bucket.blocked_until - time.monotonic() == pytest.approx(5.0, abs=0.1)
+
+    bucket = main.TokenBucket("t", rate=1.0, burst=1)
+    bucket.penalize(None)
+    assert bucket.blocked_until - time.monotonic() == pytest.approx(2.0, abs=0.1)
+
+
+def test_rate_floor_and_recovery(main, monkeypatch):
+    monkeypatch.setattr(main, "RATE_LIMIT_BACKOFF_FACTOR", 0.5)
+    monkeypatch.setattr(main, "RATE_LIMIT_RECOVERY_STEP", 0.25)
+    bucket = main.TokenBucket("t", rate=8.0, burst=1)
+    for _ in range(20):
+        bucket.penalize(0.0)
+    assert bucket.rate == pytest.approx(8.0 * 0.05)
+    for _ in range(10):
+        bucket.recover()
+    assert bucket.rate == pytest.approx(8.0)
+
+
+def test_limiter_penalizes_only_the_request_class(main, monkeypatch):
+    monkeypatch.setattr(main, "HOST_RATE_LIMITS", "api.lzt.market=5:2")
+    limiter = main.RequestRateLimiter()
+    search = "https://api.lzt.market/mihoyo"
+    buy = "https://api.lzt.market/123/buy"
+    limiter.feedback("GET", search, 429, {"Retry-After": "4"})
+
+    search_global, search_host = limiter._buckets_for("GET", search)
+    buy_global, buy_host = limiter._buckets_for("POST", buy)
+    assert search_global.throttled == search_host.throttled == 1
+    assert buy_global.throttled == buy_host.throttled == 0
+    assert search_host is not buy_host
+    assert search_host.ready_in() == pytest.approx(4.0, abs=0.1)
+    assert buy_host.ready_in() == 0
+
+
+def test_limiter_recovers_on_success(main, monkeypatch):
+    monkeypatch.setattr(main, "HOST_RATE_LIMITS", "api.lzt.market=5:2")
+    monkeypatch.setattr(main, "RATE_LIMIT_BACKOFF_FACTOR", 0.5)
+    monkeypatch.setattr(main, "RATE_LIMIT_RECOVERY_STEP", 1.0)
+    limiter = main.RequestRateLimiter()
+    url = "https://api.lzt.market/mihoyo"
+    limiter.feedback("GET", url, 429, None)
+    _, bucket = limiter._buckets_for("GET", url)
+    assert bucket.rate < bucket.base_rate
+    limiter.feedback("GET", url, 200)
+    assert bucket.rate == bucket.base_rate
+
+
+def test_limiter_share_splits_budget(main):
+    limiter = main.RequestRateLimiter()
+    limiter.share = 0.5
+    bucket = limiter._bucket("x", 10.0, 4)
+    assert bucket.base_rate == pytest.approx(5.0)
+    assert bucket.burst == 2
@@ -0,0 +1,67 @@
+def _store(main, **kw):
+    store = main.SeenStore(ttl=kw.pop("ttl", 0), max_size=kw.pop("max_size", 1000))
+    store.enable_bloom(0.01)
+    return store
+
+
+def test_bloom_sizing_follows_max_size(main):
+    store = _store(main, max_size=16_000)
+    bloom = store.bloom
+    assert bloom.capacity == 17_000
+    # ~9.6 бита на ключ при 1% ложных срабатываний
+    assert 19_000 <= bloom.memory_bytes <= 22_000
+    assert bloom.estimated_fp_rate() == 0.0
+
+
+def test_no_false_negatives(main):
+    store = _store(main)
+    keys = [f"id::{i * 7919}" for i in range(500)] + [f"noid::{i}" for i in range(100)]
+    for key in keys:
+        store.add(key, ts=1)
+    assert all(key in store for key in keys)
+    assert store.bloom_stats["definitely_new"] == 0
+
+
+def test_negative_lookups_are_counted(main):
+    store = _store(main)
+    for i in range(200):
+        store.add(f"id::{i}", ts=1)
+    misses = sum(f"id::{10**6 + i}" in store for i in range(2000))
+    stats = store.bloom_stats
+    assert misses == 0
+    assert stats["checks"] == 2000
+    assert stats["definitely_new"] + stats["false_positives"] == 2000
+    assert stats["false_positives"] < 100
+
+
+def test_existing_keys_are_loaded_into_the_filter(main):
+    store = main.SeenStore.from_rows([("id::1", 5), ("noid::x", 6)], ttl=0, max_size=100)
+    store.add("id::2", ts=7)
+    store.enable_bloom()
+    assert store.bloom.count == 3
+    assert all(k in store for k in ("id::1", "id::2", "noid::x"))
+
+
+def test_clear_and_eviction_keep_filter_consistent(main):
+    store = _store(main, max_size=10)
+    for i in range(200):
+        store.add(f"id::{i}", ts=i)
+        assert f"id::{i}" in store
+    store.prune(now=0)
+    # фильтр пересобран: в нём только оставшиеся ключи
+    assert store.bloom.count == len(store) == 10
+    assert all(f"id::{i}" in store for i in range(190, 200))
+    store.clear()
+    assert store.bloom.count == 0
+    assert "id::199" not in store
+
+
+def test_status_line(main):
+    assert main._bloom_status_line(main.SeenStore()) == ""
+    store = _store(main)
+    store.add("id::1", ts=1)
+    "id::2" in store
+    line = main._bloom_status_line(store)
+    assert "Bloom" in line
+    assert "КБ" in line
+    assert "FP≈" in line
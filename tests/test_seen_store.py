@@ -0,0 +1,97 @@
+def test_add_and_contains(main):
+    store = main.SeenStore(ttl=0, max_size=0)
+    assert store.add("id::5", ts=100)
+    assert store.add("noid::abc", ts=100)
+    assert not store.add("id::5", ts=200)
+    assert "id::5" in store
+    assert "noid::abc" in store
+    assert "id::6" not in store
+    assert len(store) == 2
+
+
+def test_contains_after_merge(main, monkeypatch):
+    monkeypatch.setattr(main.SeenStore, "MERGE_BATCH", 4)
+    store = main.SeenStore(ttl=0, max_size=0)
+    ids = [17, 3, 42, 8, 25, 1, 99]
+    for i in ids:
+        store.add(f"id::{i}", ts=100)
+    assert list(store._ids) == sorted(store._ids)
+    assert all(f"id::{i}" in store for i in ids)
+    assert "id::4" not in store
+    assert len(store) == len(ids)
+
+
+def test_huge_id_is_kept_as_string_key(main):
+    store = main.SeenStore(ttl=0, max_size=0)
+    key = "id::" + "9" * 25
+    store.add(key, ts=1)
+    assert key in store
+    assert key in store._other
+
+
+def test_prune_by_ttl(main):
+    store = main.SeenStore(ttl=100, max_size=0)
+    store.add("id::1", ts=1000)
+    store.add("id::2", ts=1050)
+    store.add("noid::x", ts=1000)
+    store.add("noid::y", ts=1080)
+    assert store.prune(now=1120) == 2
+    assert "id::1" not in store
+    assert "noid::x" not in store
+    assert "id::2" in store
+    assert "noid::y" in store
+
+
+def test_prune_without_ttl_keeps_everything(main):
+    store = main.SeenStore(ttl=0, max_size=0)
+    store.add("id::1", ts=1)
+    assert store.prune(now=10**9) == 0
+    assert "id::1" in store
+
+
+def test_eviction_drops_least_recently_seen(main):
+    store = main.SeenStore(ttl=0, max_size=3)
+    store.add("id::10", ts=100)
+    store.add("noid::a", ts=200)
+    store.add("id::20", ts=300)
+    store.add("id::30", ts=400)
+    store.add("id::40", ts=500)
+    store.prune(now=0)
+    assert len(store) == 3
+    assert "id::10" not in store
+    assert "noid::a" not in store
+    assert all(k in store for k in ("id::20", "id::30", "id::40"))
+
+
+def test_refresh_protects_from_eviction(main):
+    store = main.SeenStore(ttl=0, max_size=2, refresh_sec=10)
+    store.add("id::1", ts=100)
+    store.add("id::2", ts=200)
+    store.prune(now=0)
+    assert store.refresh("id::1", ts=300)
+    store.add("id::3", ts=250)
+    store.prune(now=0)
+    assert "id::1" in store
+    assert "id::2" not in store
+    assert "id::3" in store
+
+
+def test_refresh_is_rate_limited(main):
+    store = main.SeenStore(ttl=0, max_size=0, refresh_sec=60)
+    store.add("id::1", ts=100)
+    store.add("noid::a", ts=100)
+    assert not store.refresh("id::1", ts=130)
+    assert store.refresh("id::1", ts=160)
+    assert not store.refresh("noid::a", ts=130)
+    assert store.refresh("noid::a", ts=160)
+    assert not store.refresh("id::404", ts=10**9)
+
+
+def test_from_rows_keeps_latest_stamp_and_size(main):
+    rows = [("id::1", 100), ("id::1", 300), ("id::2", 200), ("noid::a", 50), ("id::3", 400)]
+    store = main.SeenStore.from_rows(rows, ttl=0, max_size=2)
+    assert len(store) == 2
+    assert "id::1" in store
+    assert "id::3" in store
+    assert "id::2" not in store
+    assert "noid::a" not in store
@@ -0,0 +1,86 @@
+import asyncio
+
+
+def _fake_search(main, monkeypatch, results):
+    calls = []
+
+    async def fake(url):
+        calls.append(url)
+        await asyncio.sleep(0.01)
+        return results[min(len(calls), len(results)) - 1]
+
+    monkeypatch.setattr(main, "fetch_items_hedged", fake)
+    monkeypatch.setattr(main, "RETRY_BASE_DELAY", 0.0)
+    return calls
+
+
+def test_concurrent_callers_share_one_request(main, monkeypatch):
+    calls = _fake_search(main, monkeypatch, [([1, 2], None, 200)])
+    url = "https://api.lzt.market/mihoyo"
+
+    async def run():
+        return await asyncio.gather(
+            main.fetch_with_retry(url),
+            main.fetch_with_retry(url),
+            main.fetch_with_retry(url, max_retries=2),
+        )
+
+    results = asyncio.run(run())
+    assert calls == [url]
+    assert results == [([1, 2], None)] * 3
+
+
+def test_different_urls_are_not_merged(main, monkeypatch):
+    calls = _fake_search(main, monkeypatch, [([], None, 200)])
+
+    async def run():
+        await asyncio.gather(
+            main.fetch_with_retry("https://api.lzt.market/a"),
+            main.fetch_with_retry("https://api.lzt.market/b"),
+        )
+
+    asyncio.run(run())
+    assert sorted(calls) == ["https://api.lzt.market/a", "https://api.lzt.market/b"]
+
+
+def test_each_caller_keeps_its_retry_budget(main, monkeypatch):
+    calls = _fake_search(main, monkeypatch, [(None, "❌ 500", 500), ([7], None, 200)])
+    url = "https://api.lzt.market/mihoyo"
+
+    async def run():
+        return await asyncio.gather(
+            main.fetch_with_retry(url, max_retries=1),
+            main.fetch_with_retry(url, max_retries=2),
+        )
+
+    once, twice = asyncio.run(run())
+    assert once == ([], "❌ 500")
+    assert twice == ([7], None)
+    assert len(calls) == 2
+
+
+def test_cancelled_waiter_does_not_cancel_the_flight(main, monkeypatch):
+    calls = _fake_search(main, monkeypatch, [([1], None, 200)])
+    url = "https://api.lzt.market/mihoyo"
+
+    async def run():
+        first = asyncio.create_task(main.fetch_with_retry(url))
+        second = asyncio.create_task(main.fetch_with_retry(url))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()) == ([1], None)
+    assert len(calls) == 1
+
+
+def test_on_request_counts_only_the_leader(main, monkeypatch):
+    _fake_search(main, monkeypatch, [([], None, 200)])
+    sent = []
+    url = "https://api.lzt.market/mihoyo"
+
+    async def run():
+        await asyncio.gather(*[main.fetch_with_retry(url, on_request=lambda: sent.append(1)) for _ in range(4)])
+
+    asyncio.run(run())
+    assert sent == [1]
@@ -0,0 +1,45 @@
+import asyncio
+
+
+def test_tick_follows_fastest_subscribed_hunter(main):
+    poller = main.SharedSourcePoller(0.15)
+    assert poller.tick == 0.15
+    poller.subscribe(1, frozenset(), 0.02)
+    poller.subscribe(2, frozenset(), 0.5)
+    assert poller.tick == 0.02
+    poller.unsubscribe(1)
+    assert poller.tick == 0.15
+    poller.subscribe(3, frozenset(), 0.1)
+    assert poller.tick == 0.1
+    poller.unsubscribe(3)
+    poller.unsubscribe(2)
+    assert poller.tick == 0.15
+
+
+def test_fetch_counts_only_real_requests(main, monkeypatch):
+    calls = []
+
+    async def fake_search(url):
+        calls.append(url)
+        await asyncio.sleep(0.01)
+        return [1], None, 200
+
+    monkeypatch.setattr(main, "fetch_items_hedged", fake_search)
+    poller = main.SharedSourcePoller(10.0)
+    url = "https://api.lzt.market/mihoyo"
+
+    async def run():
+        first = await asyncio.gather(*[poller.fetch(url) for _ in range(5)])
+        # в пределах тика ответ раздаётся из общего опроса без запроса
+        again = await poller.fetch(url)
+        return first, again
+
+    first, again = asyncio.run(run())
+    assert first == [([1], None)] * 5
+    assert again == ([1], None)
+    assert len(calls) == 1
+    assert poller.fetches == 1
+    assert poller.fanouts == 1
+    stats = poller.stats()
+    assert stats["fetches"] == 1
+    assert stats["tick"] == 10.0
@@ -0,0 +1,76 @@
+import pytest
+
+
+def _scheduler(main):
+    sched = main.TelegramSendScheduler()
+    # без диспетчера: проверяем только постановку в очередь
+    sched.start = lambda: None
+    sched._wakeup = main.asyncio.Event()
+    return sched
+
+
+def _queued(sched) -> int:
+    return sum(len(heap) for heap in sched._pending.values())
+
+
+def test_drop_keeps_depth_in_sync(main, monkeypatch):
+    monkeypatch.setattr(main, "TG_CARD_MERGE_BACKLOG", 0)
+    monkeypatch.setattr(main, "TG_CARD_DROP_BACKLOG", 3)
+    sched = _scheduler(main)
+    sched.submit(1, "autobuy", main.NOTIFY_PRIO_AUTOBUY, {})
+    for i in range(6):
+        sched.submit(1, f"card {i}", main.NOTIFY_PRIO_CARD, {})
+    assert sched.depth == _queued(sched) == 4
+    assert sched.stats["dropped"] == 3
+    texts = [e[3] for e in sorted(sched._pending[1])]
+    assert texts[0] == "autobuy"
+    assert texts[1].startswith("⚠️ Пропущено карточек:")
+    assert texts[1].endswith("card 3")
+    assert texts[2:] == ["card 4", "card 5"]
+
+
+def test_merge_keeps_depth_in_sync(main, monkeypatch):
+    monkeypatch.setattr(main, "TG_CARD_MERGE_BACKLOG", 2)
+    monkeypatch.setattr(main, "TG_CARD_DROP_BACKLOG", 0)
+    sched = _scheduler(main)
+    for i in range(5):
+        sched.submit(7, f"card {i}", main.NOTIFY_PRIO_CARD, {})
+    sched.submit(7, "report", main.NOTIFY_PRIO_SERVICE, {})
+    assert sched.depth == _queued(sched) == 2
+    assert sched.stats["merged"] == 4
+    texts = [e[3] for e in sorted(sched._pending[7])]
+    assert texts == ["report", "card 0\n\ncard 1\n\ncard 2\n\ncard 3\n\ncard 4"]
+
+
+def test_merge_respects_kwargs_and_message_limit(main, monkeypatch):
+    monkeypatch.setattr(main, "TG_CARD_MERGE_BACKLOG", 1)
+    monkeypatch.setattr(main, "TG_CARD_DROP_BACKLOG", 0)
+    sched = _scheduler(main)
+    big = "x" * (main.TG_MESSAGE_MAX - 3)
+    sched.submit(1, big, main.NOTIFY_PRIO_CARD, {})
+    sched.submit(1, "small", main.NOTIFY_PRIO_CARD, {})
+    sched.submit(1, "markup", main.NOTIFY_PRIO_CARD, {"reply_markup": "kb"})
+    assert sched.depth == _queued(sched) == 3
+    assert all(len(e[3]) <= main.TG_MESSAGE_MAX for e in sched._pending[1])
+
+
+def test_depth_across_chats(main, monkeypatch):
+    monkeypatch.setattr(main, "TG_CARD_MERGE_BACKLOG", 3)
+    monkeypatch.setattr(main, "TG_CARD_DROP_BACKLOG", 5)
+    sched = _scheduler(main)
+    for i in range(40):
+        sched.submit(i % 3, f"card {i}", main.NOTIFY_PRIO_CARD, {})
+    assert sched.depth == _queued(sched)
+    assert sched.stats["max_depth"] >= sched.depth
+
+
+@pytest.mark.parametrize("merge, drop", [(0, 0), (0, 2), (2, 0), (3, 4)])
+def test_service_messages_are_never_shed(main, monkeypatch, merge, drop):
+    monkeypatch.setattr(main, "TG_CARD_MERGE_BACKLOG", merge)
+    monkeypatch.setattr(main, "TG_CARD_DROP_BACKLOG", drop)
+    sched = _scheduler(main)
+    for i in range(10):
+        sched.submit(1, f"card {i}", main.NOTIFY_PRIO_CARD, {})
+        sched.submit(1, f"buy {i}", main.NOTIFY_PRIO_AUTOBUY, {})
+    assert sched.depth == _queued(sched)
+    assert sum(1 for e in sched._pending[1] if e[0] == main.NOTIFY_PRIO_AUTOBUY) == 10
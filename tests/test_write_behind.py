@@ -0,0 +1,154 @@
+import asyncio
+
+import pytest
+
+INSERT_SEEN = "INSERT OR IGNORE INTO seen(user_id, item_key, seen_at) VALUES (?, ?, ?)"
+
+
+def _run(main, body):
+    async def run():
+        await main.init_db()
+        try:
+            return await body()
+        finally:
+            await main.db_close()
+
+    return asyncio.run(run())
+
+
+async def _count_seen(main) -> int:
+    row = await main.db_fetchone("SELECT COUNT(1) FROM seen")
+    return row[0]
+
+
+def test_flush_merges_and_commits(db):
+    main = db
+    queue = main.WriteBehindQueue(60.0, 10_000)
+
+    async def body():
+        queue.submit(INSERT_SEEN, [(1, "id::1", 1)])
+        queue.submit(INSERT_SEEN, [(1, "id::2", 1), (2, "id::1", 1)])
+        assert len(queue._ops) == 1
+        assert queue.pending_rows == 3
+        await queue.flush()
+        assert queue.pending_rows == 0
+        assert queue.commits == 1
+        assert queue.rows_written == 3
+        assert await _count_seen(main) == 3
+        await queue.close()
+
+    _run(main, body)
+
+
+def test_failed_batch_is_requeued_then_dropped(db, monkeypatch):
+    main = db
+    monkeypatch.setattr(main, "WRITE_BEHIND_MAX_RETRIES", 3)
+    queue = main.WriteBehindQueue(60.0, 10_000)
+
+    async def body():
+        # чужой незакоммиченный запрос на общем соединении должен пережить откат пачки
+        await main.db_execute("INSERT INTO users(user_id) VALUES (777)", commit=False)
+        queue.submit(INSERT_SEEN, [(1, "id::1", 1)])
+        queue.submit("INSERT INTO no_such_table VALUES (?)", [(1,)])
+        for attempt in range(1, 3):
+            with pytest.raises(Exception):
+                await queue.flush()
+            assert queue.pending_rows == 2
+            assert queue.failures == attempt
+        with pytest.raises(Exception):
+            await queue.flush()
+        assert queue.pending_rows == 0
+        assert queue.rows_dropped == 2
+        assert queue.failures == 0
+
+        conn = await main.db_conn()
+        await conn.commit()
+        assert await main.db_fetchone("SELECT user_id FROM users WHERE user_id=777") == (777,)
+        assert await _count_seen(main) == 0
+
+        queue.submit(INSERT_SEEN, [(1, "id::2", 1)])
+        await queue.flush()
+        assert await _count_seen(main) == 1
+        await queue.close()
+
+    _run(main, body)
+
+
+def test_cancelled_flush_is_rolled_back_and_requeued(db, monkeypatch):
+    main = db
+    queue = main.WriteBehindQueue(60.0, 10_000)
+
+    async def body():
+        conn = await main.db_conn()
+        started = asyncio.Event()
+
+        class StalledConn:
+            def __getattr__(self, name):
+                return getattr(conn, name)
+
+            async def executemany(self, query, params):
+                await conn.executemany(query, params)
+                started.set()
+                await asyncio.sleep(60)
+
+        async def stalled_conn():
+            return StalledConn()
+
+        monkeypatch.setattr(main, "db_conn", stalled_conn)
+        queue.submit(INSERT_SEEN, [(1, "id::1", 1), (1, "id::2", 1)])
+        task = asyncio.create_task(queue.flush())
+        await started.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert queue.pending_rows == 2
+        assert queue.failures == 0
+
+        monkeypatch.setattr(main, "db_conn", lambda: _as_coro(conn))
+        await queue.flush()
+        assert queue.pending_rows == 0
+        assert await _count_seen(main) == 2
+        # точка сохранения не осталась открытой: новая пачка коммитится отдельно
+        queue.submit(INSERT_SEEN, [(1, "id::3", 1)])
+        await queue.flush()
+        assert await _count_seen(main) == 3
+        await queue.close()
+
+    _run(main, body)
+
+
+async def _as_coro(value):
+    return value
+
+
+def test_close_drains_worker_and_queue(db):
+    main = db
+    queue = main.WriteBehindQueue(60.0, 2)
+
+    async def body():
+        queue.submit(INSERT_SEEN, [(1, "id::1", 1), (1, "id::2", 1)])
+        await asyncio.sleep(0)
+        queue.submit(INSERT_SEEN, [(1, "id::3", 1)])
+        await queue.close()
+        assert queue._task is None
+        assert queue.pending_rows == 0
+        assert await _count_seen(main) == 3
+
+    _run(main, body)
+
+
+def test_worker_flushes_on_interval(db):
+    main = db
+    queue = main.WriteBehindQueue(0.01, 10_000)
+
+    async def body():
+        queue.submit(INSERT_SEEN, [(1, "id::1", 1)])
+        for _ in range(100):
+            if queue.commits:
+                break
+            await asyncio.sleep(0.01)
+        assert queue.commits == 1
+        assert await _count_seen(main) == 1
+        await queue.close()
+
+    _run(main, body)